@@ -1,40 +1,169 @@
-from .rules_builder import RulesBuilder
-
-# import RulesBuilder from .rules_builder
-# import { buildRuleStack, } from "./grammar-parser/build-rule-stack.js";
-# import { Graph, } from "./grammar-parser/graph/graph.js";
-# import { ParseState, } from "./grammar-parser/graph/parse-state.js";
-# import { UnresolvedRule, ValidInput, } from "./grammar-parser/graph/types.js";
-# import { RulesBuilder, } from "./rules-builder/rules-builder.js";
-
-# export const GBNF = (grammar: string, initialString: ValidInput = ''): ParseState => {
-#   const { rules, symbolIds, } = new RulesBuilder(grammar);
-#   if (rules.length === 0) {
-#     throw new Error(`Failed to parse grammar: ${grammar}`);
-#   }
-#   if (symbolIds.get('root') === undefined) {
-#     throw new Error("Grammar does not contain a 'root' symbol");
-#   }
-#   const rootId = symbolIds.get('root');
-
-#   const stackedRules: UnresolvedRule[][][] = rules.map(buildRuleStack);
-#   const graph = new Graph(grammar, stackedRules, rootId);
-#   return new ParseState(graph, graph.add(initialString));
-# };
-
-
-def GBNF(grammar: str, _initial_string: str = ""):
-    rules_builder = RulesBuilder(grammar)
+# Set to True only by static type checkers
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .cache import DiskCache, MemoryCache
+    from .grammar_graph.parse_state import ParseState
+    from .rules_builder import CompileBudget
+    from .rules_builder.errors import ValidInput
+    from .rules_builder.optimizer import Optimizations
+
+# Lets `memory_cache=None` mean "no caching" while the default uses the shared cache
+USE_DEFAULT_CACHE = object()
+
+# Matching engines: pointer sets over the grammar's graph, or an Earley chart
+ENGINES = ("graph", "earley")
+
+
+def parse_grammar(
+    grammar: str,
+    budget: "CompileBudget | None" = None,
+    optimizations: "Optimizations | None" = None,
+):
+    from .rules_builder.rules_builder import RulesBuilder
+
+    dedupe = optimizations is not None and optimizations.dedupe
+    rules_builder = RulesBuilder(grammar, budget=budget, dedupe=dedupe)
     rules = rules_builder.rules
     symbol_ids = rules_builder.symbol_ids
     if len(rules) == 0:
         raise Exception(f"Failed to parse grammar: {grammar}")
     if symbol_ids.get("root") is None:
         raise Exception("Grammar does not contain a 'root' symbol")
-    # root_id = symbol_ids.get("root")
+    if optimizations is not None:
+        from .rules_builder.optimizer import optimize_rules
 
+        rules, symbol_ids = optimize_rules(rules, symbol_ids, optimizations)
     return rules, symbol_ids
 
-    # stacked_rules = list(map(build_rule_stack, rules))
-    # graph = Graph(grammar, stacked_rules, root_id)
-    # return ParseState(graph, graph.add(initial_string)
+
+# `optimize=True` runs every optimization pass; an Optimizations picks passes
+def get_optimizations(optimize: "bool | Optimizations") -> "Optimizations | None":
+    if optimize is True:
+        from .rules_builder.optimizer import Optimizations
+
+        return Optimizations()
+    return optimize or None
+
+
+# Caches are keyed by source, so optimized builds get a key of their own. No
+# grammar can start with a NUL byte, so these keys never collide with a source.
+def get_cache_key(grammar: str, optimizations: "Optimizations | None") -> str:
+    return grammar if optimizations is None else f"\0{optimizations.key}\0{grammar}"
+
+
+# Compiles a grammar to its rules and symbol ids, going through the caches.
+# With `compact`, the rules come back as CompactRules.
+def build_rules(
+    grammar: str,
+    *,
+    compact: bool = False,
+    disk_cache: "DiskCache | None" = None,
+    memory_cache: "MemoryCache | None" = USE_DEFAULT_CACHE,
+    budget: "CompileBudget | None" = None,
+    optimize: "bool | Optimizations" = False,
+):
+    # Imported on first use so that `import gbnf` does not pay for compilation
+    from .rules_builder.compact_rules import CompactRules
+
+    if memory_cache is USE_DEFAULT_CACHE:
+        from .cache.memory_cache import default_memory_cache
+
+        memory_cache = default_memory_cache
+
+    optimizations = get_optimizations(optimize)
+    key = get_cache_key(grammar, optimizations)
+    entry = memory_cache.get(key) if memory_cache is not None else None
+    if entry is None and disk_cache is not None:
+        entry = disk_cache.get(key)
+        if entry is not None and memory_cache is not None:
+            entry = memory_cache.set(key, *entry)
+
+    if entry is None:
+        # Cached grammars cost no compile work, so the budget only applies here
+        rules, symbol_ids = parse_grammar(grammar, budget, optimizations)
+
+        if memory_cache is None and disk_cache is None:
+            return (CompactRules.from_rules(rules) if compact else rules), symbol_ids
+        compact_rules = CompactRules.from_rules(rules)
+        if disk_cache is not None:
+            disk_cache.set(key, compact_rules, symbol_ids)
+        entry = memory_cache.set(key, compact_rules, symbol_ids) if memory_cache is not None else None
+        if not compact or entry is None:
+            # Freshly built objects are never shared with the cache
+            return (compact_rules if compact else rules), symbol_ids
+
+    # Cached entries are shared; CompactRules and the symbol table proxy are
+    # read-only, while the nested-list form is rebuilt for every caller
+    compact_rules, symbol_ids = entry
+    if compact:
+        return compact_rules, symbol_ids
+    return compact_rules.to_rules(), dict(symbol_ids)
+
+
+# Compiles a grammar and parses `initial_string` with it. The returned state
+# takes further input with `add`. `dfa=True` matches through a lazily built
+# DFA of up to the default number of states; an int sets the cap.
+# `lookahead=True` prunes the paths of rules that the next code point of the
+# input cannot take, using a LookaheadIndex of the rules' FIRST sets.
+# `engine="earley"` matches with an Earley chart instead of the graph's pointer
+# sets, which accepts left-recursive grammars and bounds ambiguous ones.
+# With `max_live_states`, grammars whose static analysis estimates more live
+# pointers than that, or finds them growing with the input, are rejected
+# with a GrammarParseError before any input is matched.
+def GBNF(
+    grammar: str,
+    initial_string: "ValidInput" = "",
+    *,
+    disk_cache: "DiskCache | None" = None,
+    memory_cache: "MemoryCache | None" = USE_DEFAULT_CACHE,
+    budget: "CompileBudget | None" = None,
+    optimize: "bool | Optimizations" = False,
+    dfa: bool | int = False,
+    lookahead: bool = False,
+    engine: str = "graph",
+    max_live_states: int | None = None,
+) -> "ParseState":
+    from .grammar_graph.graph import Graph
+    from .grammar_graph.parse_state import ParseState
+    from .grammar_parser.build_rule_stack import build_rule_stack
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(map(repr, ENGINES))}")
+    if dfa and engine != "graph":
+        raise ValueError("The DFA mode is only available with the graph engine")
+    if lookahead and engine != "graph":
+        raise ValueError("The lookahead index is only available with the graph engine")
+    if lookahead and dfa:
+        raise ValueError("The lookahead index and the DFA mode cannot be combined")
+    if max_live_states is not None and engine != "graph":
+        raise ValueError("max_live_states only applies to the graph engine")
+    rules, symbol_ids = build_rules(
+        grammar,
+        disk_cache=disk_cache,
+        memory_cache=memory_cache,
+        budget=budget,
+        optimize=optimize,
+    )
+    stacked_rules = [build_rule_stack(rule) for rule in rules]
+    graph = Graph(grammar, stacked_rules, symbol_ids["root"], symbol_ids, allow_left_recursion=engine == "earley")
+    if engine == "earley":
+        from .grammar_graph.earley import EarleyParser
+
+        parser = EarleyParser(graph)
+        return ParseState(parser, parser.add(initial_string))
+    if max_live_states is not None:
+        from .grammar_graph.analyzer import analyze_graph
+        from .rules_builder.errors import GrammarParseError
+
+        analysis = analyze_graph(graph, max_live_states)
+        if analysis.flagged:
+            raise GrammarParseError(grammar, 0, "; ".join(analysis.reasons))
+    if dfa:
+        from .grammar_graph.lazy_dfa import DEFAULT_MAX_STATES, LazyDFA
+
+        graph.dfa = LazyDFA(graph, DEFAULT_MAX_STATES if dfa is True else dfa)
+    if lookahead:
+        from .grammar_graph.lookahead import LookaheadIndex
+
+        graph.lookahead = LookaheadIndex(graph)
+    return ParseState(graph, graph.add(initial_string))
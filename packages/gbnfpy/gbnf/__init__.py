@@ -1 +1,53 @@
 from .GBNF import GBNF as GBNF
+from .lazy import lazy_attributes
+
+# Set to True only by static type checkers
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .batch import CompileResult as CompileResult
+    from .batch import compile_many as compile_many
+    from .cache import DiskCache as DiskCache
+    from .cache import MaskCache as MaskCache
+    from .cache import MemoryCache as MemoryCache
+    from .grammar_graph import CharClass as CharClass
+    from .grammar_graph import GrammarAnalysis as GrammarAnalysis
+    from .grammar_graph import ParseState as ParseState
+    from .grammar_graph import analyze_grammar as analyze_grammar
+    from .rules_builder import CancellationToken as CancellationToken
+    from .rules_builder import CompactRules as CompactRules
+    from .rules_builder import CompileBudget as CompileBudget
+    from .rules_builder import GrammarParseError as GrammarParseError
+    from .rules_builder import InputParseError as InputParseError
+    from .rules_builder import Optimizations as Optimizations
+    from .rules_builder import export_llama_grammar as export_llama_grammar
+    from .rules_builder import load_llama_grammar as load_llama_grammar
+    from .vocabulary import TokenMask as TokenMask
+    from .vocabulary import Vocabulary as Vocabulary
+
+# Everything beyond GBNF is imported on first access, so `import gbnf` stays
+# cheap for short-lived processes
+_LAZY_ATTRIBUTES = {
+    "CancellationToken": ".rules_builder.compile_budget",
+    "CharClass": ".grammar_graph.char_class",
+    "CompactRules": ".rules_builder.compact_rules",
+    "CompileBudget": ".rules_builder.compile_budget",
+    "CompileResult": ".batch",
+    "DiskCache": ".cache.disk_cache",
+    "GrammarAnalysis": ".grammar_graph.analyzer",
+    "GrammarParseError": ".rules_builder.errors",
+    "InputParseError": ".rules_builder.errors",
+    "MaskCache": ".cache.mask_cache",
+    "MemoryCache": ".cache.memory_cache",
+    "Optimizations": ".rules_builder.optimizer",
+    "ParseState": ".grammar_graph.parse_state",
+    "TokenMask": ".vocabulary",
+    "Vocabulary": ".vocabulary",
+    "analyze_grammar": ".grammar_graph.analyzer",
+    "compile_many": ".batch",
+    "export_llama_grammar": ".rules_builder.llama_grammar",
+    "load_llama_grammar": ".rules_builder.llama_grammar",
+}
+
+__all__ = ["GBNF", *_LAZY_ATTRIBUTES]
+
+__getattr__, __dir__ = lazy_attributes(globals(), _LAZY_ATTRIBUTES)
@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from .GBNF import parse_grammar
+from .rules_builder.compact_rules import CompactRules
+
+# Below this many grammars the cost of starting worker processes outweighs
+# the parallelism, so the batch is compiled in-process
+DEFAULT_MIN_PARALLEL_BATCH = 64
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from .rules_builder.compile_budget import CompileBudget
+
+
+@dataclass(frozen=True)
+class CompileResult:
+    rules: CompactRules | None = None
+    symbol_ids: dict[str, int] | None = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Runs in the worker processes. Rules travel back as CompactRules, which pickle
+# as two flat arrays rather than nested lists of dicts.
+def compile_grammar(grammar: str, budget: "CompileBudget | None" = None) -> CompileResult:
+    try:
+        rules, symbol_ids = parse_grammar(grammar, budget)
+    except Exception as error:
+        return CompileResult(error=error)
+    return CompileResult(CompactRules.from_rules(rules), symbol_ids)
+
+
+def _compile_chunk(grammars: list[str], budget: "CompileBudget | None") -> list[CompileResult]:
+    return [compile_grammar(grammar, budget) for grammar in grammars]
+
+
+# Compiles every grammar and returns one CompileResult per grammar, in input
+# order. Failures are reported on their result instead of aborting the batch.
+# A cancellation token cannot reach worker processes, so a budget carrying one
+# keeps the whole batch in-process.
+def compile_many(
+    grammars: "Iterable[str]",
+    workers: int | None = None,
+    *,
+    budget: "CompileBudget | None" = None,
+    min_parallel_batch: int = DEFAULT_MIN_PARALLEL_BATCH,
+) -> list[CompileResult]:
+    grammars = list(grammars)
+    workers = min(workers or os.cpu_count() or 1, len(grammars))
+    cancellable = budget is not None and budget.cancellation_token is not None
+    if cancellable or workers <= 1 or len(grammars) < min_parallel_batch:
+        return _compile_chunk(grammars, budget)
+
+    # A few chunks per worker balances uneven grammars against per-task overhead
+    chunk_size = max(1, len(grammars) // (workers * 4))
+    chunks = [grammars[i : i + chunk_size] for i in range(0, len(grammars), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = []
+        for chunk_results in executor.map(_compile_chunk, chunks, [budget] * len(chunks)):
+            results.extend(chunk_results)
+    return results
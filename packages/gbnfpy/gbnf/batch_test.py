@@ -0,0 +1,92 @@
+import pickle
+import re
+
+import pytest
+
+from . import CancellationToken, CompileBudget, compile_many
+from . import batch as batch_module
+from .batch import DEFAULT_MIN_PARALLEL_BATCH
+from .GBNF import build_rules
+from .rules_builder.compact_rules import CompactRules
+from .rules_builder.errors import (
+    CompileBudgetExceededError,
+    CompileCancelledError,
+    GrammarParseError,
+    UndefinedRuleError,
+)
+
+GRAMMARS = [
+    'root ::= [a-z]+ ("," [a-z]+)*',
+    "root ::= missing",
+    'root ::= "yes" | "no"',
+    'other ::= "x"',
+    "root ::= (",
+]
+
+
+def check_results(results):
+    assert len(results) == len(GRAMMARS)
+    for grammar, result in zip(GRAMMARS, results, strict=True):
+        if result.ok:
+            assert isinstance(result.rules, CompactRules)
+            assert (result.rules, result.symbol_ids) == build_rules(grammar, memory_cache=None)
+            continue
+        # Failures carry the error compiling the grammar directly raises
+        with pytest.raises(type(result.error), match=f"^{re.escape(str(result.error))}$") as error:
+            build_rules(grammar, memory_cache=None)
+        assert type(error.value) is type(result.error)
+
+
+def test_in_process():
+    results = compile_many(GRAMMARS)
+    check_results(results)
+    assert isinstance(results[1].error, UndefinedRuleError)
+    assert isinstance(results[4].error, GrammarParseError)
+
+
+def test_process_pool():
+    check_results(compile_many(GRAMMARS, workers=2, min_parallel_batch=1))
+
+
+def test_results_keep_input_order_across_chunks():
+    grammars = [f'root ::= "{"x" * i}"' for i in range(1, 40)]
+    results = compile_many(grammars, workers=3, min_parallel_batch=1)
+    assert [len(result.rules[0]) - 1 for result in results] == list(range(1, 40))
+
+
+def test_small_batches_stay_in_process(monkeypatch):
+    def fail(*_args, **_kwargs):
+        raise AssertionError("Small batches should not start a process pool")
+
+    monkeypatch.setattr(batch_module, "ProcessPoolExecutor", fail)
+    check_results(compile_many(GRAMMARS, workers=4))
+    check_results(compile_many(GRAMMARS, workers=1, min_parallel_batch=1))
+
+
+def test_budget_applies_to_each_grammar():
+    # The first grammar takes more steps than the third
+    results = compile_many(GRAMMARS, workers=2, budget=CompileBudget(max_steps=10), min_parallel_batch=1)
+    assert isinstance(results[0].error, CompileBudgetExceededError)
+    assert results[2].ok
+
+
+@pytest.mark.parametrize("min_parallel_batch", [1, DEFAULT_MIN_PARALLEL_BATCH])
+def test_cancellation_tokens_stay_in_process(monkeypatch, min_parallel_batch):
+    def fail(*_args, **_kwargs):
+        raise AssertionError("A cancellation token cannot reach worker processes")
+
+    monkeypatch.setattr(batch_module, "ProcessPoolExecutor", fail)
+    token = CancellationToken()
+    budget = CompileBudget(cancellation_token=token, check_interval=1)
+    check_results(compile_many(GRAMMARS, workers=2, budget=budget, min_parallel_batch=min_parallel_batch))
+    token.cancel()
+    results = compile_many(GRAMMARS, workers=2, budget=budget, min_parallel_batch=min_parallel_batch)
+    assert all(isinstance(result.error, CompileCancelledError) for result in results)
+
+
+def test_results_pickle_compactly():
+    grammar = "root ::= " + " | ".join(f'"{word}" [0-9]*' for word in ("alpha", "beta", "gamma", "delta") * 10)
+    result = compile_many([grammar])[0]
+    copied = pickle.loads(pickle.dumps(result))
+    assert copied == result
+    assert len(pickle.dumps(result)) < len(pickle.dumps(build_rules(grammar, memory_cache=None)))
@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+from time import perf_counter
+
+# The grammar corpus shared with the JS package, present in a source checkout
+DEFAULT_GRAMMARS_DIR = (
+    Path(__file__).resolve().parents[3] / "gbnfjs" / "dev" / "browser" / "collect-test-cases" / "grammars"
+)
+
+# Outputs llama.cpp generated under each corpus grammar, as JSON lists of
+# strings named after the grammar
+DEFAULT_SAMPLES_DIR = Path(__file__).resolve().parents[3] / "gbnfjs" / "test" / "grammars"
+
+
+def load_samples(samples_dir: Path, name: str) -> list[str]:
+    path = Path(samples_dir) / f"{name}.json"
+    return json.loads(path.read_text()) if path.exists() else []
+
+
+def load_grammars(grammars_dir: Path, names: list[str] | None = None) -> dict[str, str]:
+    paths = sorted(Path(grammars_dir).glob("*.gbnf"))
+    if names:
+        paths = [path for path in paths if path.stem in names]
+    return {path.stem: path.read_text() for path in paths}
+
+
+def time_call(fn, number: int, repeat: int) -> float:
+    # Returns the best per-call duration in seconds across `repeat` runs of `number` calls
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (perf_counter() - start) / number)
+    return best
+
+
+def make_rule_name(index: int) -> str:
+    # Rule names may only contain letters, dashes and underscores
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(97 + remainder) + letters
+    return f"rule-{letters}"
+
+
+# A grammar of `num_rules` rules arranged in chains of 50, each rule mixing
+# literals, char classes, groups and repetition
+def make_synthetic_grammar(num_rules: int) -> str:
+    lines = ["root ::= " + " | ".join(make_rule_name(i) for i in range(0, num_rules, 50))]
+    for i in range(num_rules):
+        tail = make_rule_name(i + 1) if i + 1 < num_rules and i % 50 != 49 else '"."'
+        lines.append(f'{make_rule_name(i)} ::= ("v{i % 10}" | "w" [0-9]+)* [a-z]? {tail}')
+    return "\n".join(lines) + "\n"
+
+
+# Concatenates `factor` copies of a grammar, renaming every rule in each copy,
+# under a root that accepts any copy's root
+def scale_grammar(grammar: str, factor: int) -> str:
+    from ..rules_builder.tokenizer import TokenType, tokenize
+
+    names = [token for token in tokenize(grammar) if token.type is TokenType.NAME]
+    copies = []
+    for i in range(factor):
+        suffix = make_rule_name(i).removeprefix("rule")
+        pieces = []
+        pos = 0
+        for token in names:
+            pieces.extend((grammar[pos : token.pos], f"{token.value}{suffix}"))
+            pos = token.pos + len(token.value)
+        pieces.append(grammar[pos:])
+        copies.append("".join(pieces))
+    root = " | ".join(f"root{make_rule_name(i).removeprefix('rule')}" for i in range(factor))
+    return f"root ::= {root}\n" + "\n".join(copies) + "\n"
+
+
+def make_nested_grammar(depth: int) -> str:
+    return "root ::= " + '("a" ' * depth + ")" * depth + "\n"
+
+
+def make_char_class_grammar(num_items: int) -> str:
+    # Alternating single characters and ranges over distinct code points
+    items = "".join(
+        chr(0x4E00 + i * 3) if i % 2 else f"{chr(0x4E00 + i * 3)}-{chr(0x4E01 + i * 3)}" for i in range(num_items)
+    )
+    return f"root ::= [{items}]+\n"
+
+
+def make_alternation_grammar(num_alternates: int) -> str:
+    return "root ::= " + " | ".join(f'"{make_rule_name(i)}"' for i in range(num_alternates)) + "\n"
+
+
+# A stand-in for a tokenizer's vocabulary: words with and without a leading
+# space, numbers, punctuation runs, JSON fragments, whitespace and CJK
+def make_vocabulary(size: int, seed: int = 0) -> list[str]:
+    import random
+
+    generator = random.Random(seed)
+    letters = "etaoinshrdlucmfwypvbgkjqxz"
+    punctuation = ['"', ",", ":", "{", "}", "[", "]", ".", "(", ")", "-", "_", "'", "\\", "/", "!", "?", ";"]
+    tokens = dict.fromkeys(chr(code_point) for code_point in range(32, 127))
+    while len(tokens) < size:
+        kind = generator.random()
+        if kind < 0.6:
+            word = "".join(generator.choices(letters, weights=range(26, 0, -1), k=generator.randint(2, 9)))
+            word = word.capitalize() if generator.random() < 0.2 else word
+            token = f" {word}" if generator.random() < 0.5 else word
+        elif kind < 0.7:
+            token = str(generator.randrange(10 ** generator.randint(1, 4)))
+        elif kind < 0.85:
+            token = "".join(generator.choices(punctuation, k=generator.randint(2, 4)))
+        elif kind < 0.9:
+            token = generator.choice([" ", "\n", "\t"]) * generator.randint(2, 16)
+        else:
+            token = "".join(chr(generator.randint(0x4E00, 0x9FFF)) for _ in range(generator.randint(1, 3)))
+        tokens[token] = None
+    return list(tokens)
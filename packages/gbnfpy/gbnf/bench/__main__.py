@@ -0,0 +1,49 @@
+import argparse
+import sys
+
+from . import (
+    compilation,
+    dfa,
+    earley,
+    forking,
+    lookahead,
+    masking,
+    matching,
+    optimization,
+    profile,
+    recompilation,
+    suite,
+)
+
+BENCHMARKS = {
+    "suite": suite,
+    "compile": compilation,
+    "recompile": recompilation,
+    "profile": profile,
+    "optimize": optimization,
+    "match": matching,
+    "dfa": dfa,
+    "earley": earley,
+    "lookahead": lookahead,
+    "fork": forking,
+    "mask": masking,
+}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m gbnf.bench", description="Benchmark grammar compilation and matching",
+    )
+    parser.add_argument("--number", type=int, default=100, help="Calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs; the best is reported")
+    subparsers = parser.add_subparsers(dest="benchmark")
+    for name, module in BENCHMARKS.items():
+        module.add_arguments(subparsers.add_parser(name))
+    args = parser.parse_args(argv)
+    if args.benchmark is None:
+        args = parser.parse_args([*(argv if argv is not None else sys.argv[1:]), "suite"])
+    BENCHMARKS[args.benchmark].run(args)
+
+
+if __name__ == "__main__":
+    main()
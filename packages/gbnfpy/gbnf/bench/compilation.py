@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from ..rules_builder import RulesBuilder
+from ..rules_builder.tokenizer import tokenize
+from . import DEFAULT_GRAMMARS_DIR, load_grammars, time_call
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", help="Grammar names to run (defaults to every grammar)")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+
+
+def run(args):
+    grammars = load_grammars(args.grammars, args.names)
+    if not grammars:
+        raise SystemExit(f"No grammars found in {args.grammars}")
+
+    print(f"{'grammar':<12} {'chars':>7} {'rules':>6} {'tokenize (us)':>14} {'compile (us)':>13} {'chars/s':>12}")
+    for name, grammar in grammars.items():
+        tokenize_time = time_call(lambda grammar=grammar: tokenize(grammar), args.number, args.repeat)
+        compile_time = time_call(lambda grammar=grammar: RulesBuilder(grammar), args.number, args.repeat)
+        rules = len(RulesBuilder(grammar).rules)
+        print(
+            f"{name:<12} {len(grammar):>7} {rules:>6} {tokenize_time * 1e6:>14.1f} "
+            f"{compile_time * 1e6:>13.1f} {len(grammar) / compile_time:>12,.0f}",
+        )
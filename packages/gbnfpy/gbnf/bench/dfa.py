@@ -0,0 +1,63 @@
+from pathlib import Path
+from time import perf_counter
+
+from ..GBNF import GBNF
+from ..grammar_graph.lazy_dfa import DEFAULT_MAX_STATES
+from . import DEFAULT_GRAMMARS_DIR, DEFAULT_SAMPLES_DIR, load_grammars, load_samples
+from .matching import generate_input
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", help="Grammar names to run (defaults to every grammar)")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+    parser.add_argument(
+        "--samples", type=Path, default=DEFAULT_SAMPLES_DIR, help="Directory of <grammar>.json sample outputs",
+    )
+    parser.add_argument("--length", type=int, default=20_000, help="Code points of generated input per grammar")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generating input")
+    parser.add_argument("--max-states", type=int, default=DEFAULT_MAX_STATES, help="Cap on DFA states")
+
+
+# Returns the best time to parse every text from the initial state, and the
+# initial state of the last run. Cold runs start from a fresh graph, so
+# nothing has been resolved and the DFA has no states yet.
+def time_add(grammar: str, texts: list[str], repeat: int, warm: bool, dfa: bool | int) -> tuple[float, object]:
+    best = float("inf")
+    initial = GBNF(grammar, memory_cache=None, dfa=dfa)
+    for _ in range(repeat):
+        if not warm:
+            initial = GBNF(grammar, memory_cache=None, dfa=dfa)
+        start = perf_counter()
+        for text in texts:
+            initial.add(text)
+        best = min(best, perf_counter() - start)
+    return best, initial
+
+
+def run(args):
+    grammars = load_grammars(args.grammars, args.names)
+    if not grammars:
+        raise SystemExit(f"No grammars found in {args.grammars}")
+
+    print("code points per second, simulating the graph and matching through a lazy DFA")
+    print(
+        f"{'grammar':<12} {'input':<10} {'code points':>12} {'simulated':>11} {'dfa cold':>11} {'dfa warm':>11} "
+        f"{'speedup':>8} {'states':>7}",
+    )
+    for name, grammar in grammars.items():
+        inputs = {"generated": [generate_input(grammar, args.length, args.seed)]}
+        samples = load_samples(args.samples, name)
+        if samples:
+            inputs["samples"] = samples
+        for source, texts in inputs.items():
+            code_points = sum(map(len, texts))
+            if not code_points:
+                continue
+            simulated, _ = time_add(grammar, texts, args.repeat, warm=True, dfa=False)
+            cold, _ = time_add(grammar, texts, args.repeat, warm=False, dfa=args.max_states)
+            warm, initial = time_add(grammar, texts, args.repeat, warm=True, dfa=args.max_states)
+            print(
+                f"{name:<12} {source:<10} {code_points:>12} {code_points / simulated:>11,.0f} "
+                f"{code_points / cold:>11,.0f} {code_points / warm:>11,.0f} {simulated / warm:>7.1f}x "
+                f"{len(initial.graph.dfa):>7}",
+            )
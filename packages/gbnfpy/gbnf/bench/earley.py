@@ -0,0 +1,86 @@
+import random
+from functools import partial
+from time import perf_counter
+
+from ..GBNF import GBNF
+
+LEFT_RECURSIVE_ARITHMETIC = r"""root ::= expr
+expr ::= expr ("+" | "-") term | term
+term ::= term ("*" | "/") factor | factor
+factor ::= number | "(" expr ")"
+number ::= [0-9]+
+"""
+
+# The same language without left recursion, which the graph engine accepts
+ITERATIVE_ARITHMETIC = r"""root ::= expr
+expr ::= term (("+" | "-") term)*
+term ::= factor (("*" | "/") factor)*
+factor ::= number | "(" expr ")"
+number ::= [0-9]+
+"""
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--tokens", type=int, nargs="+", default=[1_000, 10_000], help="Tokens per generated expression",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generating expressions")
+
+
+# A random arithmetic expression of about `tokens` numbers, operators and
+# parentheses
+def generate_arithmetic(tokens: int, generator: random.Random) -> str:
+    parts = []
+    depth = 0
+    operand = True
+    while len(parts) < tokens:
+        if operand:
+            if generator.random() < 0.2 and len(parts) + depth + 3 < tokens:
+                parts.append("(")
+                depth += 1
+                continue
+            parts.append(str(generator.randint(0, 999)))
+            operand = False
+        elif depth and generator.random() < 0.25:
+            parts.append(")")
+            depth -= 1
+        else:
+            parts.append(generator.choice("+-*/"))
+            operand = True
+    if operand:
+        parts.append("0")
+    return "".join(parts) + ")" * depth
+
+
+# Returns the seconds taken to feed the text in one code point at a time, as a
+# decoder would
+def time_feed(grammar: str, text: str, engine: str) -> float:
+    state = GBNF(grammar, memory_cache=None, engine=engine)
+    start = perf_counter()
+    for char in text:
+        state = state.add(char)
+    return perf_counter() - start
+
+
+def best_of(repeat: int, fn) -> float:
+    return min(fn() for _ in range(max(1, repeat)))
+
+
+def run(args):
+    print(
+        f"{'grammar':<16} {'engine':<7} {'tokens':>7} {'code points':>12} {'time (s)':>9} {'cp/s':>10} "
+        f"{'us/token':>9}",
+    )
+    for tokens in args.tokens:
+        text = generate_arithmetic(tokens, random.Random(args.seed))
+        runs = [
+            ("left-recursive", LEFT_RECURSIVE_ARITHMETIC, "earley"),
+            ("iterative", ITERATIVE_ARITHMETIC, "earley"),
+            ("iterative", ITERATIVE_ARITHMETIC, "graph"),
+        ]
+        for label, grammar, engine in runs:
+            seconds = best_of(args.repeat, partial(time_feed, grammar, text, engine))
+            print(
+                f"{label:<16} {engine:<7} {tokens:>7} {len(text):>12} {seconds:>9.3f} {len(text) / seconds:>10,.0f} "
+                f"{seconds / tokens * 1e6:>9.1f}",
+            )
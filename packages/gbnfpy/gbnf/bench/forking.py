@@ -0,0 +1,77 @@
+import random
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+from ..GBNF import GBNF
+from ..grammar_graph.parse_state import ParseState
+from . import DEFAULT_GRAMMARS_DIR, load_grammars
+from .matching import add_random_code_point
+
+
+def add_arguments(parser):
+    parser.add_argument("name", nargs="?", default="json", help="Grammar to run")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+    parser.add_argument("--beams", type=int, default=64, help="Hypotheses kept at every step")
+    parser.add_argument("--steps", type=int, default=2000, help="Code points added to every beam")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for choosing forks and input")
+
+
+# Runs a beam search where, at every step, each beam forks from a random beam
+# of the previous step and adds a random code point that keeps it valid. Every state
+# is kept, as a search holding each hypothesis' history would. With `copy`,
+# each state gets a private copy of its pointer set, which is what sharing
+# saves. Returns the states, so they stay alive while memory is measured.
+def run_beams(initial: ParseState, beams: int, steps: int, seed: int, copy: bool = False) -> list[list[ParseState]]:
+    generator = random.Random(seed)
+    graph = initial.graph
+    history = [[initial] * beams]
+    for _ in range(steps):
+        states = []
+        for _ in range(beams):
+            parent = generator.choice(history[-1])
+            step = add_random_code_point(parent, generator)
+            state = parent if step is None else step[1]
+            if copy:
+                pointers = frozenset(list(state.pointers))
+                state = ParseState.__new__(ParseState)
+                object.__setattr__(state, "graph", graph)
+                object.__setattr__(state, "pointers", pointers)
+            states.append(state)
+        history.append(states)
+    return history
+
+
+def measure(grammar: str, args, copy: bool) -> dict:
+    initial = GBNF(grammar, memory_cache=None)
+    # Warm the graph's caches first, so only what the states hold is counted
+    run_beams(initial, args.beams, args.steps, args.seed)
+    tracemalloc.start()
+    start = perf_counter()
+    history = run_beams(initial, args.beams, args.steps, args.seed, copy)
+    seconds = perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    forks = args.beams * args.steps
+    return {
+        "seconds": seconds,
+        "retained": retained,
+        "per_fork": retained / forks,
+        "sets": len({id(state.pointers) for states in history for state in states}),
+    }
+
+
+def run(args):
+    grammars = load_grammars(args.grammars, [args.name])
+    if not grammars:
+        raise SystemExit(f"No grammar named {args.name} in {args.grammars}")
+    grammar = grammars[args.name]
+
+    print(f"{args.beams} beams x {args.steps} steps of {args.name}")
+    print(f"{'pointer sets':<14} {'time (s)':>9} {'retained (KiB)':>15} {'per fork (B)':>13} {'distinct sets':>14}")
+    for label, copy in (("shared", False), ("copied", True)):
+        result = measure(grammar, args, copy)
+        print(
+            f"{label:<14} {result['seconds']:>9.2f} {result['retained'] / 1024:>15,.0f} "
+            f"{result['per_fork']:>13.1f} {result['sets']:>14,}",
+        )
@@ -0,0 +1,94 @@
+import random
+from pathlib import Path
+from time import perf_counter
+
+from ..GBNF import GBNF
+from ..grammar_graph.graph import get_input_as_code_points
+from . import DEFAULT_GRAMMARS_DIR, load_grammars
+from .matching import generate_input
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", default=["sql"], help="Corpus grammars to run (defaults to sql)")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+    parser.add_argument("--enum", type=int, default=5_000, help="Names in the generated enum grammar; 0 skips it")
+    parser.add_argument("--length", type=int, default=20_000, help="Code points of input per grammar")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generating grammars and input")
+
+
+# A grammar of comma-separated product names drawn from `count` alternates,
+# and input of about `length` code points it accepts
+def make_enum_grammar(count: int, length: int, generator: random.Random) -> tuple[str, str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    names = set()
+    while len(names) < count:
+        words = ("".join(generator.choices(letters, k=generator.randint(3, 9))) for _ in range(3))
+        names.add(" ".join(words))
+    names = sorted(names)
+    grammar = "root ::= product (\", \" product)*\nproduct ::= " + " | ".join(f'"{name}"' for name in names)
+    picked = [generator.choice(names)]
+    while sum(map(len, picked)) + 2 * len(picked) < length:
+        picked.append(generator.choice(names))
+    return grammar, ", ".join(picked)
+
+
+# The pointers alive before each code point of the text is matched, with and
+# without pruning by the next code point
+def count_live_pointers(grammar: str, text: str, lookahead: bool) -> list[int]:
+    graph = GBNF(grammar, memory_cache=None, lookahead=lookahead).graph
+    code_points = get_input_as_code_points(text)
+    counts = []
+    if lookahead:
+        index = graph.lookahead
+        matched = index.get_entries(graph.get_initial_pointers(), code_points[0])
+        for next_code_point in code_points[1:]:
+            matched = index.step(matched, next_code_point)
+            counts.append(len(matched))
+    else:
+        pointers = graph.get_initial_pointers()
+        for code_point in code_points[:-1]:
+            pointers = graph.parse(pointers, code_point)
+            counts.append(len(pointers))
+    return counts
+
+
+# Returns the best time to match the text in one call, from a graph that has
+# already matched it once
+def time_add(grammar: str, text: str, repeat: int, lookahead: bool) -> float:
+    initial = GBNF(grammar, memory_cache=None, lookahead=lookahead)
+    initial.add(text)
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        start = perf_counter()
+        initial.add(text)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def run(args):
+    generator = random.Random(args.seed)
+    grammars = {}
+    if args.enum > 0:
+        grammars[f"enum-{args.enum}"] = make_enum_grammar(args.enum, args.length, generator)
+    for name, grammar in load_grammars(args.grammars, args.names).items():
+        grammars[name] = (grammar, generate_input(grammar, args.length, args.seed))
+    if not grammars:
+        raise SystemExit(f"No grammars found in {args.grammars}")
+
+    print("live pointers per code point and code points per second, without and with the lookahead index")
+    print(
+        f"{'grammar':<12} {'code points':>12} {'mean live':>10} {'pruned':>8} {'max live':>9} {'pruned':>8} "
+        f"{'cp/s':>11} {'pruned':>11} {'speedup':>8}",
+    )
+    for name, (grammar, text) in grammars.items():
+        if len(text) < 2:
+            continue
+        live = count_live_pointers(grammar, text, lookahead=False)
+        pruned = count_live_pointers(grammar, text, lookahead=True)
+        plain_time = time_add(grammar, text, args.repeat, lookahead=False)
+        pruned_time = time_add(grammar, text, args.repeat, lookahead=True)
+        print(
+            f"{name:<12} {len(text):>12} {sum(live) / len(live):>10.1f} {sum(pruned) / len(pruned):>8.1f} "
+            f"{max(live):>9} {max(pruned):>8} {len(text) / plain_time:>11,.0f} {len(text) / pruned_time:>11,.0f} "
+            f"{plain_time / pruned_time:>7.1f}x",
+        )
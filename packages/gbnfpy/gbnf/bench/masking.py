@@ -0,0 +1,112 @@
+from pathlib import Path
+from time import perf_counter
+
+from ..cache.mask_cache import MaskCache
+from ..GBNF import GBNF
+from ..rules_builder.errors import InputParseError
+from ..vocabulary import Vocabulary
+from . import DEFAULT_GRAMMARS_DIR, DEFAULT_SAMPLES_DIR, load_grammars, load_samples, make_vocabulary
+from .matching import generate_input
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", default=["json"], help="Grammar names to run")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+    parser.add_argument(
+        "--samples", type=Path, default=DEFAULT_SAMPLES_DIR, help="Directory of <grammar>.json sample outputs",
+    )
+    parser.add_argument("--vocab", type=Path, help="tokenizer.json or JSON list of tokens (defaults to synthetic)")
+    parser.add_argument("--size", type=int, default=128_000, help="Tokens in the synthetic vocabulary")
+    parser.add_argument("--states", type=int, default=50, help="States to compute masks for, per grammar")
+    parser.add_argument("--naive", type=int, default=2, help="States to also check one token at a time")
+    parser.add_argument(
+        "--decode", type=int, default=5000, help="Code points of samples to decode through a mask cache, per grammar",
+    )
+
+
+# States met while parsing the grammar's samples, evenly spaced, or states of
+# a random walk if the grammar has no samples
+def get_states(grammar: str, samples: list[str], count: int) -> list:
+    states = get_sample_states(grammar, samples or [generate_input(grammar, count)])
+    step = max(1, len(states) // count)
+    return states[::step][:count]
+
+
+# Every state met while parsing the samples, in order
+def get_sample_states(grammar: str, samples: list[str], limit: int | None = None) -> list:
+    initial = GBNF(grammar, memory_cache=None)
+    states = [initial]
+    for sample in samples:
+        state = initial
+        for char in sample:
+            state = state.add(char)
+            states.append(state)
+    return states[:limit]
+
+
+def count_naively(state, tokens: list[str | None]) -> int:
+    allowed = 0
+    for text in tokens:
+        if not text:
+            continue
+        try:
+            state.add(text)
+        except InputParseError:
+            continue
+        allowed += 1
+    return allowed
+
+
+def run(args):
+    start = perf_counter()
+    vocab = Vocabulary.from_file(args.vocab) if args.vocab else Vocabulary(make_vocabulary(args.size))
+    seconds = perf_counter() - start
+    print(f"vocabulary of {len(vocab):,} tokens, {vocab.node_count:,} trie nodes, built in {seconds:.2f}s")
+    grammars = load_grammars(args.grammars, args.names)
+    if not grammars:
+        raise SystemExit(f"No grammars found in {args.grammars}")
+
+    print(f"{'grammar':<12} {'states':>7} {'allowed':>9} {'mean (ms)':>10} {'max (ms)':>9} {'naive (ms)':>11}")
+    for name, grammar in grammars.items():
+        states = get_states(grammar, load_samples(args.samples, name), args.states)
+        times = []
+        allowed = 0
+        for state in states:
+            start = perf_counter()
+            mask = state.allowed_tokens(vocab)
+            times.append(perf_counter() - start)
+            allowed += len(mask)
+        naive = "-"
+        if args.naive:
+            start = perf_counter()
+            for state in states[: args.naive]:
+                count_naively(state, vocab.tokens)
+            naive = f"{(perf_counter() - start) / min(args.naive, len(states)) * 1e3:.1f}"
+        print(
+            f"{name:<12} {len(states):>7} {allowed // len(states):>9,} {sum(times) / len(times) * 1e3:>10.2f} "
+            f"{max(times) * 1e3:>9.2f} {naive:>11}",
+        )
+
+    if args.decode:
+        print()
+        run_decode(args, vocab, grammars)
+
+
+# Asks a mask cache for a mask at every code point of the samples, as a
+# decoder would at every token. A decoder stops at fewer states, all of which
+# are among these, so the hit rate here is if anything pessimistic.
+def run_decode(args, vocab: Vocabulary, grammars: dict[str, str]):
+    print(f"{'grammar':<12} {'steps':>7} {'hit rate':>9} {'amortized (ms)':>15} {'entries':>8} {'KiB':>8}")
+    for name, grammar in grammars.items():
+        samples = load_samples(args.samples, name) or [generate_input(grammar, args.decode)]
+        states = get_sample_states(grammar, samples, args.decode)
+        cache = MaskCache(vocab)
+        start = perf_counter()
+        for state in states:
+            cache.get(state)
+        seconds = perf_counter() - start
+        stats = cache.stats
+        print(
+            f"{name:<12} {len(states):>7} {stats.hit_rate:>9.1%} {seconds / len(states) * 1e3:>15.3f} "
+            f"{stats.entries:>8} {stats.bytes / 1024:>8,.0f}",
+        )
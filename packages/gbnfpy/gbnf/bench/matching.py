@@ -0,0 +1,106 @@
+import random
+from functools import cache
+from pathlib import Path
+from time import perf_counter
+
+from ..GBNF import GBNF
+from ..grammar_graph.types import END
+from . import DEFAULT_GRAMMARS_DIR, DEFAULT_SAMPLES_DIR, load_grammars, load_samples
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", help="Grammar names to run (defaults to every grammar)")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+    parser.add_argument(
+        "--samples", type=Path, default=DEFAULT_SAMPLES_DIR, help="Directory of <grammar>.json sample outputs",
+    )
+    parser.add_argument("--length", type=int, default=2000, help="Code points of generated input per grammar")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generating input")
+
+
+@cache
+def get_printable_ascii(char_class) -> list[int]:
+    return [code_point for code_point in range(32, 127) if code_point in char_class]
+
+
+# Picks a code point a char class matches, preferring ASCII so inputs look like
+# something a model would write
+def pick_code_point(char_class, generator: random.Random) -> int:
+    ascii_members = get_printable_ascii(char_class)
+    if ascii_members:
+        return generator.choice(ascii_members)
+    start, end = generator.choice(char_class.intervals)
+    return generator.randint(start, min(end, start + 0xFF))
+
+
+# Adds a random code point that keeps the input valid and returns it with the
+# new state, or returns None if the grammar allows nothing more. Code points
+# that would complete the input are avoided while there are others, so that
+# walks keep going rather than settling in trailing whitespace.
+def add_random_code_point(state, generator: random.Random):
+    classes = sorted((rule for rule in state.rules() if rule is not END), key=lambda rule: rule.intervals)
+    generator.shuffle(classes)
+    fallback = None
+    for char_class in classes:
+        char = chr(pick_code_point(char_class, generator))
+        next_state = state.add(char)
+        if all(rule is not END for rule in next_state.rules()):
+            return char, next_state
+        fallback = fallback or (char, next_state)
+    return fallback
+
+
+# Generates input the grammar accepts so far by walking the matcher. Returns
+# less than `length` code points if the grammar runs out.
+def generate_input(grammar: str, length: int, seed: int = 0) -> str:
+    generator = random.Random(seed)
+    state = GBNF(grammar, memory_cache=None)
+    chars = []
+    while len(chars) < length:
+        step = add_random_code_point(state, generator)
+        if step is None:
+            break
+        char, state = step
+        chars.append(char)
+    return "".join(chars)
+
+
+# Returns the best time to parse every text from the initial state
+def time_add(grammar: str, texts: list[str], repeat: int, warm: bool) -> float:
+    best = float("inf")
+    initial = GBNF(grammar, memory_cache=None)
+    for _ in range(repeat):
+        if not warm:
+            # A fresh graph has resolved nothing yet
+            initial = GBNF(grammar, memory_cache=None)
+        start = perf_counter()
+        for text in texts:
+            initial.add(text)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def run(args):
+    grammars = load_grammars(args.grammars, args.names)
+    if not grammars:
+        raise SystemExit(f"No grammars found in {args.grammars}")
+
+    print(f"{'grammar':<12} {'input':<10} {'code points':>12} {'cold (cp/s)':>13} {'warm (cp/s)':>13} {'stacks':>8}")
+    for name, grammar in grammars.items():
+        inputs = {"generated": [generate_input(grammar, args.length, args.seed)]}
+        samples = load_samples(args.samples, name)
+        if samples:
+            inputs["samples"] = samples
+        for source, texts in inputs.items():
+            code_points = sum(map(len, texts))
+            if not code_points:
+                continue
+            cold = time_add(grammar, texts, args.repeat, warm=False)
+            warm = time_add(grammar, texts, args.repeat, warm=True)
+            state = GBNF(grammar, memory_cache=None)
+            for text in texts:
+                state.add(text)
+            print(
+                f"{name:<12} {source:<10} {code_points:>12} {code_points / cold:>13,.0f} "
+                f"{code_points / warm:>13,.0f} {len(state.graph.stack_returns):>8}",
+            )
@@ -0,0 +1,49 @@
+import dataclasses
+from pathlib import Path
+
+from ..GBNF import parse_grammar
+from ..rules_builder.optimizer import Optimizations
+from ..rules_builder.types import InternalRuleType
+from . import DEFAULT_GRAMMARS_DIR, load_grammars, time_call
+
+PASSES = ("dedupe", "prune", "inline", "merge_chars", "left_factor")
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", help="Grammar names to run (defaults to every grammar)")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+
+
+# No passes, each pass on its own, then every pass
+def get_configurations() -> list[tuple[str, Optimizations | None]]:
+    no_passes = Optimizations(**dict.fromkeys(PASSES, False))
+    return [
+        ("none", None),
+        *((name, dataclasses.replace(no_passes, **{name: True})) for name in PASSES),
+        ("all", Optimizations()),
+    ]
+
+
+# Every alternate is a path a matcher may have to follow
+def count_alternates(rules) -> int:
+    return sum(1 + sum(element["type"] is InternalRuleType.ALT for element in rule) for rule in rules if rule)
+
+
+def run(args):
+    grammars = load_grammars(args.grammars, args.names)
+    if not grammars:
+        raise SystemExit(f"No grammars found in {args.grammars}")
+
+    print(f"{'grammar':<12} {'passes':<12} {'rules':>6} {'elements':>9} {'alternates':>11} {'compile (us)':>13}")
+    for name, grammar in grammars.items():
+        for passes, optimizations in get_configurations():
+            def compile_grammar(grammar=grammar, optimizations=optimizations):
+                return parse_grammar(grammar, optimizations=optimizations)
+
+            rules, _ = compile_grammar()
+            seconds = time_call(compile_grammar, args.number, args.repeat)
+            elements = sum(len(rule) for rule in rules)
+            print(
+                f"{name:<12} {passes:<12} {len(rules):>6} {elements:>9} {count_alternates(rules):>11} "
+                f"{seconds * 1e6:>13.1f}",
+            )
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from ..rules_builder import ProfilingRulesBuilder
+from ..rules_builder.profiling import PHASES
+from . import DEFAULT_GRAMMARS_DIR, load_grammars
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", help="Grammar names to run (defaults to every grammar)")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+    parser.add_argument("--dedupe", action="store_true", help="Deduplicate identical generated rules")
+
+
+def run(args):
+    grammars = load_grammars(args.grammars, args.names)
+    if not grammars:
+        raise SystemExit(f"No grammars found in {args.grammars}")
+
+    phases = " ".join(f"{phase + ' (us)':>18}" for phase in PHASES)
+    print(f"{'grammar':<12} {phases} {'generated':>10} {'deduped':>8} {'elements':>9} {'depth':>6}")
+    for name, grammar in grammars.items():
+        # Keep the run with the lowest total time
+        stats = min(
+            (ProfilingRulesBuilder(grammar, dedupe=args.dedupe).stats for _ in range(args.repeat * args.number)),
+            key=lambda stats: stats.total_time,
+        )
+        times = " ".join(f"{stats.phase_times[phase] * 1e6:>18.1f}" for phase in PHASES)
+        print(
+            f"{name:<12} {times} {stats.generated_rules:>10} {stats.dedupe_ratio:>8.1%} "
+            f"{stats.elements:>9} {stats.max_depth:>6}",
+        )
@@ -0,0 +1,26 @@
+from ..rules_builder import RulesBuilder
+from . import make_rule_name, make_synthetic_grammar, time_call
+
+
+def add_arguments(parser):
+    parser.add_argument("--rules", type=int, default=5000, help="Number of rules in the synthetic grammar")
+
+
+def run(args):
+    grammar = make_synthetic_grammar(args.rules)
+    edited_name = make_rule_name(args.rules // 2)
+    body = grammar.split(f"\n{edited_name} ::= ", 1)[1].split("\n", 1)[0]
+    new_body = body.replace('"', '"edited-', 1)
+    edited = grammar.replace(f"\n{edited_name} ::= {body}\n", f"\n{edited_name} ::= {new_body}\n")
+    assert edited != grammar
+
+    base = RulesBuilder(grammar)
+    number = max(1, args.number // 10)
+    full = time_call(lambda: RulesBuilder(edited), number, args.repeat)
+    recompile = time_call(lambda: base.recompile(edited), number, args.repeat)
+    update = time_call(lambda: base.update({edited_name: new_body}), number, args.repeat)
+
+    print(f"Editing '{edited_name}' in a {args.rules}-rule grammar ({len(grammar):,} chars)")
+    print(f"{'full compile':<14} {full * 1e3:>10.2f} ms")
+    print(f"{'recompile':<14} {recompile * 1e3:>10.2f} ms {full / recompile:>8.1f}x")
+    print(f"{'update':<14} {update * 1e3:>10.2f} ms {full / update:>8.1f}x")
@@ -0,0 +1,148 @@
+import gc
+import json
+import platform
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+from ..cache.disk_cache import get_library_version
+from ..GBNF import build_rules
+from ..rules_builder import RulesBuilder
+from . import (
+    DEFAULT_GRAMMARS_DIR,
+    load_grammars,
+    make_alternation_grammar,
+    make_char_class_grammar,
+    make_nested_grammar,
+    scale_grammar,
+    time_call,
+)
+
+# Large cases are timed with fewer calls so each timing run stays near this long
+TARGET_RUN_SECONDS = 0.2
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", help="Grammar names to run (defaults to every grammar)")
+    parser.add_argument("--grammars", type=Path, default=DEFAULT_GRAMMARS_DIR, help="Directory of .gbnf files")
+    parser.add_argument("--scale-grammar", default="json", help="Corpus grammar to scale up")
+    parser.add_argument("--scales", type=int, nargs="*", default=[10, 100, 1000], help="Copies of the scaled grammar")
+    parser.add_argument("--depth", type=int, default=10000, help="Parenthesis nesting depth of the pathological case")
+    parser.add_argument("--width", type=int, default=10000, help="Items in the long char class and alternation cases")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON instead of a table")
+    parser.add_argument("--output", type=Path, help="Also write the JSON results to this file")
+
+
+def get_cases(args) -> list[tuple[str, str, str]]:
+    grammars = load_grammars(args.grammars)
+    cases = [("corpus", name, grammar) for name, grammar in grammars.items() if not args.names or name in args.names]
+    if args.scale_grammar in grammars:
+        base = grammars[args.scale_grammar]
+        cases.extend(("scaled", f"{args.scale_grammar}-{scale}x", scale_grammar(base, scale)) for scale in args.scales)
+    cases.extend(
+        [
+            ("pathological", f"nested-{args.depth}", make_nested_grammar(args.depth)),
+            ("pathological", f"char-class-{args.width}", make_char_class_grammar(args.width)),
+            ("pathological", f"alternation-{args.width}", make_alternation_grammar(args.width)),
+            ("pathological", f"literal-{args.width}", f'root ::= "{"x" * args.width}"\n'),
+        ],
+    )
+    return cases
+
+
+# Peak traced memory of a single call, and the number of memory blocks still
+# allocated once it returns, i.e. held by its result
+def measure_memory(fn) -> tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        blocks = sys.getallocatedblocks()
+        result = fn()
+        retained_blocks = sys.getallocatedblocks() - blocks
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, retained_blocks
+
+
+def measure(fn, size: int, args) -> dict:
+    start = perf_counter()
+    fn()
+    estimate = perf_counter() - start
+    number = max(1, min(args.number, int(TARGET_RUN_SECONDS / max(estimate, 1e-9))))
+    seconds = time_call(fn, number, args.repeat)
+    peak_bytes, retained_blocks = measure_memory(fn)
+    return {
+        "seconds": seconds,
+        "chars_per_second": size / seconds,
+        "peak_bytes": peak_bytes,
+        "retained_blocks": retained_blocks,
+    }
+
+
+def run_suite(args) -> dict:
+    results = []
+    for group, name, grammar in get_cases(args):
+        builder = RulesBuilder(grammar)
+        result = {
+            "group": group,
+            "name": name,
+            "chars": len(grammar),
+            "rules": len(builder.rules),
+            "elements": sum(len(rule) for rule in builder.rules),
+            "rules_builder": measure(lambda grammar=grammar: RulesBuilder(grammar), len(grammar), args),
+        }
+        if "root" in builder.symbol_ids:
+            result["gbnf"] = measure(
+                lambda grammar=grammar: build_rules(grammar, memory_cache=None), len(grammar), args,
+            )
+            rules, _ = build_rules(grammar, memory_cache=None, optimize=True)
+            result["gbnf_optimized"] = {
+                "rules": len(rules),
+                "elements": sum(len(rule) for rule in rules),
+                **measure(
+                    lambda grammar=grammar: build_rules(grammar, memory_cache=None, optimize=True), len(grammar), args,
+                ),
+            }
+        results.append(result)
+    return {
+        "version": get_library_version(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "number": args.number,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+
+def print_table(report: dict):
+    print(
+        f"{'group':<13} {'grammar':<20} {'chars':>9} {'rules':>7} {'compile (us)':>13} "
+        f"{'chars/s':>12} {'peak (KiB)':>11} {'blocks':>9} {'GBNF (us)':>11} {'optimized (us)':>15} {'opt. rules':>11}",
+    )
+    for result in report["results"]:
+        build = result["rules_builder"]
+        gbnf = f"{result['gbnf']['seconds'] * 1e6:>11.1f}" if "gbnf" in result else f"{'-':>11}"
+        if "gbnf_optimized" in result:
+            optimized = result["gbnf_optimized"]
+            gbnf += f" {optimized['seconds'] * 1e6:>15.1f} {optimized['rules']:>11}"
+        else:
+            gbnf += f" {'-':>15} {'-':>11}"
+        print(
+            f"{result['group']:<13} {result['name']:<20} {result['chars']:>9} {result['rules']:>7} "
+            f"{build['seconds'] * 1e6:>13.1f} {build['chars_per_second']:>12,.0f} "
+            f"{build['peak_bytes'] / 1024:>11.1f} {build['retained_blocks']:>9} {gbnf}",
+        )
+
+
+def run(args):
+    report = run_suite(args)
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report)
@@ -0,0 +1,101 @@
+import json
+
+from ..GBNF import GBNF
+from ..rules_builder import RulesBuilder
+from . import scale_grammar
+from .__main__ import main
+from .matching import generate_input
+
+
+def test_scale_grammar_renames_every_copy():
+    builder = RulesBuilder(scale_grammar('root ::= item+\nitem ::= "x"\n', 3))
+    assert list(builder.definitions) == ["root", "root-a", "item-a", "root-b", "item-b", "root-c", "item-c"]
+
+
+def test_suite_reports_json(capsys, tmp_path):
+    output = tmp_path / "bench.json"
+    main(
+        [
+            "--number", "1", "--repeat", "1",
+            "suite", "yes-no", "--scales", "2", "--depth", "5", "--width", "10", "--json", "--output", str(output),
+        ],
+    )
+    report = json.loads(capsys.readouterr().out)
+    assert report == json.loads(output.read_text())
+    names = [result["name"] for result in report["results"]]
+    assert names == ["yes-no", "json-2x", "nested-5", "char-class-10", "alternation-10", "literal-10"]
+    for result in report["results"]:
+        assert result["rules_builder"]["seconds"] > 0
+        assert result["rules_builder"]["peak_bytes"] > 0
+        assert "gbnf" in result
+        assert result["gbnf_optimized"]["elements"] > 0
+
+
+def test_match_reports_throughput(capsys):
+    main(["--repeat", "1", "match", "chess", "--length", "50"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split()[:3] == ["grammar", "input", "code"]
+    assert lines[1].split()[:3] == ["chess", "generated", "50"]
+
+
+def test_dfa_reports_throughput(capsys):
+    main(["--repeat", "1", "dfa", "chess", "--length", "50", "--max-states", "4"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split()[:3] == ["grammar", "input", "code"]
+    row = lines[2].split()
+    assert row[:3] == ["chess", "generated", "50"]
+    assert row[-1] == "4"
+
+
+def test_earley_reports_throughput(capsys):
+    main(["--repeat", "1", "earley", "--tokens", "30"])
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[:3] for line in lines[1:]] == [
+        ["left-recursive", "earley", "30"],
+        ["iterative", "earley", "30"],
+        ["iterative", "graph", "30"],
+    ]
+
+
+def test_lookahead_reports_live_pointers(capsys):
+    main(["--repeat", "1", "lookahead", "json", "--enum", "50", "--length", "200"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split()[:3] == ["grammar", "code", "points"]
+    assert [line.split()[0] for line in lines[2:]] == ["enum-50", "json"]
+    enum = lines[2].split()
+    # Fewer pointers are alive on average with the index
+    assert float(enum[3]) < float(enum[2])
+
+
+def test_generated_input_is_accepted():
+    grammar = 'root ::= "[" ([0-9]+ ("," [0-9]+)*)? "]" [\\u4e00-\\u9fff]*'
+    text = generate_input(grammar, 40, seed=1)
+    assert len(text) == 40
+    GBNF(grammar, text, memory_cache=None)
+
+
+def test_fork_reports_memory(capsys):
+    main(["fork", "chess", "--beams", "4", "--steps", "20"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "4 beams x 20 steps of chess"
+    shared, copied = (line.split() for line in lines[2:])
+    assert shared[0] == "shared"
+    assert copied[0] == "copied"
+    assert int(copied[-1].replace(",", "")) == 4 * 20 + 1
+
+
+def test_mask_reports_timings(capsys):
+    main(["mask", "json", "--size", "500", "--states", "3", "--naive", "1", "--decode", "0"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("vocabulary of 500 tokens")
+    assert lines[2].split()[:2] == ["json", "3"]
+    assert len(lines) == 3
+
+
+def test_mask_reports_cached_decoding(capsys):
+    main(["mask", "json", "--size", "500", "--states", "3", "--naive", "0", "--decode", "200"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[4].startswith("grammar")
+    name, steps, hit_rate, *_ = lines[5].split()
+    assert (name, steps) == ("json", "200")
+    assert 0 < float(hit_rate.rstrip("%")) < 100
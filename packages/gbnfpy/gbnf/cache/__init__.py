@@ -0,0 +1,23 @@
+from ..lazy import lazy_attributes
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .disk_cache import DiskCache as DiskCache
+    from .mask_cache import MaskCache as MaskCache
+    from .memory_cache import CacheStats as CacheStats
+    from .memory_cache import MemoryCache as MemoryCache
+    from .memory_cache import default_memory_cache as default_memory_cache
+
+# The disk cache pulls in hashlib, mmap, tempfile and importlib.metadata, so
+# nothing here is imported until it is used
+_LAZY_ATTRIBUTES = {
+    "CacheStats": ".memory_cache",
+    "DiskCache": ".disk_cache",
+    "MaskCache": ".mask_cache",
+    "MemoryCache": ".memory_cache",
+    "default_memory_cache": ".memory_cache",
+}
+
+__all__ = [*_LAZY_ATTRIBUTES]
+
+__getattr__, __dir__ = lazy_attributes(globals(), _LAZY_ATTRIBUTES)
@@ -0,0 +1,149 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from pathlib import Path
+
+from ..rules_builder.compact_rules import CompactRules, from_little_endian, to_little_endian
+
+# Bump whenever the layout written by `encode` changes; older files are rebuilt
+FORMAT_VERSION = 1
+MAGIC = b"GBNFC"
+# magic, format version, element pairs, offsets, symbols, symbol name bytes
+HEADER = struct.Struct("<5sIIIII")
+FILE_SUFFIX = ".gbnfc"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def get_library_version() -> str:
+    # importlib.metadata is slow to import, so it is only loaded once a cache is used
+    from importlib import metadata
+
+    try:
+        return metadata.version("gbnf")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def get_default_cache_dir() -> Path:
+    if os.environ.get("GBNF_CACHE_DIR"):
+        return Path(os.environ["GBNF_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "gbnf"
+
+
+class StaleCacheFileError(Exception):
+    pass
+
+
+def encode(rules: CompactRules, symbol_ids: dict[str, int]) -> bytes:
+    names = "\0".join(symbol_ids).encode("utf-8")
+    ids = array("I", symbol_ids.values())
+    return b"".join(
+        [
+            HEADER.pack(MAGIC, FORMAT_VERSION, len(rules.data) // 2, len(rules.offsets), len(ids), len(names)),
+            to_little_endian(rules.data),
+            to_little_endian(rules.offsets),
+            to_little_endian(ids),
+            names,
+        ],
+    )
+
+
+def decode(buffer) -> tuple[CompactRules, dict[str, int]]:
+    if len(buffer) < HEADER.size:
+        raise StaleCacheFileError("Truncated header")
+    magic, version, num_elements, num_offsets, num_symbols, names_size = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise StaleCacheFileError(f"Unsupported cache format {magic!r} v{version}")
+    itemsize = array("I").itemsize
+    sizes = [num_elements * 2 * itemsize, num_offsets * itemsize, num_symbols * itemsize, names_size]
+    if HEADER.size + sum(sizes) != len(buffer):
+        raise StaleCacheFileError("Unexpected cache file size")
+    sections = []
+    pos = HEADER.size
+    for size in sizes:
+        sections.append(buffer[pos : pos + size])
+        pos += size
+    data, offsets, ids = (from_little_endian(section) for section in sections[:3])
+    names = sections[3].decode("utf-8").split("\0") if num_symbols else []
+    if len(names) != num_symbols:
+        raise StaleCacheFileError("Symbol table does not match its header")
+    return CompactRules(data, offsets), dict(zip(names, ids, strict=True))
+
+
+# Compiled grammars persisted as one file per grammar, named by a hash of the
+# grammar source and the library version. Recency is tracked through file
+# modification times, which are bumped on every hit; once the directory grows
+# past `max_bytes` the least recently used files are removed.
+class DiskCache:
+    def __init__(self, directory: str | Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory is not None else get_default_cache_dir()
+        self.max_bytes = max_bytes
+        self.version = get_library_version()
+
+    def key(self, grammar: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{self.version}\0{FORMAT_VERSION}\0".encode())
+        digest.update(grammar.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def path(self, grammar: str) -> Path:
+        return self.directory / f"{self.key(grammar)}{FILE_SUFFIX}"
+
+    def get(self, grammar: str) -> tuple[CompactRules, dict[str, int]] | None:
+        path = self.path(grammar)
+        try:
+            with path.open("rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    raise StaleCacheFileError("Empty cache file")
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    entry = decode(mapped)
+        except FileNotFoundError:
+            return None
+        except (StaleCacheFileError, OSError, ValueError, UnicodeDecodeError):
+            # Written by an older format or damaged; drop it so it gets rebuilt
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def set(self, grammar: str, rules: CompactRules, symbol_ids: dict[str, int]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        payload = encode(rules, symbol_ids)
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(payload)
+            Path(tmp_name).replace(self.path(grammar))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for path in self.directory.glob(f"*{FILE_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob(f"*{FILE_SUFFIX}"):
+            path.unlink(missing_ok=True)
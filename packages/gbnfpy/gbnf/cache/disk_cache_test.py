@@ -0,0 +1,120 @@
+import importlib
+import os
+
+import pytest
+
+from ..GBNF import build_rules
+from ..rules_builder import CompactRules, RulesBuilder
+from . import disk_cache as disk_cache_module
+from .disk_cache import FILE_SUFFIX, DiskCache, StaleCacheFileError, decode, encode
+
+# `gbnf.GBNF` the attribute is the function, so fetch the module explicitly
+gbnf_module = importlib.import_module("..GBNF", __package__)
+
+GRAMMAR = """
+root ::= (expr "=" term "\\n")+
+expr ::= term ([-+*/] term)*
+term ::= [0-9]+
+"""
+
+
+def build(grammar):
+    rules_builder = RulesBuilder(grammar)
+    return CompactRules.from_rules(rules_builder.rules), rules_builder.symbol_ids
+
+
+def test_encode_decode_round_trip():
+    rules, symbol_ids = build(GRAMMAR)
+    decoded_rules, decoded_symbol_ids = decode(encode(rules, symbol_ids))
+    assert decoded_rules == rules
+    assert list(decoded_symbol_ids.items()) == list(symbol_ids.items())
+
+
+def test_decode_rejects_other_formats():
+    payload = encode(*build(GRAMMAR))
+    with pytest.raises(StaleCacheFileError):
+        decode(payload[:10])
+    with pytest.raises(StaleCacheFileError):
+        decode(b"XXXXX" + payload[5:])
+    with pytest.raises(StaleCacheFileError):
+        decode(payload + b"\0")
+
+
+def test_get_returns_none_for_unknown_grammar(tmp_path):
+    assert DiskCache(tmp_path).get(GRAMMAR) is None
+
+
+def test_set_then_get(tmp_path):
+    cache = DiskCache(tmp_path)
+    rules, symbol_ids = build(GRAMMAR)
+    cache.set(GRAMMAR, rules, symbol_ids)
+    assert cache.path(GRAMMAR).exists()
+    assert cache.get(GRAMMAR) == (rules, symbol_ids)
+
+
+def test_key_depends_on_library_version(tmp_path, monkeypatch):
+    key = DiskCache(tmp_path).key(GRAMMAR)
+    monkeypatch.setattr(disk_cache_module, "get_library_version", lambda: "99.0.0")
+    assert DiskCache(tmp_path).key(GRAMMAR) != key
+
+
+def test_stale_file_is_removed(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path)
+    cache.set(GRAMMAR, *build(GRAMMAR))
+    key = cache.key(GRAMMAR)
+    monkeypatch.setattr(disk_cache_module, "FORMAT_VERSION", disk_cache_module.FORMAT_VERSION + 1)
+    # Keep the old key so the lookup finds the file written in the previous format
+    monkeypatch.setattr(cache, "key", lambda _grammar: key)
+    assert cache.get(GRAMMAR) is None
+    assert not cache.path(GRAMMAR).exists()
+
+
+def test_corrupt_file_is_removed(tmp_path):
+    cache = DiskCache(tmp_path)
+    tmp_path.mkdir(exist_ok=True)
+    cache.path(GRAMMAR).write_bytes(b"garbage")
+    assert cache.get(GRAMMAR) is None
+    assert not cache.path(GRAMMAR).exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    grammars = [f'root ::= "{c * 50}"' for c in "abc"]
+    entry_size = len(encode(*build(grammars[0])))
+    cache = DiskCache(tmp_path, max_bytes=entry_size * 2)
+    cache.set(grammars[0], *build(grammars[0]))
+    cache.set(grammars[1], *build(grammars[1]))
+    os.utime(cache.path(grammars[0]), ns=(1, 1))
+    os.utime(cache.path(grammars[1]), ns=(2, 2))
+    # Reading the first grammar marks it as most recently used
+    assert cache.get(grammars[0]) is not None
+    cache.set(grammars[2], *build(grammars[2]))
+    assert cache.path(grammars[0]).exists()
+    assert not cache.path(grammars[1]).exists()
+    assert cache.path(grammars[2]).exists()
+
+
+def test_clear(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.set(GRAMMAR, *build(GRAMMAR))
+    cache.clear()
+    assert list(tmp_path.glob(f"*{FILE_SUFFIX}")) == []
+
+
+def test_default_directory_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("GBNF_CACHE_DIR", str(tmp_path))
+    assert DiskCache().directory == tmp_path
+
+
+def test_gbnf_uses_disk_cache(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path)
+    rules, symbol_ids = build_rules(GRAMMAR, disk_cache=cache, memory_cache=None)
+    assert cache.path(GRAMMAR).exists()
+
+    def fail(*_args):
+        raise AssertionError("Grammar should have been loaded from the cache")
+
+    monkeypatch.setattr(gbnf_module, "parse_grammar", fail)
+    assert build_rules(GRAMMAR, disk_cache=cache, memory_cache=None) == (rules, symbol_ids)
+    cached_rules, _ = build_rules(GRAMMAR, compact=True, disk_cache=cache, memory_cache=None)
+    assert isinstance(cached_rules, CompactRules)
+    assert cached_rules == rules
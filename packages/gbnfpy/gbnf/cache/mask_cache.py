@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+
+from ..vocabulary import TokenMask, Vocabulary, get_allowed_tokens
+from .memory_cache import CacheStats
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from ..grammar_graph.parse_state import ParseState
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Rough bytes per spelled-out pointer in a signature: a tuple, a small int and
+# a set slot, with the stack tuples counted separately
+POINTER_OVERHEAD = 120
+
+Signature = tuple[bytes, frozenset]
+
+
+def get_entry_size(signature: Signature, mask: TokenMask) -> int:
+    # Approximate: the packed mask, plus every pointer of the signature and the
+    # return nodes of its stack. Stacks shared between pointers are counted
+    # once per pointer.
+    _, pointers = signature
+    return len(mask.data) + sum(POINTER_OVERHEAD + 8 * len(stack) for _, stack in pointers)
+
+
+# An in-process LRU of allowed-token masks for one vocabulary, keyed by the
+# signature of the state's pointers. Decoding revisits the same few states
+# (inside a string, after a comma, expecting a key), and every graph compiled
+# from the same rules signs its states alike, so masks carry over between
+# requests. Masks are immutable and handed out as-is.
+class MaskCache:
+    def __init__(
+        self,
+        vocab: Vocabulary,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.vocab = vocab
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Signature, tuple[TokenMask, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # The tokens of the cache's vocabulary that the state allows, computed
+    # and stored on a miss
+    def get(self, state: "ParseState") -> TokenMask:
+        signature = state.signature
+        with self._lock:
+            item = self._entries.get(signature)
+            if item is not None:
+                self._entries.move_to_end(signature)
+                self._hits += 1
+                return item[0]
+            self._misses += 1
+        # Computed without the lock, so other threads are not held up; two
+        # threads missing on one state both compute it and the last one wins
+        mask = get_allowed_tokens(state, self.vocab)
+        self.set(signature, mask)
+        return mask
+
+    def set(self, signature: Signature, mask: TokenMask) -> TokenMask:
+        size = get_entry_size(signature, mask)
+        with self._lock:
+            previous = self._entries.pop(signature, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes or self.max_entries <= 0:
+                return mask
+            self._entries[signature] = (mask, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+        return mask
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, state: "ParseState"):
+        return state.signature in self._entries
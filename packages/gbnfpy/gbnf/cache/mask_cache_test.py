@@ -0,0 +1,130 @@
+import threading
+
+from ..GBNF import GBNF
+from ..vocabulary import Vocabulary
+from ..vocabulary_test import JSON_GRAMMAR, TOKENS
+from .mask_cache import MaskCache, get_entry_size
+from .memory_cache import CacheStats
+
+
+def test_get_computes_then_reuses_masks():
+    vocab = Vocabulary(TOKENS)
+    cache = MaskCache(vocab)
+    state = GBNF(JSON_GRAMMAR, '{"a": "b', memory_cache=None)
+    mask = cache.get(state)
+    assert mask == state.allowed_tokens(vocab)
+    assert cache.get(state) is mask
+    assert state in cache
+    assert cache.stats == CacheStats(hits=1, misses=1, evictions=0, entries=1, bytes=cache.stats.bytes)
+    assert cache.stats.bytes == get_entry_size(state.signature, mask)
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_states_revisited_while_decoding_hit():
+    cache = MaskCache(Vocabulary(TOKENS))
+    state = GBNF(JSON_GRAMMAR, memory_cache=None)
+    for char in '{"a": "xyz", "b": "xyz", "c": "xyz"}':
+        cache.get(state)
+        state = state.add(char)
+    # The second and third pairs retrace the first
+    assert cache.stats.hits >= 16
+
+
+def test_masks_are_shared_between_graphs_of_one_grammar():
+    vocab = Vocabulary(TOKENS)
+    cache = MaskCache(vocab)
+    first = GBNF(JSON_GRAMMAR, '{"a": [{"b": 1, "c": [', memory_cache=None)
+    # The second graph meets other stacks first, so its ids differ
+    second = GBNF(JSON_GRAMMAR, memory_cache=None)
+    second.add('{"x": {"y": "z"}, "a": 1')
+    second = second.add('{"a": [{"b": 1, "c": [')
+    assert first.graph is not second.graph
+    cache.get(first)
+    assert second in cache
+    assert cache.get(second) == second.allowed_tokens(vocab)
+
+
+def test_earley_states_are_cached():
+    vocab = Vocabulary(TOKENS)
+    cache = MaskCache(vocab)
+    state = GBNF(JSON_GRAMMAR, engine="earley", memory_cache=None)
+    for char in '{"a": "xyz", "b": "xyz", "c": "xyz"}':
+        assert cache.get(state) == state.allowed_tokens(vocab)
+        state = state.add(char)
+    assert cache.stats.hits >= 16
+    assert cache.stats.bytes > 0
+    # Columns of another parser over the same grammar spell out the same way
+    other = GBNF(JSON_GRAMMAR, '{"x": {"y": 1}, "a": "xy', engine="earley", memory_cache=None)
+    assert other.graph is not state.graph
+    assert other.add('z", "b": "xyz"') in cache
+    assert GBNF(JSON_GRAMMAR, '{"a": "xyz", "b": "xyz"', engine="earley", memory_cache=None) in cache
+
+
+def test_different_grammars_do_not_share_masks():
+    cache = MaskCache(Vocabulary(["a", "b"]))
+    assert list(cache.get(GBNF('root ::= "a"', memory_cache=None))) == [0]
+    assert list(cache.get(GBNF('root ::= "b"', memory_cache=None))) == [1]
+    assert cache.stats.misses == 2
+
+
+def test_evicts_least_recently_used():
+    cache = MaskCache(Vocabulary(TOKENS), max_entries=2)
+    states = [GBNF(JSON_GRAMMAR, src, memory_cache=None) for src in ("", "{", '{"')]
+    cache.get(states[0])
+    cache.get(states[1])
+    cache.get(states[0])
+    cache.get(states[2])
+    assert states[0] in cache
+    assert states[1] not in cache
+    assert states[2] in cache
+    assert cache.stats.evictions == 1
+
+
+def test_evicts_by_byte_size():
+    cache = MaskCache(Vocabulary(TOKENS))
+    states = [GBNF(JSON_GRAMMAR, src, memory_cache=None) for src in ("{", '{"')]
+    sizes = [get_entry_size(state.signature, cache.get(state)) for state in states]
+    cache = MaskCache(Vocabulary(TOKENS), max_bytes=max(sizes))
+    for state in states:
+        cache.get(state)
+    assert len(cache) == 1
+    assert cache.stats.bytes <= max(sizes)
+
+
+def test_oversized_masks_are_not_stored():
+    cache = MaskCache(Vocabulary(TOKENS), max_bytes=1)
+    state = GBNF(JSON_GRAMMAR, memory_cache=None)
+    assert cache.get(state) == state.allowed_tokens(cache.vocab)
+    assert len(cache) == 0
+
+
+def test_clear_and_reset_stats():
+    cache = MaskCache(Vocabulary(TOKENS))
+    cache.get(GBNF(JSON_GRAMMAR, memory_cache=None))
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats.bytes == 0
+    cache.reset_stats()
+    assert cache.stats == CacheStats(hits=0, misses=0, evictions=0, entries=0, bytes=0)
+
+
+def test_threads_share_a_cache():
+    vocab = Vocabulary(TOKENS)
+    cache = MaskCache(vocab, max_entries=4)
+    states = [GBNF(JSON_GRAMMAR, src, memory_cache=None) for src in ("", "{", '{"', '{"a', '{"a":', '{"a": 1')]
+    expected = [state.allowed_tokens(vocab) for state in states]
+    errors = []
+
+    def work():
+        for _ in range(20):
+            for state, mask in zip(states, expected, strict=True):
+                if cache.get(state) != mask:
+                    errors.append(state)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(cache) <= 4
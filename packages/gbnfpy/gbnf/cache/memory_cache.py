@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from ..rules_builder.compact_rules import CompactRules
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+CacheEntry = tuple[CompactRules, MappingProxyType]
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def get_entry_size(grammar: str, rules: CompactRules, symbol_ids) -> int:
+    # Approximate: the grammar source kept as the key, the rule arrays, and the
+    # symbol table at roughly a name plus a small int per symbol
+    return len(grammar) + rules.nbytes + sum(len(name) + 8 for name in symbol_ids)
+
+
+# An in-process LRU of compiled grammars keyed by grammar source. Entries are
+# immutable (CompactRules plus a read-only symbol table), so they are handed out
+# as-is and can be shared between threads and callers.
+class MemoryCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[CacheEntry, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, grammar: str) -> CacheEntry | None:
+        with self._lock:
+            item = self._entries.get(grammar)
+            if item is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(grammar)
+            self._hits += 1
+            return item[0]
+
+    def set(self, grammar: str, rules: CompactRules, symbol_ids) -> CacheEntry:
+        entry = (rules, MappingProxyType(dict(symbol_ids)))
+        size = get_entry_size(grammar, rules, symbol_ids)
+        with self._lock:
+            previous = self._entries.pop(grammar, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes or self.max_entries <= 0:
+                return entry
+            self._entries[grammar] = (entry, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, grammar: str):
+        return grammar in self._entries
+
+
+default_memory_cache = MemoryCache()
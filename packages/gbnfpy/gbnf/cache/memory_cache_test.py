@@ -0,0 +1,149 @@
+import importlib
+import threading
+
+import pytest
+
+from ..GBNF import build_rules
+from ..rules_builder import CompactRules, RulesBuilder
+from . import memory_cache as memory_cache_module
+from .memory_cache import CacheStats, MemoryCache, get_entry_size
+
+# `gbnf.GBNF` the attribute is the function, so fetch the module explicitly
+gbnf_module = importlib.import_module("..GBNF", __package__)
+
+GRAMMAR = 'root ::= [a-z]+ ("," [a-z]+)*'
+
+
+def build(grammar):
+    rules_builder = RulesBuilder(grammar)
+    return CompactRules.from_rules(rules_builder.rules), rules_builder.symbol_ids
+
+
+def test_get_and_set():
+    cache = MemoryCache()
+    assert cache.get(GRAMMAR) is None
+    rules, symbol_ids = build(GRAMMAR)
+    cache.set(GRAMMAR, rules, symbol_ids)
+    cached_rules, cached_symbol_ids = cache.get(GRAMMAR)
+    assert cached_rules is rules
+    assert dict(cached_symbol_ids) == symbol_ids
+    assert cache.stats == CacheStats(hits=1, misses=1, evictions=0, entries=1, bytes=cache.stats.bytes)
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_cached_symbol_ids_are_read_only():
+    cache = MemoryCache()
+    _, symbol_ids = cache.set(GRAMMAR, *build(GRAMMAR))
+    with pytest.raises(TypeError):
+        symbol_ids["root"] = 5
+
+
+def test_evicts_least_recently_used_by_entry_count():
+    cache = MemoryCache(max_entries=2)
+    grammars = [f'root ::= "{c}"' for c in "abc"]
+    cache.set(grammars[0], *build(grammars[0]))
+    cache.set(grammars[1], *build(grammars[1]))
+    cache.get(grammars[0])
+    cache.set(grammars[2], *build(grammars[2]))
+    assert grammars[0] in cache
+    assert grammars[1] not in cache
+    assert grammars[2] in cache
+    assert cache.stats.evictions == 1
+
+
+def test_evicts_by_byte_size():
+    grammars = [f'root ::= "{c * 20}"' for c in "abc"]
+    size = get_entry_size(grammars[0], *build(grammars[0]))
+    cache = MemoryCache(max_bytes=size * 2)
+    for grammar in grammars:
+        cache.set(grammar, *build(grammar))
+    assert len(cache) == 2
+    assert grammars[0] not in cache
+    assert cache.stats.bytes <= size * 2
+
+
+def test_oversized_entries_are_not_stored():
+    cache = MemoryCache(max_bytes=1)
+    cache.set(GRAMMAR, *build(GRAMMAR))
+    assert len(cache) == 0
+    assert cache.stats.evictions == 0
+
+
+def test_replacing_an_entry_keeps_byte_count():
+    cache = MemoryCache()
+    cache.set(GRAMMAR, *build(GRAMMAR))
+    size = cache.stats.bytes
+    cache.set(GRAMMAR, *build(GRAMMAR))
+    assert cache.stats.bytes == size
+
+
+def test_clear_and_reset_stats():
+    cache = MemoryCache()
+    cache.set(GRAMMAR, *build(GRAMMAR))
+    cache.get(GRAMMAR)
+    cache.clear()
+    cache.reset_stats()
+    assert cache.stats == CacheStats(0, 0, 0, 0, 0)
+
+
+def test_concurrent_access():
+    cache = MemoryCache(max_entries=8)
+    grammars = [f'root ::= "{c}"' for c in "abcdefghijklmnop"]
+    built = {grammar: build(grammar) for grammar in grammars}
+
+    def work():
+        for _ in range(50):
+            for grammar in grammars:
+                if cache.get(grammar) is None:
+                    cache.set(grammar, *built[grammar])
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats
+    assert stats.hits + stats.misses == 8 * 50 * len(grammars)
+    assert stats.entries == 8
+
+
+def test_gbnf_memoizes_compilation(monkeypatch):
+    cache = MemoryCache()
+    rules, symbol_ids = build_rules(GRAMMAR, memory_cache=cache)
+
+    def fail(*_args):
+        raise AssertionError("Grammar should have been loaded from the cache")
+
+    monkeypatch.setattr(gbnf_module, "parse_grammar", fail)
+    assert build_rules(GRAMMAR, memory_cache=cache) == (rules, symbol_ids)
+    assert cache.stats.hits == 1
+
+
+def test_gbnf_returns_copies_of_cached_rules():
+    cache = MemoryCache()
+    build_rules(GRAMMAR, memory_cache=cache)
+    rules, symbol_ids = build_rules(GRAMMAR, memory_cache=cache)
+    rules[0].clear()
+    rules[1][0]["value"][0] = 0
+    symbol_ids["root"] = 99
+    assert build_rules(GRAMMAR, memory_cache=cache) == build_rules(GRAMMAR, memory_cache=None)
+
+
+def test_gbnf_shares_immutable_compact_rules():
+    cache = MemoryCache()
+    first, _ = build_rules(GRAMMAR, compact=True, memory_cache=cache)
+    second, symbol_ids = build_rules(GRAMMAR, compact=True, memory_cache=cache)
+    assert first is second
+    with pytest.raises(TypeError):
+        second.data[0] = 1
+    with pytest.raises(TypeError):
+        symbol_ids["root"] = 1
+
+
+def test_gbnf_without_memory_cache(monkeypatch):
+    cache = MemoryCache()
+    monkeypatch.setattr(memory_cache_module, "default_memory_cache", cache)
+    build_rules(GRAMMAR, memory_cache=None)
+    assert len(cache) == 0
+    build_rules(GRAMMAR)
+    assert len(cache) == 1
@@ -0,0 +1,37 @@
+from ..lazy import lazy_attributes
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .analyzer import GrammarAnalysis as GrammarAnalysis
+    from .analyzer import analyze_grammar as analyze_grammar
+    from .analyzer import analyze_rules as analyze_rules
+    from .char_class import CharClass as CharClass
+    from .earley import EarleyParser as EarleyParser
+    from .graph import Graph as Graph
+    from .lazy_dfa import LazyDFA as LazyDFA
+    from .lookahead import LookaheadIndex as LookaheadIndex
+    from .parse_state import ParseState as ParseState
+    from .types import END as END
+    from .types import RuleEnd as RuleEnd
+    from .types import RuleRef as RuleRef
+
+# The graph engine is all a plain GBNF() needs, so the analyzer and the other
+# engines wait until they are asked for
+_LAZY_ATTRIBUTES = {
+    "CharClass": ".char_class",
+    "END": ".types",
+    "EarleyParser": ".earley",
+    "Graph": ".graph",
+    "GrammarAnalysis": ".analyzer",
+    "LazyDFA": ".lazy_dfa",
+    "LookaheadIndex": ".lookahead",
+    "ParseState": ".parse_state",
+    "RuleEnd": ".types",
+    "RuleRef": ".types",
+    "analyze_grammar": ".analyzer",
+    "analyze_rules": ".analyzer",
+}
+
+__all__ = [*_LAZY_ATTRIBUTES]
+
+__getattr__, __dir__ = lazy_attributes(globals(), _LAZY_ATTRIBUTES)
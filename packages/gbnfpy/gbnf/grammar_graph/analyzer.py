@@ -0,0 +1,481 @@
+import math
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+
+from ..GBNF import build_rules
+from ..grammar_parser.build_rule_stack import build_rule_stack
+from ..rules_builder.components import get_components, is_cycle
+from .char_class import CharClass
+from .graph import Graph, get_completing_rules
+from .types import END, RuleRef
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from ..rules_builder.optimizer import Optimizations
+
+DEFAULT_MAX_LIVE_STATES = 1_000
+# Pointers stepped when estimating live states, so the estimate stays quick
+# on huge grammars; past this the estimate may come out low
+MAX_STATE_STEPS = 100_000
+# How many returns deep a state's stacks can go before the estimate stops
+# following it; nesting deeper mostly leads back to states seen before
+MAX_STATE_DEPTH = 16
+# Stands for accepted input among the places a rule can return to
+ACCEPTED = -1
+
+# How the live states of the graph engine can grow with the input
+CONSTANT = "constant"
+# Without bound before any input, as with left recursion
+UNBOUNDED = "unbounded"
+# With nesting depth, where completing a level leaves pointers alive in it
+LINEAR = "linear"
+# With nesting depth, where a level can be entered from several alternates
+EXPONENTIAL = "exponential"
+
+
+# What analyze_rules found. The live-state figures are for the graph engine,
+# which follows every alternate at once; the Earley engine is cubic whatever
+# the grammar.
+@dataclass(frozen=True)
+class GrammarAnalysis:
+    # Rules that can match empty input
+    nullable: frozenset[str]
+    # The code points each rule can start with
+    first_sets: dict[str, CharClass]
+    # Groups of rules that reference each other before consuming input
+    left_recursion: tuple[tuple[str, ...], ...]
+    growth: str
+    # The most pointers a code point can leave alive, estimated; infinite
+    # unless growth is constant
+    max_live_states: float
+    threshold: int
+    # Why the grammar is flagged, if it is
+    reasons: tuple[str, ...]
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.reasons)
+
+
+# The static analysis of one grammar, over its graph's nodes. Only rules the
+# root can reach are analyzed.
+class Analyzer:
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self.nodes = graph.nodes
+        self.rule_ids = [rule_id for rule_id, _, _ in graph.meta]
+        self.reachable = self.get_reachable_rules()
+        self.nullable = graph.get_nullable_rules()
+        self.productive = self.get_productive_rules()
+        # Where each rule is referenced
+        self.call_sites = [[] for _ in graph.starts]
+        for node, rule in enumerate(self.nodes):
+            if isinstance(rule, RuleRef) and self.rule_ids[node] in self.reachable:
+                self.call_sites[rule.value].append(node)
+        # The rules each rule can enter before consuming input
+        self.left_edges = [[] for _ in graph.starts]
+        for rule_id in self.reachable:
+            for start in graph.starts[rule_id]:
+                self.left_edges[rule_id].extend(self.get_left_references(start))
+
+    def get_name(self, rule_id: int) -> str:
+        return self.graph.get_rule_name(rule_id)
+
+    def get_reachable_rules(self) -> set[int]:
+        reachable = {self.graph.root_id}
+        pending = [self.graph.root_id]
+        while pending:
+            for node in self.graph.starts[pending.pop()]:
+                while self.nodes[node] is not END:
+                    rule = self.nodes[node]
+                    if isinstance(rule, RuleRef) and rule.value not in reachable:
+                        reachable.add(rule.value)
+                        pending.append(rule.value)
+                    node += 1
+        return reachable
+
+    # Rules that match some input at all. The rest never complete.
+    def get_productive_rules(self) -> set[int]:
+        return get_completing_rules(self.nodes, self.graph.starts, over_classes=True)
+
+    def is_nullable_from(self, node: int) -> bool:
+        return self.graph.is_nullable_from(node, self.nullable)
+
+    # The rules referenced from a node before any input is consumed
+    def get_left_references(self, node: int) -> "Iterator[int]":
+        rule = self.nodes[node]
+        while isinstance(rule, RuleRef):
+            yield rule.value
+            if rule.value not in self.nullable:
+                break
+            node += 1
+            rule = self.nodes[node]
+
+    # Rules that enter each other before consuming input share a FIRST set,
+    # so each group of them is worked out once, after the groups it enters
+    def get_first_sets(self) -> dict[int, CharClass]:
+        first_sets = {}
+        for component in get_components(self.left_edges):
+            members = [rule_id for rule_id in component if rule_id in self.reachable]
+            if not members:
+                continue
+            # References within the group add nothing to its own set
+            first = CharClass()
+            first_sets.update(dict.fromkeys(members, first))
+            for rule_id in members:
+                for start in self.graph.starts[rule_id]:
+                    first = first | self.get_path_first(start, first_sets)
+            for rule_id in members:
+                first_sets[rule_id] = first
+        return first_sets
+
+    # The code points input from a node can start with, given the rules'
+    # first sets
+    def get_path_first(self, node: int, first_sets: dict[int, CharClass]) -> CharClass:
+        first = CharClass()
+        rule = self.nodes[node]
+        while isinstance(rule, RuleRef):
+            first = first | first_sets[rule.value]
+            if rule.value not in self.nullable:
+                return first
+            node += 1
+            rule = self.nodes[node]
+        return first | rule if isinstance(rule, CharClass) else first
+
+    def get_left_recursion(self) -> list[list[int]]:
+        edges = self.left_edges
+        return [component for component in get_components(edges) if is_cycle(component, edges)]
+
+    # The char class nodes that entering each rule leads to, counting how
+    # many pointers land on each: a rule entered from two alternates puts two
+    # pointers on each of its nodes, on different stacks. Only defined
+    # without left recursion.
+    def get_entries(self) -> dict[int, dict[int, int]]:
+        entries = {}
+        # Components come after the components they reference, so the entries
+        # of referenced rules are always known
+        for component in get_components(self.left_edges):
+            for rule_id in component:
+                if rule_id in self.reachable:
+                    counts = {}
+                    for start in self.graph.starts[rule_id]:
+                        self.add_entries(start, entries, counts)
+                    entries[rule_id] = counts
+        return entries
+
+    # Adds the char class nodes that resolving from a node within its rule
+    # leads to, times `times`
+    def add_entries(self, node: int, entries: dict[int, dict[int, int]], counts: dict[int, int], times: int = 1):
+        rule = self.nodes[node]
+        while isinstance(rule, RuleRef):
+            for entry, count in entries[rule.value].items():
+                counts[entry] = counts.get(entry, 0) + count * times
+            if rule.value not in self.nullable:
+                return
+            node += 1
+            rule = self.nodes[node]
+        if isinstance(rule, CharClass):
+            counts[node] = counts.get(node, 0) + times
+
+    # Pointers that resolving from a node creates within its rule
+    def get_width(self, node: int, widths: dict[int, int]) -> int:
+        width = 0
+        rule = self.nodes[node]
+        while isinstance(rule, RuleRef):
+            width += widths[rule.value]
+            if rule.value not in self.nullable:
+                return width
+            node += 1
+            rule = self.nodes[node]
+        return width + (1 if isinstance(rule, CharClass) else 0)
+
+    # Pointers each rule's completion returns to, at most, counting the
+    # completion of its callers where the rest of the caller can be empty.
+    # Where that goes round a recursive cycle and leaves pointers on the way,
+    # each level of nesting adds pointers, and the count is infinite. Rules
+    # that complete into each other are grouped, and each group is worked out
+    # once, after the callers it completes into.
+    def get_return_widths(self, widths: dict[int, int]) -> dict[int, float]:
+        returns = dict.fromkeys(self.reachable, 0)
+        # The root's completion is the END that marks accepted input
+        returns[self.graph.root_id] = 1
+        # The callers each rule completes into, with the pointers the rest of
+        # the caller creates on the way
+        completes_into = [[] for _ in self.graph.starts]
+        for rule_id in self.reachable & self.productive:
+            for site in self.call_sites[rule_id]:
+                width = self.get_width(site + 1, widths)
+                if self.is_nullable_from(site + 1):
+                    completes_into[rule_id].append((self.rule_ids[site], width))
+                else:
+                    returns[rule_id] = max(returns[rule_id], width)
+        # Callers that never complete keep their count
+        edges = [[caller for caller, _ in callers if caller in self.productive] for callers in completes_into]
+        for component in get_components(edges):
+            members = [rule_id for rule_id in component if rule_id in self.reachable and rule_id in self.productive]
+            if not members:
+                continue
+            inside = set(members)
+            best = max(returns[rule_id] for rule_id in members)
+            for rule_id in members:
+                for caller, width in completes_into[rule_id]:
+                    if caller not in inside:
+                        best = max(best, width + returns[caller])
+                    elif width:
+                        best = math.inf
+            for rule_id in members:
+                returns[rule_id] = best
+        return returns
+
+    # Rules whose entry can push more than one level of themselves for the
+    # same input, so that nesting multiplies pointers
+    def get_ambiguous_recursion(self, entries: dict[int, dict[int, int]]) -> list[int]:
+        edges = [[] for _ in self.graph.starts]
+        for node, rule in enumerate(self.nodes):
+            if isinstance(rule, RuleRef) and self.rule_ids[node] in self.reachable:
+                edges[self.rule_ids[node]].append(rule.value)
+        component_of = {}
+        for component in get_components(edges):
+            if is_cycle(component, edges):
+                for rule_id in component:
+                    component_of[rule_id] = component
+        ambiguous = []
+        for rule_id in sorted(component_of):
+            if rule_id not in self.reachable:
+                continue
+            component = component_of[rule_id]
+            # Nodes that, once matched, push a return onto the stack and
+            # enter the cycle again; tail references reuse the stack
+            pushing = [
+                node
+                for node in entries[rule_id]
+                if self.rule_ids[node] in component
+                and isinstance(self.nodes[node + 1], RuleRef)
+                and component_of.get(self.nodes[node + 1].value) is component
+                and self.nodes[node + 2] is not END
+            ]
+            for i, node in enumerate(pushing):
+                if any(self.nodes[node] & self.nodes[other] for other in pushing[i + 1 :]):
+                    ambiguous.append(rule_id)
+                    break
+        return ambiguous
+
+    # Where completing a rule can return to: the node after each call that
+    # pushed a return, found through calls in tail position, which push none.
+    # ACCEPTED stands for completing the root.
+    def get_return_points(self, rule_id: int) -> list[int]:
+        points = set()
+        tail_callers = {rule_id}
+        pending = [rule_id]
+        while pending:
+            current = pending.pop()
+            if current == self.graph.root_id:
+                points.add(ACCEPTED)
+            for site in self.call_sites[current]:
+                if self.nodes[site + 1] is not END:
+                    points.add(site + 1)
+                elif self.rule_ids[site] not in tail_callers:
+                    tail_callers.add(self.rule_ids[site])
+                    pending.append(self.rule_ids[site])
+        return sorted(points)
+
+    # Like Graph.resolve, for a pointer whose stack is the tuple of returns
+    # pushed since some rule was entered. Returns the char class pointers it
+    # leads to, and the ENDs it completes that rule at.
+    def resolve_relative(self, node: int, stack: tuple) -> tuple[set, set]:
+        nodes = self.nodes
+        results = set()
+        ends = set()
+        seen = {(node, stack)}
+        work = [(node, stack)]
+        while work:
+            node, stack = work.pop()
+            rule = nodes[node]
+            if rule is END:
+                if not stack:
+                    ends.add(node)
+                    continue
+                following = [(stack[-1], stack[:-1])]
+            elif isinstance(rule, RuleRef):
+                pushed = stack if nodes[node + 1] is END else (*stack, node + 1)
+                following = [(start, pushed) for start in self.graph.starts[rule.value]]
+            else:
+                results.add((node, stack))
+                continue
+            for pointer in following:
+                if pointer not in seen:
+                    seen.add(pointer)
+                    work.append(pointer)
+        return results, ends
+
+    # The most pointers one code point leaves alive, estimated by following
+    # the graph engine through the input the grammar accepts, one atom of
+    # code points at a time. Stacks are kept relative to the innermost rule
+    # every pointer is in, so nesting deeper leads back to states seen before.
+    # Which caller that rule returns to is not known, so completing it follows
+    # every place it can return to, and completing the root keeps a pointer on
+    # each END it completes at, as the engine does. States nesting more than
+    # MAX_STATE_DEPTH returns deep are not followed, nor any once
+    # MAX_STATE_STEPS pointers have been stepped; past either the estimate may
+    # come out low.
+    def estimate_live_states(self) -> int:
+        root_id = self.graph.root_id
+        atom_starts = self.graph.atom_starts
+        # The atoms each class covers
+        class_atoms = {}
+
+        def get_atoms(char_class: CharClass) -> list[int]:
+            atoms = class_atoms.get(char_class)
+            if atoms is None:
+                atoms = class_atoms[char_class] = [
+                    atom
+                    for start, end in char_class.intervals
+                    for atom in range(bisect_right(atom_starts, start) - 1, bisect_right(atom_starts, end))
+                ]
+            return atoms
+
+        return_points = {}
+
+        # The states a rule's pointers lead to, completing it at `ends` as
+        # often as they do, with their stacks made relative to the new
+        # innermost rule. Completions that go round a cycle of callers stop
+        # once they come back to where they were, or nest too deep.
+        def settle(rule_id: int, pointers: set, ends: set) -> "Iterator[tuple[int, frozenset]]":
+            pending = [(rule_id, pointers, ends)]
+            settled = set()
+            while pending:
+                rule_id, pointers, ends = pending.pop()
+                key = (rule_id, frozenset(pointers), frozenset(ends))
+                if key in settled:
+                    continue
+                settled.add(key)
+                if not ends or any(len(stack) >= MAX_STATE_DEPTH for _, stack in pointers):
+                    yield normalize(rule_id, pointers)
+                    continue
+                if rule_id not in return_points:
+                    return_points[rule_id] = self.get_return_points(rule_id)
+                for point in return_points[rule_id]:
+                    if point == ACCEPTED:
+                        yield normalize(rule_id, pointers | {(end, ()) for end in ends})
+                        continue
+                    returned, caller_ends = self.resolve_relative(point, ())
+                    rebased = {(node, (point, *stack)) for node, stack in pointers}
+                    pending.append((self.rule_ids[point], rebased | returned, caller_ends))
+
+        def normalize(rule_id: int, pointers: set) -> tuple[int, frozenset]:
+            while pointers and all(stack for _, stack in pointers):
+                bottom = next(iter(pointers))[1][0]
+                if any(stack[0] != bottom for _, stack in pointers):
+                    break
+                rule_id = self.nodes[bottom - 1].value
+                pointers = {(node, stack[1:]) for node, stack in pointers}
+            return rule_id, frozenset(pointers)
+
+        initial = set()
+        for start in self.graph.starts[root_id]:
+            results, ends = self.resolve_relative(start, ())
+            initial |= results | {(end, ()) for end in ends}
+        best = len(initial)
+        state = normalize(root_id, initial)
+        seen = {state}
+        # States are followed in the order input reaches them, so the budget
+        # goes to the shortest input first
+        pending = deque([state])
+        steps = 0
+        while pending and steps < MAX_STATE_STEPS:
+            rule_id, pointers = pending.popleft()
+            steps += len(pointers)
+            matched = {}
+            for node, stack in pointers:
+                if self.nodes[node] is not END:
+                    for atom in get_atoms(self.nodes[node]):
+                        matched.setdefault(atom, []).append((node, stack))
+            for group in matched.values():
+                following = set()
+                ends = set()
+                for node, stack in group:
+                    results, completed = self.resolve_relative(node + 1, stack)
+                    following |= results
+                    ends |= completed
+                for next_state in settle(rule_id, following, ends):
+                    best = max(best, len(next_state[1]))
+                    if next_state not in seen:
+                        seen.add(next_state)
+                        if all(len(stack) <= MAX_STATE_DEPTH for _, stack in next_state[1]):
+                            pending.append(next_state)
+        return best
+
+
+def analyze_graph(graph: Graph, max_live_states: int = DEFAULT_MAX_LIVE_STATES) -> GrammarAnalysis:
+    analyzer = Analyzer(graph)
+    get_name = analyzer.get_name
+    reasons = []
+
+    left_recursion = analyzer.get_left_recursion()
+    for component in left_recursion:
+        names = ", ".join(f"'{get_name(rule_id)}'" for rule_id in component)
+        reasons.append(f"Left recursion through {names}")
+
+    if left_recursion:
+        growth, live_states = UNBOUNDED, math.inf
+    else:
+        entries = analyzer.get_entries()
+        widths = {rule_id: sum(counts.values()) for rule_id, counts in entries.items()}
+        returns = analyzer.get_return_widths(widths)
+        ambiguous = analyzer.get_ambiguous_recursion(entries)
+        growing = sorted(rule_id for rule_id, count in returns.items() if count == math.inf)
+        if ambiguous:
+            growth, live_states = EXPONENTIAL, math.inf
+            names = ", ".join(f"'{get_name(rule_id)}'" for rule_id in ambiguous)
+            reasons.append(f"Live states can multiply with each level of nesting in {names}")
+        elif growing:
+            growth, live_states = LINEAR, math.inf
+            names = ", ".join(f"'{get_name(rule_id)}'" for rule_id in growing)
+            reasons.append(f"Live states grow with each level of nesting in {names}")
+        else:
+            growth = CONSTANT
+            live_states = analyzer.estimate_live_states()
+            if live_states > max_live_states:
+                reasons.append(
+                    f"Up to {live_states:,} states can be live at once, over the limit of {max_live_states:,}",
+                )
+
+    reachable = sorted(analyzer.reachable)
+    first_sets = analyzer.get_first_sets()
+    return GrammarAnalysis(
+        nullable=frozenset(get_name(rule_id) for rule_id in reachable if rule_id in analyzer.nullable),
+        first_sets={get_name(rule_id): first_sets[rule_id] for rule_id in reachable},
+        left_recursion=tuple(tuple(get_name(rule_id) for rule_id in component) for component in left_recursion),
+        growth=growth,
+        max_live_states=live_states,
+        threshold=max_live_states,
+        reasons=tuple(reasons),
+    )
+
+
+# Analyzes the output of a RulesBuilder: `rules` and `symbol_ids` as
+# RulesBuilder.rules and RulesBuilder.symbol_ids hold them
+def analyze_rules(
+    rules,
+    symbol_ids: dict[str, int],
+    *,
+    grammar: str = "",
+    max_live_states: int = DEFAULT_MAX_LIVE_STATES,
+) -> GrammarAnalysis:
+    stacked_rules = [build_rule_stack(rule) for rule in rules]
+    graph = Graph(grammar, stacked_rules, symbol_ids["root"], symbol_ids, allow_left_recursion=True)
+    return analyze_graph(graph, max_live_states)
+
+
+# Compiles a grammar, through the default caches, and analyzes it
+def analyze_grammar(
+    grammar: str,
+    *,
+    max_live_states: int = DEFAULT_MAX_LIVE_STATES,
+    optimize: "bool | Optimizations" = False,
+) -> GrammarAnalysis:
+    rules, symbol_ids = build_rules(grammar, optimize=optimize)
+    return analyze_rules(rules, symbol_ids, grammar=grammar, max_live_states=max_live_states)
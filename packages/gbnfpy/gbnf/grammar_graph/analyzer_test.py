@@ -0,0 +1,183 @@
+import math
+import random
+from time import perf_counter
+
+import pytest
+
+from ..bench import DEFAULT_GRAMMARS_DIR, load_grammars
+from ..bench.earley import LEFT_RECURSIVE_ARITHMETIC
+from ..bench.matching import add_random_code_point
+from ..GBNF import GBNF, build_rules
+from ..rules_builder.errors import GrammarParseError
+from ..rules_builder.rules_builder import RulesBuilder
+from .analyzer import CONSTANT, EXPONENTIAL, LINEAR, UNBOUNDED, analyze_grammar, analyze_rules
+from .char_class import CharClass
+
+
+def analyze(grammar: str, **kwargs):
+    rules_builder = RulesBuilder(grammar)
+    return analyze_rules(rules_builder.rules, rules_builder.symbol_ids, grammar=grammar, **kwargs)
+
+
+# Rules nested `depth` levels deep, each named by its level spelled in letters
+def get_nested_grammar(depth: int) -> str:
+    def name(level: int) -> str:
+        return "level-" + "".join("abcdefghij"[int(digit)] for digit in str(level))
+
+    lines = [f"root ::= {name(0)}"]
+    lines += [f'{name(level)} ::= "(" {name(level + 1)} ")" | "[" {name(level + 1)} "]"' for level in range(depth)]
+    lines.append(f"{name(depth)} ::= [a-z]?")
+    return "\n".join(lines)
+
+
+def test_nullable_and_first_sets():
+    analysis = analyze('root ::= sign? digits\nsign ::= "-" | "+"\ndigits ::= [0-9]* | "x"\nunused ::= ""')
+    assert {"root", "root_2", "digits"} <= analysis.nullable
+    assert "sign" not in analysis.nullable
+    assert analysis.first_sets["sign"] == CharClass([ord("-"), ord("+")])
+    assert analysis.first_sets["digits"] == CharClass([(ord("0"), ord("9")), ord("x")])
+    # The optional sign can be skipped, so digits can start the root too
+    assert analysis.first_sets["root"] == CharClass([ord("-"), ord("+"), (ord("0"), ord("9")), ord("x")])
+    # Rules the root cannot reach are left out
+    assert "unused" not in analysis.first_sets
+
+
+def test_finds_left_recursion():
+    analysis = analyze(LEFT_RECURSIVE_ARITHMETIC)
+    assert sorted(analysis.left_recursion) == [("expr",), ("term",)]
+    assert analysis.growth == UNBOUNDED
+    assert analysis.flagged
+    assert "Left recursion through 'expr'" in analysis.reasons
+
+
+def test_finds_mutual_left_recursion_through_nullable_rules():
+    analysis = analyze('root ::= a\na ::= ws b "x" | "y"\nb ::= a "z"\nws ::= " "*')
+    assert analysis.left_recursion == (("a", "b"),)
+
+
+def test_finds_left_recursion_in_nested_repetitions():
+    # The inner repetition can match nothing, so the outer one can repeat
+    # without consuming input
+    analysis = analyze('root ::= (("a"? " "?)*)* "x"')
+    assert analysis.left_recursion
+    assert all(name.startswith("root_") for cycle in analysis.left_recursion for name in cycle)
+
+
+@pytest.mark.parametrize(
+    ("grammar", "growth", "live_states"),
+    [
+        ('root ::= "abc1" | "abc2" | "abc3" | "abc4"', CONSTANT, 4),
+        ('root ::= [a-z]+ ("," [a-z]+)*', CONSTANT, None),
+        ('root ::= x\nx ::= "(" x ")" | "a"', CONSTANT, None),
+        ('root ::= x\nx ::= "a" x? ws\nws ::= " "?', LINEAR, math.inf),
+        ('root ::= x\nx ::= "a" x "b" | "a" x "c" | ""', EXPONENTIAL, math.inf),
+    ],
+)
+def test_growth(grammar, growth, live_states):
+    analysis = analyze(grammar)
+    assert analysis.growth == growth
+    if live_states is not None:
+        assert analysis.max_live_states == live_states
+    assert analysis.flagged == (growth != CONSTANT)
+
+
+def test_estimates_cover_live_states():
+    grammar = 'root ::= "ab" x | "ab" y\nx ::= [a-z] [0-9] | [a-z] "-"\ny ::= [a-m] "." | [n-z] ","'
+    analysis = analyze(grammar)
+    state = GBNF(grammar, memory_cache=None)
+    live = [len(state.pointers)]
+    for char in "abq":
+        state = state.add(char)
+        live.append(len(state.pointers))
+    assert analysis.max_live_states == max(live) == 4
+
+
+# The most pointers the graph engine holds on random walks through the input
+# the grammar accepts
+def get_live_states(grammar: str, walks: int, length: int) -> int:
+    generator = random.Random(0)
+    most = 0
+    for _ in range(walks):
+        state = GBNF(grammar, memory_cache=None)
+        most = max(most, len(state.pointers))
+        for _ in range(length):
+            step = add_random_code_point(state, generator)
+            if step is None:
+                break
+            state = step[1]
+            most = max(most, len(state.pointers))
+    return most
+
+
+@pytest.mark.parametrize(
+    "grammar",
+    [
+        # Completing x returns into the root while its "b"+ is still looping
+        'root ::= x "a"\nx ::= "b"+ "b"',
+        'root ::= x | "b" "a"+ x\nx ::= "a"',
+        'root ::= "a"+ x "a"\nx ::= "b" x | "a"* "a" "a"',
+        # Each END the root completes at keeps a pointer
+        'root ::= "a" "b"? | "a"',
+        'root ::= (expr "\\n")+\nexpr ::= "(" expr ")" | [a-z]+',
+    ],
+)
+def test_estimates_bound_live_states_on_generated_input(grammar):
+    analysis = analyze(grammar)
+    assert analysis.growth == CONSTANT
+    assert get_live_states(grammar, walks=20, length=30) <= analysis.max_live_states
+
+
+def test_estimates_bound_live_states_of_corpus_grammars():
+    grammars = load_grammars(DEFAULT_GRAMMARS_DIR)
+    if not grammars:
+        pytest.skip("The grammar corpus is only present in a source checkout")
+    for name, grammar in grammars.items():
+        analysis = analyze_rules(*build_rules(grammar, memory_cache=None), grammar=grammar)
+        assert get_live_states(grammar, walks=5, length=200) <= analysis.max_live_states, name
+
+
+def test_flags_grammars_over_the_threshold():
+    grammar = "root ::= " + " | ".join(f'"item{i}"' for i in range(300))
+    assert analyze(grammar).max_live_states == 300
+    assert not analyze(grammar).flagged
+    analysis = analyze(grammar, max_live_states=100)
+    assert analysis.threshold == 100
+    assert analysis.reasons == ("Up to 300 states can be live at once, over the limit of 100",)
+
+
+def test_corpus_grammars_are_not_flagged():
+    grammars = load_grammars(DEFAULT_GRAMMARS_DIR)
+    if not grammars:
+        pytest.skip("The grammar corpus is only present in a source checkout")
+    for name, grammar in grammars.items():
+        analysis = analyze_rules(*build_rules(grammar, memory_cache=None), grammar=grammar)
+        assert not analysis.flagged, (name, analysis.reasons)
+        assert analysis.growth == CONSTANT
+
+
+def test_deep_grammars_are_analyzed_in_linear_time():
+    rules, symbol_ids = build_rules(get_nested_grammar(10_000), memory_cache=None)
+    start = perf_counter()
+    analysis = analyze_rules(rules, symbol_ids)
+    assert perf_counter() - start < 2
+    assert analysis.growth == CONSTANT
+    assert analysis.first_sets["root"] == CharClass([ord("("), ord("[")])
+    # The innermost level and the optional class it holds
+    assert len(analysis.nullable) == 2
+    assert "level-baaaa" in analysis.nullable
+
+
+def test_analyze_grammar():
+    analysis = analyze_grammar('root ::= "a" | "b"', optimize=True)
+    assert analysis.first_sets["root"] == CharClass([ord("a"), ord("b")])
+    assert analysis.max_live_states == 1
+
+
+def test_gbnf_rejects_flagged_grammars():
+    with pytest.raises(GrammarParseError, match="multiply with each level of nesting in 'x'"):
+        GBNF('root ::= x\nx ::= "a" x "b" | "a" x "c" | ""', memory_cache=None, max_live_states=100)
+    with pytest.raises(GrammarParseError, match="over the limit of 2"):
+        GBNF('root ::= "a" | "b" | "c"', memory_cache=None, max_live_states=2)
+    GBNF('root ::= "a" | "b" | "c"', "a", memory_cache=None, max_live_states=3)
+    with pytest.raises(ValueError, match="only applies to the graph engine"):
+        GBNF('root ::= "a"', memory_cache=None, engine="earley", max_live_states=3)
@@ -0,0 +1,109 @@
+from bisect import bisect_right
+
+from ..rules_builder.types import InternalRuleType
+
+MAX_CODE_POINT = 0x10FFFF
+ASCII_SIZE = 128
+
+
+# A char class compiled to sorted, disjoint, non-adjacent intervals of code
+# points. Negated classes are stored as their complement, so membership is the
+# same for both: a bit test for ASCII, and a binary search over the interval
+# starts for everything else. Classes are immutable and compare by the code
+# points they match.
+class CharClass:
+    __slots__ = ("_ascii", "_hash", "ends", "starts")
+
+    # `items` are code points or (start, end) ranges, inclusive
+    def __init__(self, items=(), negated: bool = False):
+        intervals = sorted((item, item) if isinstance(item, int) else tuple(item) for item in items)
+        merged = []
+        for start, end in intervals:
+            if start > end:
+                continue
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        if negated:
+            merged = invert_intervals(merged)
+        self.starts = tuple(start for start, _ in merged)
+        self.ends = tuple(end for _, end in merged)
+        ascii_bits = 0
+        for start, end in merged:
+            if start >= ASCII_SIZE:
+                break
+            end = min(end, ASCII_SIZE - 1)
+            ascii_bits |= ((1 << (end - start + 1)) - 1) << start
+        self._ascii = ascii_bits
+        self._hash = hash((self.starts, self.ends))
+
+    # Builds the class of a CHAR or CHAR_NOT element and the CHAR_ALT and
+    # CHAR_RNG_UPPER elements after it, starting at rule[start]. Returns the
+    # class and the index of the first element past it.
+    @classmethod
+    def from_elements(cls, rule, start: int = 0):
+        negated = rule[start]["type"] is InternalRuleType.CHAR_NOT
+        items = [[rule[start]["value"][0]] * 2]
+        index = start + 1
+        while index < len(rule):
+            element = rule[index]
+            if element["type"] is InternalRuleType.CHAR_RNG_UPPER:
+                items[-1][1] = element["value"]
+            elif element["type"] is InternalRuleType.CHAR_ALT:
+                items.append([element["value"]] * 2)
+            else:
+                break
+            index += 1
+        return cls(items, negated), index
+
+    @property
+    def intervals(self) -> tuple[tuple[int, int], ...]:
+        return tuple(zip(self.starts, self.ends, strict=True))
+
+    def __contains__(self, code_point: int) -> bool:
+        if code_point < ASCII_SIZE:
+            return code_point >= 0 and (self._ascii >> code_point) & 1 == 1
+        index = bisect_right(self.starts, code_point) - 1
+        return index >= 0 and code_point <= self.ends[index]
+
+    def __invert__(self) -> "CharClass":
+        return CharClass(self.intervals, negated=True)
+
+    def __or__(self, other: "CharClass") -> "CharClass":
+        return CharClass((*self.intervals, *other.intervals))
+
+    def __and__(self, other: "CharClass") -> "CharClass":
+        return ~(~self | ~other)
+
+    def __bool__(self) -> bool:
+        return bool(self.starts)
+
+    def __len__(self) -> int:
+        # The number of code points matched
+        return sum(self.ends) - sum(self.starts) + len(self.starts)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CharClass):
+            return NotImplemented
+        return self.starts == other.starts and self.ends == other.ends
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        items = ", ".join(f"{start:#x}" if start == end else f"({start:#x}, {end:#x})" for start, end in self.intervals)
+        return f"CharClass([{items}])"
+
+
+def invert_intervals(intervals) -> list[list[int]]:
+    inverted = []
+    next_start = 0
+    for start, end in intervals:
+        if start > next_start:
+            inverted.append([next_start, start - 1])
+        next_start = end + 1
+    if next_start <= MAX_CODE_POINT:
+        inverted.append([next_start, MAX_CODE_POINT])
+    return inverted
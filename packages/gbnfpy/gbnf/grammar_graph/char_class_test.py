@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from ..rules_builder.rules_builder import RulesBuilder
+from .char_class import MAX_CODE_POINT, CharClass
+
+
+def naive_contains(items, negated: bool, code_point: int) -> bool:
+    ranges = [(item, item) if isinstance(item, int) else item for item in items]
+    return any(start <= code_point <= end for start, end in ranges) != negated
+
+
+@pytest.mark.parametrize(
+    ("items", "negated", "expected"),
+    [
+        ([], False, ()),
+        ([ord("a")], False, ((97, 97),)),
+        ([(ord("a"), ord("z")), ord("b"), ord("{")], False, ((97, 123),)),
+        ([(10, 20), (15, 30), (40, 40), (32, 39)], False, ((10, 30), (32, 40))),
+        ([(5, 1)], False, ()),
+        ([], True, ((0, MAX_CODE_POINT),)),
+        ([0, (10, 20)], True, ((1, 9), (21, MAX_CODE_POINT))),
+        ([(0, MAX_CODE_POINT)], True, ()),
+    ],
+)
+def test_normalizes_intervals(items, negated, expected):
+    assert CharClass(items, negated).intervals == expected
+
+
+def test_membership_matches_a_linear_scan():
+    generator = random.Random(0)
+    for _ in range(200):
+        items = []
+        for _ in range(generator.randrange(1, 12)):
+            start = generator.choice([generator.randrange(160), generator.randrange(0x3000)])
+            items.append(start if generator.random() < 0.3 else (start, start + generator.randrange(40)))
+        negated = generator.random() < 0.5
+        char_class = CharClass(items, negated)
+        for code_point in [*range(200), *(generator.randrange(0x3100) for _ in range(200)), MAX_CODE_POINT]:
+            assert (code_point in char_class) == naive_contains(items, negated, code_point)
+
+
+def test_from_elements():
+    rules = RulesBuilder("root ::= [^a-cx] [0-9] \"q\"").rules
+    first, index = CharClass.from_elements(rules[0])
+    assert first == CharClass([(ord("a"), ord("c")), ord("x")], negated=True)
+    second, index = CharClass.from_elements(rules[0], index)
+    assert second.intervals == ((ord("0"), ord("9")),)
+    assert CharClass.from_elements(rules[0], index) == (CharClass([ord("q")]), index + 1)
+
+
+def test_set_operations():
+    lower = CharClass([(ord("a"), ord("z"))])
+    vowels = CharClass(map(ord, "aeiou"))
+    assert lower | vowels == lower
+    assert (lower & ~vowels) == CharClass([(ord("a"), ord("z"))]) & CharClass(map(ord, "aeiou"), negated=True)
+    assert "e" not in {chr(code_point) for code_point in range(128) if code_point in lower & ~vowels}
+    assert len(lower) == 26
+    assert not CharClass()
+    assert ~CharClass()
+
+
+def test_equal_classes_hash_equal():
+    assert CharClass([1, 2, 3]) == CharClass([(1, 3)])
+    assert hash(CharClass([1, 2, 3])) == hash(CharClass([(1, 3)]))
+    assert CharClass([1]) != CharClass([2])
@@ -0,0 +1,316 @@
+from ..rules_builder.errors import InputParseError
+from .graph import get_input_as_code_points
+from .types import END, RuleRef
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from ..rules_builder.errors import ValidInput
+    from .graph import Graph
+
+# What input that no item matches parses to; falsy, like an empty pointer set
+NO_COLUMN = frozenset()
+# Stands for accepted input among what completing a rule leads to
+ACCEPTED = (-1, ())
+
+
+# One position of an Earley chart: the items alive after some input. An item
+# is a node, how far parsing has got through one path of a rule, and the
+# column where that rule was entered. Columns are never changed once built,
+# so states forked from one column share it and everything before it.
+class Column:
+    __slots__ = ("continuations", "end_node", "leo", "scans", "signature", "waiting")
+
+    def __init__(self):
+        # Items resting on a char class, which the next code point may advance
+        self.scans = []
+        # Items resting on a reference, per referenced rule, to advance once
+        # that rule completes
+        self.waiting = {}
+        # Leo's topmost completed item, per rule completing at this column
+        self.leo = {}
+        # A root END node if the input so far is complete, else -1
+        self.end_node = -1
+        # Spelled-out forms of what completing a rule here leads to, per rule,
+        # and of the whole column, built when a signature is asked for
+        self.continuations = {}
+        self.signature = None
+
+    # The nodes of the items waiting on a code point, plus a root END node if
+    # the input is complete, so a column reads like a graph's pointers
+    def __iter__(self) -> "Iterator[int]":
+        for node, _ in self.scans:
+            yield node
+        if self.end_node != -1:
+            yield self.end_node
+
+    def __len__(self) -> int:
+        return len(self.scans) + (self.end_node != -1)
+
+
+# An Earley recognizer over a graph's nodes, usable wherever a Graph is: states
+# hold a Column as their pointers. Unlike the graph's pointer sets, a chart
+# handles left recursion and keeps ambiguous grammars to cubic time in the
+# worst case. Nullable rules are advanced over as they are predicted (Aycock
+# and Horspool), and chains of completions through right recursion, which is
+# what repetitions compile to, are cut short with Leo's topmost items, so
+# unambiguous grammars parse in near-linear time.
+class EarleyParser:
+    __slots__ = (
+        "_continuations",
+        "_initial",
+        "atom_starts",
+        "get_atom",
+        "graph",
+        "nodes",
+        "nullable",
+        "rule_ids",
+        "starts",
+    )
+
+    def __init__(self, graph: "Graph"):
+        self.graph = graph
+        self.nodes = graph.nodes
+        self.starts = graph.starts
+        self.rule_ids = [rule_id for rule_id, _, _ in graph.meta]
+        self.nullable = graph.get_nullable_rules()
+        self.atom_starts = graph.atom_starts
+        self.get_atom = graph.get_atom
+        self._initial = None
+        # Every continuation built so far, so equal ones are the same object
+        self._continuations = {}
+
+    @property
+    def grammar(self) -> str:
+        return self.graph.grammar
+
+    # Columns are built once per input position, so there is nothing to share
+    def intern(self, pointers):
+        return pointers
+
+    # A hashable value equal for columns that accept the same continuations,
+    # in this parser or any other over the same rules. Each item is spelled out
+    # as its node and the continuation of its rule at the column it was
+    # entered at, in the same shape as a graph's (node, stack) pairs.
+    def get_signature(self, column: Column) -> tuple[bytes, frozenset]:
+        if not column:
+            return self.graph.fingerprint, frozenset()
+        if column.signature is None:
+            rule_ids = self.rule_ids
+            items = {(node, self.get_continuation(origin, rule_ids[node])) for node, origin in column.scans}
+            if column.end_node != -1:
+                items.add((column.end_node, ()))
+            column.signature = (self.graph.fingerprint, frozenset(items))
+        return column.signature
+
+    # What completing a rule at a column leads to: the nodes after the items
+    # waiting on it, each with the continuation of its own rule where it was
+    # entered. Items whose rule completes along with this one are replaced by
+    # what that completion leads to, as the graph does for calls in tail
+    # position, so repetitions spell out the same however often they repeat.
+    # Items entered at the same column can wait on each other through left
+    # recursion; those refer to their rule by id, and the continuation then
+    # carries what completing each rule of the column it reaches leads to.
+    # Continuations only depend on earlier columns, which are built first, so
+    # deep nesting needs no recursion.
+    def get_continuation(self, column: Column, rule_id: int) -> "frozenset | tuple":
+        continuation = column.continuations.get(rule_id)
+        if continuation is not None:
+            return continuation
+        rule_ids = self.rule_ids
+        pending = [(column, rule_id)]
+        while pending:
+            current, current_id = pending[-1]
+            if current_id in current.continuations:
+                pending.pop()
+                continue
+            local = self.get_local_rules(current, current_id)
+            missing = [
+                (origin, rule_ids[waiter])
+                for local_id in local
+                for waiter, origin in current.waiting.get(local_id, ())
+                if origin is not current and rule_ids[waiter] not in origin.continuations
+            ]
+            if missing:
+                pending.extend(missing)
+                continue
+            pending.pop()
+            continuation = self.build_continuation(current, current_id, local)
+            current.continuations[current_id] = self._continuations.setdefault(continuation, continuation)
+        return column.continuations[rule_id]
+
+    def build_continuation(self, column: Column, rule_id: int, local: set[int]) -> "frozenset | tuple":
+        nodes = self.nodes
+        rule_ids = self.rule_ids
+        following = {}
+        tails = {}
+        refers = False
+        for local_id in local:
+            items = following[local_id] = set()
+            tails[local_id] = []
+            for waiter, origin in column.waiting.get(local_id, ()):
+                parent_id = rule_ids[waiter]
+                if origin is column:
+                    if nodes[waiter + 1] is END:
+                        tails[local_id].append(parent_id)
+                    else:
+                        items.add((waiter + 1, parent_id))
+                        refers = True
+                    continue
+                parent = origin.continuations[parent_id]
+                if nodes[waiter + 1] is END and isinstance(parent, frozenset):
+                    items.update(parent)
+                else:
+                    items.add((waiter + 1, parent))
+            if local_id == self.graph.root_id and column is self._initial:
+                items.add(ACCEPTED)
+        # Rules completing along with others at this column lead wherever those do
+        changed = True
+        while changed:
+            changed = False
+            for local_id, parent_ids in tails.items():
+                items = following[local_id]
+                size = len(items)
+                for parent_id in parent_ids:
+                    items.update(following[parent_id])
+                changed = changed or len(items) != size
+        if not refers:
+            return frozenset(following[rule_id])
+        return rule_id, tuple((local_id, frozenset(following[local_id])) for local_id in sorted(local))
+
+    # The rules whose completion at a column completing `rule_id` there can
+    # lead to, through items entered at that column
+    def get_local_rules(self, column: Column, rule_id: int) -> set[int]:
+        local = {rule_id}
+        pending = [rule_id]
+        while pending:
+            for waiter, origin in column.waiting.get(pending.pop(), ()):
+                parent_id = self.rule_ids[waiter]
+                if origin is column and parent_id not in local:
+                    local.add(parent_id)
+                    pending.append(parent_id)
+        return local
+
+    def get_rule(self, node: int):
+        return self.nodes[node]
+
+    def get_initial_pointers(self) -> Column:
+        if self._initial is None:
+            column = Column()
+            self._initial = column
+            self.close(column, [(start, column) for start in self.starts[self.graph.root_id]])
+        return self._initial
+
+    # Advances every item of the column that the code point matches, then
+    # completes the new column. Returns NO_COLUMN if nothing matched.
+    def parse(self, column: Column, code_point: int):
+        nodes = self.nodes
+        matches = {}
+        kernel = []
+        for node, origin in column.scans:
+            char_class = nodes[node]
+            valid = matches.get(char_class)
+            if valid is None:
+                valid = matches[char_class] = code_point in char_class
+            if valid:
+                kernel.append((node + 1, origin))
+        if not kernel:
+            return NO_COLUMN
+        next_column = Column()
+        self.close(next_column, kernel)
+        return next_column
+
+    # Predicts and completes from the kernel items until the column holds
+    # every item they lead to
+    def close(self, column: Column, kernel: list[tuple[int, Column]]):
+        nodes = self.nodes
+        rule_ids = self.rule_ids
+        starts = self.starts
+        nullable = self.nullable
+        root_id = self.graph.root_id
+        initial = self._initial
+        waiting = column.waiting
+        scans = column.scans
+        items = set(kernel)
+        work = list(items)
+        predicted = set()
+        while work:
+            item = work.pop()
+            node, origin = item
+            rule = nodes[node]
+            if rule is END:
+                rule_id = rule_ids[node]
+                if rule_id == root_id and origin is initial:
+                    column.end_node = node
+                # Rules entered here matched nothing, and the items waiting
+                # on them moved past them when they were predicted
+                if origin is column:
+                    continue
+                top = self.get_leo(origin, rule_id)
+                if top is not None:
+                    following = [top]
+                else:
+                    following = [(waiter + 1, entered) for waiter, entered in origin.waiting.get(rule_id, ())]
+            elif isinstance(rule, RuleRef):
+                referenced = rule.value
+                waiting.setdefault(referenced, []).append(item)
+                following = []
+                if referenced not in predicted:
+                    predicted.add(referenced)
+                    following = [(start, column) for start in starts[referenced]]
+                if referenced in nullable:
+                    following.append((node + 1, origin))
+            else:
+                scans.append(item)
+                continue
+            for next_item in following:
+                if next_item not in items:
+                    items.add(next_item)
+                    work.append(next_item)
+
+    # Completing a rule at a column where exactly one item waits on it, with
+    # nothing after the reference, completes that item's rule too, and so on
+    # up the chain. Returns the completed item at the top of such a chain, or
+    # None if the rule completes into more than one item.
+    # The chain is walked up in a loop and memoized on the way back down, so
+    # chains as deep as the input is nested need no recursion.
+    def get_leo(self, column: Column, rule_id: int) -> tuple[int, Column] | None:
+        nodes = self.nodes
+        links = []
+        top = None
+        while True:
+            leo = column.leo
+            if rule_id in leo:
+                top = leo[rule_id]
+                break
+            # Guards against chains that loop back to this rule
+            leo[rule_id] = None
+            item = None
+            waiting = column.waiting.get(rule_id)
+            if waiting is not None and len(waiting) == 1:
+                node, origin = waiting[0]
+                if nodes[node + 1] is END:
+                    item = (node + 1, origin)
+            links.append((leo, rule_id, item))
+            if item is None:
+                break
+            parent_id = self.rule_ids[node]
+            # A completed root is where input is accepted, so it is never
+            # skipped over
+            if parent_id == self.graph.root_id and origin is self._initial:
+                break
+            column, rule_id = origin, parent_id
+        # Each link's top is the top of the chain above it, or its own item
+        for leo, rule_id, item in reversed(links):
+            top = None if item is None else top or item
+            leo[rule_id] = top
+        return top
+
+    def add(self, src: "ValidInput", pointers: Column | None = None) -> Column:
+        column = self.get_initial_pointers() if pointers is None else pointers
+        for pos, code_point in enumerate(get_input_as_code_points(src)):
+            column = self.parse(column, code_point)
+            if not column:
+                raise InputParseError(src, pos)
+        return column
@@ -0,0 +1,127 @@
+import random
+import re
+
+import pytest
+
+from ..bench import DEFAULT_GRAMMARS_DIR, DEFAULT_SAMPLES_DIR, load_grammars, load_samples
+from ..bench.earley import ITERATIVE_ARITHMETIC, LEFT_RECURSIVE_ARITHMETIC, generate_arithmetic
+from ..bench.matching import generate_input
+from ..GBNF import GBNF
+from ..rules_builder.errors import GrammarParseError, InputParseError
+from ..vocabulary import Vocabulary
+from ..vocabulary_test import JSON_GRAMMAR, TOKENS, get_allowed_naively
+from .earley import EarleyParser
+from .types import END
+
+
+def assert_matches_like(state, expected, src):
+    try:
+        expected = expected.add(src)
+    except InputParseError as error:
+        expected = error
+    if isinstance(expected, InputParseError):
+        with pytest.raises(InputParseError, match=f"^{re.escape(str(expected))}$") as earley_error:
+            state.add(src)
+        assert earley_error.value.pos == expected.pos
+    else:
+        assert set(state.add(src).rules()) == set(expected.rules())
+
+
+def test_engine_is_selectable():
+    state = GBNF(LEFT_RECURSIVE_ARITHMETIC, "1+2", engine="earley", memory_cache=None)
+    assert isinstance(state.graph, EarleyParser)
+    assert state.grammar == LEFT_RECURSIVE_ARITHMETIC
+    with pytest.raises(ValueError, match="Unknown engine 'cyk'"):
+        GBNF('root ::= "a"', engine="cyk", memory_cache=None)
+    with pytest.raises(ValueError, match="only available with the graph engine"):
+        GBNF('root ::= "a"', engine="earley", dfa=True, memory_cache=None)
+
+
+def test_accepts_left_recursion():
+    with pytest.raises(GrammarParseError, match="left-recursive"):
+        GBNF(LEFT_RECURSIVE_ARITHMETIC, memory_cache=None)
+    earley = GBNF(LEFT_RECURSIVE_ARITHMETIC, engine="earley", memory_cache=None)
+    iterative = GBNF(ITERATIVE_ARITHMETIC, memory_cache=None)
+    generator = random.Random(0)
+    for _ in range(50):
+        text = generate_arithmetic(generator.randint(1, 30), generator)
+        assert_matches_like(earley, iterative, text)
+        position = generator.randrange(len(text) + 1)
+        assert_matches_like(earley, iterative, text[:position] + generator.choice("+*()1x") + text[position:])
+
+
+@pytest.mark.parametrize(
+    ("grammar", "pattern"),
+    [
+        # Nullable rules, before, between and after input
+        ('root ::= a b "x" a\na ::= "" | "a"\nb ::= a a', r"a{0,3}xa?"),
+        # Right recursion, where Leo's items cut completions short
+        ('root ::= "a" root | ""', r"a*"),
+        ('root ::= item\nitem ::= "a" more\nmore ::= item | "b"', r"a+b"),
+        # Ambiguous: every split of the input is a parse
+        ('root ::= root root | "a" | ""', r"a*"),
+        # Left recursion through a nullable prefix; spaces need a "+" to pair with
+        (
+            'root ::= expr\nexpr ::= ws expr "+" num | num\nws ::= " "*\nnum ::= [0-9]+',
+            r"[0-9]+(\+[0-9]+)*| +[0-9]+(\+[0-9]+)+",
+        ),
+    ],
+)
+def test_matches_reference_languages(grammar, pattern):
+    initial = GBNF(grammar, engine="earley", memory_cache=None)
+    generator = random.Random(1)
+    for _ in range(300):
+        text = "".join(generator.choice("ax b+1") for _ in range(generator.randint(0, 8)))
+        try:
+            complete = END in set(initial.add(text).rules())
+        except InputParseError:
+            complete = False
+        assert complete == bool(re.fullmatch(pattern, text)), text
+
+
+def test_ambiguity_stays_polynomial():
+    state = GBNF('root ::= root root | "a" | ""', engine="earley", memory_cache=None)
+    for _ in range(200):
+        state = state.add("a")
+    assert END in set(state.rules())
+
+
+def test_forks_are_independent():
+    initial = GBNF(LEFT_RECURSIVE_ARITHMETIC, "(1+2", engine="earley", memory_cache=None)
+    closed = initial.add(")*3")
+    opened = initial.add("*(4")
+    assert END in set(closed.rules())
+    assert END not in set(opened.rules())
+    with pytest.raises(InputParseError):
+        opened.add(")))")
+    assert END in set(initial.add(")").rules())
+    closed.add("-5")
+
+
+def test_matches_corpus_like_the_graph():
+    grammars = load_grammars(DEFAULT_GRAMMARS_DIR)
+    if not grammars:
+        pytest.skip("The grammar corpus is only present in a source checkout")
+    generator = random.Random(0)
+    for name, grammar in grammars.items():
+        graph = GBNF(grammar, memory_cache=None)
+        earley = GBNF(grammar, engine="earley", memory_cache=None)
+        for text in [*load_samples(DEFAULT_SAMPLES_DIR, name), generate_input(grammar, 200)]:
+            position = generator.randrange(len(text) + 1)
+            for src in [text, text[:position], text[:position] + "\x07" + text[position:]]:
+                assert_matches_like(earley, graph, src)
+
+
+def test_deep_nesting_needs_no_recursion():
+    depth = 5_000
+    state = GBNF('root ::= "(" root ")" | "a"', "(" * depth, engine="earley", memory_cache=None)
+    assert len(state.pointers) == 2
+    assert END in set(state.add("a" + ")" * depth).rules())
+    with pytest.raises(InputParseError):
+        state.add("a" + ")" * (depth + 1))
+
+
+def test_allowed_tokens():
+    vocab = Vocabulary(TOKENS)
+    state = GBNF(JSON_GRAMMAR, '{"a": [1, {"b', engine="earley", memory_cache=None)
+    assert set(state.allowed_tokens(vocab)) == get_allowed_naively(state, TOKENS)
@@ -0,0 +1,358 @@
+from bisect import bisect_right
+from weakref import WeakKeyDictionary, WeakValueDictionary
+
+from ..rules_builder.errors import GrammarParseError, InputParseError
+from .char_class import MAX_CODE_POINT, CharClass
+from .types import END, RuleRef
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from ..rules_builder.errors import ValidInput
+
+
+def get_input_as_code_points(src: "ValidInput") -> list[int]:
+    if isinstance(src, str):
+        return [ord(char) for char in src]
+    return src if isinstance(src, list) else [src]
+
+
+# The ids of rules with a path that reaches its END once every rule it
+# references is among them, stepping over char classes only if `over_classes`.
+# A path waits at the first reference it cannot step over until that rule is
+# found, so each node is stepped over once however deep the references go.
+def get_completing_rules(nodes: list, starts: list[list[int]], over_classes: bool) -> set[int]:
+    completing = set()
+    waiting = {}
+    pending = [(rule_id, node) for rule_id, rule_starts in enumerate(starts) for node in rule_starts]
+    while pending:
+        rule_id, node = pending.pop()
+        if rule_id in completing:
+            continue
+        rule = nodes[node]
+        while rule is not END:
+            if isinstance(rule, RuleRef):
+                if rule.value not in completing:
+                    waiting.setdefault(rule.value, []).append((rule_id, node))
+                    break
+            elif not over_classes:
+                break
+            node += 1
+            rule = nodes[node]
+        else:
+            completing.add(rule_id)
+            pending.extend(waiting.pop(rule_id, ()))
+    return completing
+
+
+# A set of pointers that a graph has interned, so states that reach the same
+# pointers share one set. Sets are weakly referenced, so an interned set lives
+# as long as some state holds it.
+class PointerSet(frozenset):
+    __slots__ = ()
+
+
+# The grammar as a graph of nodes, one per step of every path through every
+# rule, held in flat lists indexed by node id. Where a path steps into another
+# rule, the node to return to is pushed onto a parent stack. Stacks are
+# interned, so a stack is an integer id, and a pointer into the graph (a node
+# plus the stack it was reached with) packs into a single integer:
+# `stack_id * node_count + node_id`. Pointers only ever rest on char classes,
+# or on an END with an empty stack, which marks input the grammar accepts.
+class Graph:
+    __slots__ = (
+        "_fingerprint",
+        "_pointer_sets",
+        "_resolved",
+        "_signatures",
+        "_stack_ids",
+        "_stack_keys",
+        "atom_starts",
+        "dfa",
+        "grammar",
+        "lookahead",
+        "meta",
+        "node_count",
+        "nodes",
+        "root_id",
+        "rule_names",
+        "stack_parents",
+        "stack_returns",
+        "starts",
+    )
+
+    def __init__(
+        self,
+        grammar: str,
+        stacked_rules,
+        root_id: int,
+        symbol_ids: dict[str, int] | None = None,
+        *,
+        allow_left_recursion: bool = False,
+    ):
+        self.grammar = grammar
+        self.root_id = root_id
+        self.rule_names = {rule_id: name for name, rule_id in (symbol_ids or {}).items()}
+        # The rule at each node: a CharClass, a RuleRef or END
+        self.nodes = []
+        # (rule id, path id, step id) of each node
+        self.meta = []
+        # The first node of every path, per rule
+        self.starts = []
+        # Identical classes share one object, so they are tested once per code point
+        char_classes = {}
+        for rule_id, paths in enumerate(stacked_rules):
+            starts = []
+            for path_id, path in enumerate(paths):
+                starts.append(len(self.nodes))
+                for step_id, rule in enumerate(path):
+                    if isinstance(rule, CharClass):
+                        rule = char_classes.setdefault(rule, rule)
+                    # A path's steps take consecutive ids, so the node after
+                    # any node but an END is the next id
+                    self.nodes.append(rule)
+                    self.meta.append((rule_id, path_id, step_id))
+            self.starts.append(starts)
+        self.node_count = len(self.nodes)
+        # The code points split into atoms, ranges that every class in the
+        # grammar either wholly matches or wholly does not. Code points in the
+        # same atom always parse the same way.
+        boundaries = {0}
+        for char_class in char_classes:
+            boundaries.update(char_class.starts)
+            boundaries.update(end + 1 for end in char_class.ends if end < MAX_CODE_POINT)
+        self.atom_starts = sorted(boundaries)
+        # Stack 0 is the empty stack
+        self.stack_returns = [-1]
+        self.stack_parents = [-1]
+        self._stack_ids = {}
+        # Resolved pointers for each pointer that has been resolved
+        self._resolved = {}
+        self._pointer_sets = WeakValueDictionary()
+        self._fingerprint = None
+        self._signatures = WeakKeyDictionary()
+        # The return nodes of each stack, top first, for stacks that have
+        # been spelled out
+        self._stack_keys = [()]
+        # A LazyDFA that input goes through instead of simulating the graph,
+        # if one is set
+        self.dfa = None
+        # A LookaheadIndex that input goes through instead, pruning the paths
+        # the next code point cannot take, if one is set
+        self.lookahead = None
+        # Other engines can lay out the nodes of left-recursive grammars, but
+        # never resolve pointers through them
+        if not allow_left_recursion:
+            self.check_left_recursion()
+
+    def get_rule_name(self, rule_id: int) -> str:
+        return self.rule_names.get(rule_id, str(rule_id))
+
+    # Walking into a left-recursive rule would push parents forever without
+    # consuming input, so such grammars are rejected up front
+    def check_left_recursion(self):
+        nullable = self.get_nullable_rules()
+
+        # The rules each rule can reference before consuming any input
+        left_references = []
+        for starts in self.starts:
+            references = set()
+            for node in starts:
+                rule = self.nodes[node]
+                while isinstance(rule, RuleRef):
+                    references.add(rule.value)
+                    if rule.value not in nullable:
+                        break
+                    node += 1
+                    rule = self.nodes[node]
+            left_references.append(references)
+
+        # Left recursion only matters in rules the root can reach
+        reachable = {self.root_id}
+        pending = [self.root_id]
+        while pending:
+            for node in self.starts[pending.pop()]:
+                rule = self.nodes[node]
+                while rule is not END:
+                    if isinstance(rule, RuleRef) and rule.value not in reachable:
+                        reachable.add(rule.value)
+                        pending.append(rule.value)
+                    node += 1
+                    rule = self.nodes[node]
+
+        # Depth-first search for a cycle of left references
+        done = set()
+        for start in sorted(reachable):
+            if start in done:
+                continue
+            visiting = {start}
+            work = [(start, iter(left_references[start]))]
+            while work:
+                rule_id, children = work[-1]
+                for child in children:
+                    if child in visiting:
+                        reason = f"Rule '{self.get_rule_name(child)}' is left-recursive"
+                        raise GrammarParseError(self.grammar, 0, reason)
+                    if child not in done:
+                        visiting.add(child)
+                        work.append((child, iter(left_references[child])))
+                        break
+                else:
+                    work.pop()
+                    visiting.discard(rule_id)
+                    done.add(rule_id)
+
+    # The ids of rules that can match empty input
+    def get_nullable_rules(self) -> set[int]:
+        return get_completing_rules(self.nodes, self.starts, over_classes=False)
+
+    def is_nullable_from(self, node: int, nullable: set[int]) -> bool:
+        rule = self.nodes[node]
+        while isinstance(rule, RuleRef) and rule.value in nullable:
+            node += 1
+            rule = self.nodes[node]
+        return rule is END
+
+    def push(self, stack_id: int, return_node: int) -> int:
+        key = (return_node, stack_id)
+        pushed = self._stack_ids.get(key)
+        if pushed is None:
+            pushed = self._stack_ids[key] = len(self.stack_returns)
+            self.stack_returns.append(return_node)
+            self.stack_parents.append(stack_id)
+        return pushed
+
+    # Follows rule references and the ends of referenced rules from a pointer
+    # until every branch rests on a char class or the final END. The result
+    # only depends on the pointer, so it is computed once per pointer.
+    def resolve(self, pointer: int) -> tuple[int, ...]:
+        resolved = self._resolved.get(pointer)
+        if resolved is not None:
+            return resolved
+        nodes = self.nodes
+        node_count = self.node_count
+        results = []
+        seen = {pointer}
+        work = [pointer]
+        while work:
+            current = work.pop()
+            stack_id, node = divmod(current, node_count)
+            rule = nodes[node]
+            if rule is END:
+                if stack_id == 0:
+                    results.append(current)
+                    continue
+                # The referenced rule is done; carry on after the reference
+                following = [self.stack_parents[stack_id] * node_count + self.stack_returns[stack_id]]
+            elif isinstance(rule, RuleRef):
+                # A reference in tail position has nothing to return to, so
+                # the referenced rule runs on the same stack. Repetitions,
+                # which compile to right recursion, then keep a flat stack.
+                if nodes[node + 1] is END:
+                    pushed = stack_id * node_count
+                else:
+                    pushed = self.push(stack_id, node + 1) * node_count
+                following = [pushed + start for start in self.starts[rule.value]]
+            else:
+                results.append(current)
+                continue
+            for pointer_ in following:
+                if pointer_ not in seen:
+                    seen.add(pointer_)
+                    work.append(pointer_)
+        resolved = self._resolved[pointer] = tuple(results)
+        return resolved
+
+    # The id of the atom holding a code point
+    def get_atom(self, code_point: int) -> int:
+        return bisect_right(self.atom_starts, code_point) - 1
+
+    # Returns the graph's shared copy of a set of pointers
+    def intern(self, pointers) -> PointerSet:
+        pointer_set = self._pointer_sets.get(pointers)
+        if pointer_set is None:
+            pointer_set = PointerSet(pointers)
+            self._pointer_sets[pointer_set] = pointer_set
+        return pointer_set
+
+    # A digest of the graph's structure. Graphs compiled from the same rules
+    # get the same nodes and so the same fingerprint, whatever their grammar
+    # source looked like.
+    @property
+    def fingerprint(self) -> bytes:
+        if self._fingerprint is None:
+            from hashlib import blake2b
+
+            structure = repr((self.root_id, self.starts, self.nodes))
+            self._fingerprint = blake2b(structure.encode("utf-8"), digest_size=16).digest()
+        return self._fingerprint
+
+    def get_stack_key(self, stack_id: int) -> tuple[int, ...]:
+        stack_keys = self._stack_keys
+        if stack_id < len(stack_keys):
+            return stack_keys[stack_id]
+        stack_returns = self.stack_returns
+        stack_parents = self.stack_parents
+        # Stacks are created after their parents, so spelling out the stacks
+        # in id order always finds the parent's key ready
+        for new_id in range(len(stack_keys), stack_id + 1):
+            stack_keys.append((stack_returns[new_id], *stack_keys[stack_parents[new_id]]))
+        return stack_keys[stack_id]
+
+    # A hashable value equal for equal sets of pointers, in this graph or in
+    # any other with the same fingerprint. Stack ids depend on the order
+    # stacks were met in, so each pointer is spelled out as its node and its
+    # stack's return nodes.
+    def get_signature(self, pointers) -> tuple[bytes, frozenset]:
+        pointers = self.intern(pointers)
+        signature = self._signatures.get(pointers)
+        if signature is None:
+            spelled = set()
+            for pointer in pointers:
+                stack_id, node = divmod(pointer, self.node_count)
+                spelled.add((node, self.get_stack_key(stack_id)))
+            signature = self._signatures[pointers] = (self.fingerprint, frozenset(spelled))
+        return signature
+
+    def get_initial_pointers(self) -> PointerSet:
+        pointers = set()
+        for start in self.starts[self.root_id]:
+            pointers.update(self.resolve(start))
+        return self.intern(frozenset(pointers))
+
+    # Returns the pointers left after `code_point`, which may be empty
+    def parse(self, pointers, code_point: int) -> frozenset[int]:
+        nodes = self.nodes
+        node_count = self.node_count
+        resolve = self.resolve
+        resolved = self._resolved
+        matches = {}
+        next_pointers = set()
+        for pointer in pointers:
+            node = pointer % node_count
+            char_class = nodes[node]
+            if char_class is END:
+                continue
+            valid = matches.get(char_class)
+            if valid is None:
+                valid = matches[char_class] = code_point in char_class
+            if valid:
+                # The next node is always the following id on the same stack
+                following = pointer + 1
+                next_pointers.update(resolved.get(following) or resolve(following))
+        return frozenset(next_pointers)
+
+    def add(self, src: "ValidInput", pointers: frozenset[int] | None = None) -> PointerSet:
+        if self.lookahead is not None:
+            return self.lookahead.add(src, pointers)
+        if pointers is None:
+            pointers = self.get_initial_pointers()
+        if self.dfa is not None:
+            return self.dfa.add(src, self.intern(pointers))
+        for pos, code_point in enumerate(get_input_as_code_points(src)):
+            pointers = self.parse(pointers, code_point)
+            if not pointers:
+                raise InputParseError(src, pos)
+        return pointers if isinstance(pointers, PointerSet) else self.intern(pointers)
+
+    def get_rule(self, pointer: int):
+        return self.nodes[pointer % self.node_count]
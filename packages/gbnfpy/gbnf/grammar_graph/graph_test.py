@@ -0,0 +1,124 @@
+import pytest
+
+from ..bench import DEFAULT_GRAMMARS_DIR, DEFAULT_SAMPLES_DIR, load_grammars, load_samples
+from ..GBNF import GBNF
+from ..rules_builder.errors import GrammarParseError, InputParseError
+from .char_class import CharClass
+from .types import END
+
+FOO_BAR_BAZ = """root ::= f | b
+f ::= fo
+b ::= ba
+fo ::= foo
+ba ::= bar | baz
+foo ::= "foo"
+bar ::= "bar"
+baz ::= "baz"
+"""
+
+
+@pytest.mark.parametrize(
+    ("grammar", "src", "pos"),
+    [
+        ('root ::= "foo"', "1", 0),
+        ('root ::= "foo"', "f1", 1),
+        ('root ::= "foo"', "fooo", 3),
+        ('root ::= "foo" | "bar"', "ba1", 2),
+        ('root ::= "foo" | "bar" | "baz"', "bazrr", 3),
+        ("root ::= [^abc]", "b", 0),
+        ("root ::= [^a-zA-Z0-9]", "8", 0),
+        ('root::=foo|"bar"\nfoo::="foo"', "barr", 3),
+        (FOO_BAR_BAZ, "b1", 1),
+        (FOO_BAR_BAZ, "bazr", 3),
+        ("root ::= [a-z]?", "az", 1),
+        ("root ::= [a-z]+", "az0", 2),
+        ("root ::= [a-z]*", "az0", 2),
+        # Either class may match, so only "a" is rejected
+        ("root ::= ( [^abcdefgh] | [b-z])*", "a", 0),
+    ],
+)
+def test_rejects_invalid_input(grammar, src, pos):
+    with pytest.raises(InputParseError) as error:
+        GBNF(grammar, src, memory_cache=None)
+    assert error.value.pos == pos
+    assert error.value.src == src
+
+
+@pytest.mark.parametrize(
+    ("grammar", "start", "additional", "pos"),
+    [
+        ('root ::= "foo"', "f", "ooo", 2),
+        ('root ::= "foo" | "bar" | "baz"', "b", "azrr", 2),
+        (FOO_BAR_BAZ, "f", "o1", 1),
+        ("root ::= [a-z]+", "a", "z0", 1),
+    ],
+)
+def test_rejects_invalid_additional_input(grammar, start, additional, pos):
+    state = GBNF(grammar, start, memory_cache=None)
+    with pytest.raises(InputParseError) as error:
+        state.add(additional)
+    assert error.value.pos == pos
+
+
+def chars(*values: str) -> set[CharClass]:
+    return {CharClass(map(ord, value)) for value in values}
+
+
+@pytest.mark.parametrize(
+    ("grammar", "src", "expected"),
+    [
+        ('root ::= "foo"', "", chars("f")),
+        ('root ::= "foo"', "fo", chars("o")),
+        ('root ::= "foo"', "foo", {END}),
+        ('root ::= "foo" | "bar"', "", chars("f", "b")),
+        ('root ::= "foo" | "bar" | "baz"', "ba", chars("r", "z")),
+        ('root ::= "[{\\"}]"', '[{"}]', {END}),
+        ('root ::= [^f] "o"', "", {CharClass([ord("f")], negated=True)}),
+        ('root ::= [^f] "o"', "a", chars("o")),
+        ("root ::= [a-z]*", "ab", {CharClass([(ord("a"), ord("z"))]), END}),
+        (FOO_BAR_BAZ, "ba", chars("r", "z")),
+        ('root ::= a? "x"\na ::= "a" | ""', "", chars("a", "x")),
+    ],
+)
+def test_next_rules(grammar, src, expected):
+    state = GBNF(grammar, src, memory_cache=None)
+    assert set(state) == expected
+    assert state.size == len(expected)
+
+
+def test_code_point_input():
+    state = GBNF('root ::= "fo" [^a]', memory_cache=None)
+    assert set(state.add(ord("f")).add([ord("o"), 0x1F600])) == {END}
+
+
+def test_repetition_keeps_a_flat_stack():
+    state = GBNF("root ::= ([a-z]+ [ \\t]*)*", memory_cache=None)
+    state = state.add("the quick brown fox " * 100)
+    assert len(state.graph.stack_returns) < 10
+
+
+def test_rejects_left_recursion():
+    with pytest.raises(GrammarParseError, match="'expr' is left-recursive"):
+        GBNF('root ::= expr\nexpr ::= ws expr "+" num | num\nws ::= " "*\nnum ::= [0-9]+', memory_cache=None)
+    # Recursion after consuming input is fine
+    GBNF('root ::= "(" root ")" | "x"', "((x))", memory_cache=None)
+
+
+def test_left_recursion_in_unreachable_rules_is_ignored():
+    GBNF('root ::= "x"\nloop ::= loop "y" | "y"', "x", memory_cache=None)
+
+
+def test_accepts_corpus_samples():
+    grammars = load_grammars(DEFAULT_GRAMMARS_DIR)
+    if not grammars:
+        pytest.skip("The grammar corpus is only present in a source checkout")
+    checked = 0
+    for name, grammar in grammars.items():
+        initial = GBNF(grammar, memory_cache=None)
+        for sample in load_samples(DEFAULT_SAMPLES_DIR, name):
+            state = initial
+            for char in sample:
+                state = state.add(char)
+            assert state.pointers == initial.add(sample).pointers
+            checked += 1
+    assert checked > 0
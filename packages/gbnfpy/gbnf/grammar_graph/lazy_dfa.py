@@ -0,0 +1,110 @@
+from ..rules_builder.errors import InputParseError
+from .graph import get_input_as_code_points
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from ..rules_builder.errors import ValidInput
+    from .graph import Graph, PointerSet
+
+DEFAULT_MAX_STATES = 10_000
+# State 0 is the empty set of pointers, which input never leaves
+DEAD_STATE = 0
+
+
+# Matching as a DFA built on demand over a graph. Every distinct set of
+# pointers that input reaches becomes a DFA state, and the pointers a code
+# point leads to from a state are found by simulation once and then looked up.
+# Once `max_states` states exist, new sets are no longer given states: input
+# from known states still follows their transitions, and input elsewhere falls
+# back to simulating the graph.
+class LazyDFA:
+    __slots__ = ("_state_ids", "atom_transitions", "graph", "max_states", "states", "transitions")
+
+    def __init__(self, graph: "Graph", max_states: int = DEFAULT_MAX_STATES):
+        self.graph = graph
+        self.max_states = max_states
+        # The pointers of each state
+        self.states = []
+        # Per state, the state each code point seen so far leads to
+        self.transitions = []
+        # Per state, the state each atom leads to. Code points in the same
+        # atom parse alike, so a new code point often needs no simulation.
+        self.atom_transitions = []
+        self._state_ids = {}
+        self.add_state(graph.intern(frozenset()))
+
+    @property
+    def full(self) -> bool:
+        return len(self.states) >= self.max_states
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def add_state(self, pointers: "PointerSet") -> int:
+        state_id = len(self.states)
+        self.states.append(pointers)
+        self.transitions.append({})
+        self.atom_transitions.append({})
+        # Recorded last, so a state id is only ever seen with its tables
+        self._state_ids[pointers] = state_id
+        return state_id
+
+    # The id of the state for a set of pointers, or None if there is none and
+    # no room for one
+    def get_state_id(self, pointers: "PointerSet") -> int | None:
+        state_id = self._state_ids.get(pointers)
+        if state_id is None and not self.full:
+            state_id = self.add_state(pointers)
+        return state_id
+
+    # The state a code point leads to from a state, or None if that is a new
+    # set of pointers and there is no room for it. Either way the pointers
+    # are returned too.
+    def step(self, state_id: int, code_point: int) -> tuple[int | None, "PointerSet"]:
+        atom_key = self.graph.get_atom(code_point)
+        atom_row = self.atom_transitions[state_id]
+        next_id = atom_row.get(atom_key)
+        if next_id is not None:
+            self.transitions[state_id][code_point] = next_id
+            return next_id, self.states[next_id]
+        graph = self.graph
+        pointers = graph.intern(graph.parse(self.states[state_id], code_point))
+        next_id = self.get_state_id(pointers)
+        if next_id is not None:
+            atom_row[atom_key] = next_id
+            self.transitions[state_id][code_point] = next_id
+        return next_id, pointers
+
+    # Returns the pointers left after `code_point`, which may be empty
+    def parse(self, pointers, code_point: int) -> frozenset[int]:
+        state_id = self.get_state_id(self.graph.intern(pointers))
+        if state_id is None:
+            return self.graph.parse(pointers, code_point)
+        next_id = self.transitions[state_id].get(code_point)
+        if next_id is not None:
+            return self.states[next_id]
+        return self.step(state_id, code_point)[1]
+
+    def add(self, src: "ValidInput", pointers: "PointerSet") -> "PointerSet":
+        graph = self.graph
+        transitions = self.transitions
+        state_id = self.get_state_id(pointers)
+        for pos, code_point in enumerate(get_input_as_code_points(src)):
+            if state_id is None:
+                # Past the cap, on pointers that have no state
+                pointers = graph.parse(pointers, code_point)
+                if not pointers:
+                    raise InputParseError(src, pos)
+                pointers = graph.intern(pointers)
+                state_id = self._state_ids.get(pointers)
+                continue
+            next_id = transitions[state_id].get(code_point)
+            if next_id is None:
+                next_id, pointers = self.step(state_id, code_point)
+                if next_id is None:
+                    state_id = None
+                    continue
+            if next_id == DEAD_STATE:
+                raise InputParseError(src, pos)
+            state_id = next_id
+        return pointers if state_id is None else self.states[state_id]
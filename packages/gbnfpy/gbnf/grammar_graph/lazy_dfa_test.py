@@ -0,0 +1,97 @@
+import random
+import re
+
+import pytest
+
+from ..bench import DEFAULT_GRAMMARS_DIR, DEFAULT_SAMPLES_DIR, load_grammars, load_samples
+from ..bench.matching import generate_input
+from ..GBNF import GBNF
+from ..rules_builder.errors import InputParseError
+from .lazy_dfa import DEFAULT_MAX_STATES, LazyDFA
+
+GRAMMAR = 'root ::= ([a-z]+ ("," | ", "))* [0-9]+'
+
+
+def test_dfa_is_opt_in():
+    assert GBNF(GRAMMAR, memory_cache=None).graph.dfa is None
+    assert GBNF(GRAMMAR, memory_cache=None, dfa=True).graph.dfa.max_states == DEFAULT_MAX_STATES
+    assert GBNF(GRAMMAR, memory_cache=None, dfa=50).graph.dfa.max_states == 50
+
+
+def test_matches_like_simulation():
+    simulated = GBNF(GRAMMAR, memory_cache=None)
+    state = GBNF(GRAMMAR, memory_cache=None, dfa=True)
+    for src in ["abc, de,f", "a,", "12", "ab, cd, ef, 3"]:
+        assert state.add(src).pointers == simulated.add(src).pointers
+
+
+@pytest.mark.parametrize(("src", "pos"), [("a1", 1), ("ab,,", 3), ("ab, ,", 4), ("12a", 2)])
+def test_rejects_input_like_simulation(src, pos):
+    state = GBNF(GRAMMAR, memory_cache=None, dfa=True)
+    for _ in range(2):
+        # The second time round, the transitions are memoized
+        with pytest.raises(InputParseError) as error:
+            state.add(src)
+        assert error.value.pos == pos
+
+
+def test_transitions_are_memoized():
+    state = GBNF(GRAMMAR, memory_cache=None, dfa=True)
+    dfa = state.graph.dfa
+    state.add("abc, def, ghi")
+    states = len(dfa)
+    # Every letter is in the same atom, so other letters follow the same transitions
+    state.add("xyz, uvw, rst")
+    assert len(dfa) == states
+    assert dfa.transitions[dfa.get_state_id(state.pointers)]
+
+
+def test_falls_back_to_simulation_past_the_cap():
+    grammar = 'root ::= "{" ("a" | "{" ("a" | "{" "a" "}") "}") "}"'
+    simulated = GBNF(grammar, memory_cache=None)
+    state = GBNF(grammar, memory_cache=None, dfa=3)
+    for src in ["{{{a}}}", "{{a}}", "{a}"]:
+        assert state.add(src).pointers == simulated.add(src).pointers
+    with pytest.raises(InputParseError) as error:
+        state.add("{{{a}a")
+    assert error.value.pos == 5
+    assert len(state.graph.dfa) == 3
+    assert state.graph.dfa.full
+
+
+def test_parse_matches_simulation():
+    state = GBNF(GRAMMAR, memory_cache=None)
+    graph = state.graph
+    dfa = LazyDFA(graph, max_states=4)
+    pointers = state.pointers
+    for char in "ab, cd,e":
+        expected = graph.parse(pointers, ord(char))
+        assert dfa.parse(pointers, ord(char)) == expected
+        assert dfa.parse(pointers, ord(char)) == expected
+        pointers = expected
+
+
+def test_matches_corpus_like_simulation():
+    grammars = load_grammars(DEFAULT_GRAMMARS_DIR)
+    if not grammars:
+        pytest.skip("The grammar corpus is only present in a source checkout")
+    generator = random.Random(0)
+    for name, grammar in grammars.items():
+        simulated = GBNF(grammar, memory_cache=None)
+        for max_states in (DEFAULT_MAX_STATES, 8):
+            state = GBNF(grammar, memory_cache=None, dfa=max_states)
+            texts = [*load_samples(DEFAULT_SAMPLES_DIR, name), generate_input(grammar, 200)]
+            for text in texts:
+                # Corrupt a code point, so rejections are compared too
+                position = generator.randrange(len(text) + 1)
+                for src in [text, text[:position] + "\x07" + text[position:]]:
+                    try:
+                        expected = simulated.add(src).pointers
+                    except InputParseError as error:
+                        expected = error
+                    if isinstance(expected, InputParseError):
+                        with pytest.raises(InputParseError, match=f"^{re.escape(str(expected))}$") as dfa_error:
+                            state.add(src)
+                        assert dfa_error.value.pos == expected.pos
+                    else:
+                        assert state.add(src).pointers == expected
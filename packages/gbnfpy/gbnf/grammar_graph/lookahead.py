@@ -0,0 +1,207 @@
+from bisect import bisect_right
+from weakref import WeakKeyDictionary
+
+from ..rules_builder.errors import InputParseError
+from .analyzer import Analyzer
+from .char_class import MAX_CODE_POINT
+from .graph import PointerSet, get_input_as_code_points
+from .types import END, RuleRef
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from ..rules_builder.errors import ValidInput
+    from .char_class import CharClass
+    from .graph import Graph
+
+
+# For every rule, which of its paths input starting with a given code point
+# can take, from the FIRST sets of the paths. A path that can match nothing is
+# viable whatever the code point, as input may carry on past the rule. The
+# code points are split into intervals where the viable paths stay the same,
+# so a lookup is a binary search.
+#
+# Matching with the index looks one code point ahead: a rule is only entered
+# through the paths the next code point can take, so a rule of thousands of
+# alternates leaves a handful of pointers alive instead of thousands. Pointers
+# between code points of one input are pruned this way; the pointers left
+# after the last code point are never pruned, as the next one is not known,
+# so states come out the same as without the index.
+class LookaheadIndex:
+    __slots__ = ("_entries", "_resolved", "bounds", "first_sets", "graph", "paths")
+
+    def __init__(self, graph: "Graph"):
+        self.graph = graph
+        analyzer = Analyzer(graph)
+        first_sets = analyzer.get_first_sets()
+        # The code points each rule can start with, for rules the root reaches
+        self.first_sets = first_sets
+        # Per rule, the first code point of each interval, and the ids of the
+        # paths viable in each interval. Rules the root never reaches are left
+        # as None, and every path counts as viable.
+        self.bounds = [None] * len(graph.starts)
+        self.paths = [None] * len(graph.starts)
+        for rule_id in first_sets:
+            path_firsts = [
+                None if analyzer.is_nullable_from(start) else analyzer.get_path_first(start, first_sets)
+                for start in graph.starts[rule_id]
+            ]
+            self.bounds[rule_id], self.paths[rule_id] = get_intervals(path_firsts)
+        # Pointers resolved through viable paths, per pointer and atom
+        self._resolved = {}
+        # The pointers of each interned set that a code point matches, per atom
+        self._entries = WeakKeyDictionary()
+
+    # The ids of the paths of a rule that input starting with `code_point`
+    # can take
+    def get_alternates(self, rule_id: int, code_point: int) -> tuple[int, ...]:
+        bounds = self.bounds[rule_id]
+        if bounds is None:
+            return tuple(range(len(self.graph.starts[rule_id])))
+        return self.paths[rule_id][bisect_right(bounds, code_point) - 1]
+
+    # The intervals of a rule's index, as (first, last, path ids), inclusive
+    def get_intervals(self, rule_id: int) -> list[tuple[int, int, tuple[int, ...]]]:
+        bounds = self.bounds[rule_id]
+        if bounds is None:
+            return [(0, MAX_CODE_POINT, self.get_alternates(rule_id, 0))]
+        lasts = [*(bound - 1 for bound in bounds[1:]), MAX_CODE_POINT]
+        return list(zip(bounds, lasts, self.paths[rule_id], strict=True))
+
+    # Like Graph.resolve, but entering rules only through the paths that
+    # `code_point` can take, and keeping only the pointers that match it.
+    # Accepted input cannot take another code point, so the final END is
+    # dropped too.
+    def resolve(self, pointer: int, code_point: int) -> tuple[int, ...]:
+        graph = self.graph
+        key = (pointer, graph.get_atom(code_point))
+        resolved = self._resolved.get(key)
+        if resolved is not None:
+            return resolved
+        resolved = self._resolved[key] = self.resolve_viable(pointer, code_point)
+        return resolved
+
+    def resolve_viable(self, pointer: int, code_point: int) -> tuple[int, ...]:
+        graph = self.graph
+        nodes = graph.nodes
+        node_count = graph.node_count
+        starts = graph.starts
+        results = []
+        seen = {pointer}
+        work = [pointer]
+        while work:
+            current = work.pop()
+            stack_id, node = divmod(current, node_count)
+            rule = nodes[node]
+            if rule is END:
+                if stack_id == 0:
+                    continue
+                following = [graph.stack_parents[stack_id] * node_count + graph.stack_returns[stack_id]]
+            elif isinstance(rule, RuleRef):
+                if nodes[node + 1] is END:
+                    pushed = stack_id * node_count
+                else:
+                    pushed = graph.push(stack_id, node + 1) * node_count
+                rule_starts = starts[rule.value]
+                following = [pushed + rule_starts[path_id] for path_id in self.get_alternates(rule.value, code_point)]
+            else:
+                if code_point in rule:
+                    results.append(current)
+                continue
+            for pointer_ in following:
+                if pointer_ not in seen:
+                    seen.add(pointer_)
+                    work.append(pointer_)
+        return tuple(results)
+
+    # The pointers of a set that `code_point` matches. Sets that states hold
+    # are interned, so this is worked out once per set and atom.
+    def get_entries(self, pointers, code_point: int) -> tuple[int, ...]:
+        graph = self.graph
+        entries = self._entries.get(pointers) if isinstance(pointers, PointerSet) else None
+        atom = graph.get_atom(code_point)
+        if entries is not None and atom in entries:
+            return entries[atom]
+        nodes = graph.nodes
+        node_count = graph.node_count
+        matched = []
+        for pointer in pointers:
+            rule = nodes[pointer % node_count]
+            if rule is not END and code_point in rule:
+                matched.append(pointer)
+        matched = tuple(matched)
+        if isinstance(pointers, PointerSet):
+            self._entries.setdefault(pointers, {})[atom] = matched
+        return matched
+
+    # The pointers left after the code point that every matched pointer
+    # matches, pruned to those that match `next_code_point`
+    def step(self, matched, next_code_point: int) -> set[int]:
+        resolved = self._resolved
+        resolve_viable = self.resolve_viable
+        atom = self.graph.get_atom(next_code_point)
+        next_pointers = set()
+        for pointer in matched:
+            key = (pointer + 1, atom)
+            viable = resolved.get(key)
+            if viable is None:
+                viable = resolved[key] = resolve_viable(pointer + 1, next_code_point)
+            next_pointers.update(viable)
+        return next_pointers
+
+    def add(self, src: "ValidInput", pointers: "PointerSet | None" = None) -> PointerSet:
+        graph = self.graph
+        code_points = get_input_as_code_points(src)
+        if not code_points:
+            return graph.intern(graph.get_initial_pointers() if pointers is None else pointers)
+        if pointers is None:
+            # The root is entered through the paths the first code point can take
+            matched = set()
+            root_starts = graph.starts[graph.root_id]
+            for path_id in self.get_alternates(graph.root_id, code_points[0]):
+                matched.update(self.resolve(root_starts[path_id], code_points[0]))
+        else:
+            matched = self.get_entries(pointers, code_points[0])
+        last = len(code_points) - 1
+        for pos in range(last + 1):
+            if not matched:
+                raise InputParseError(src, pos)
+            if pos < last:
+                matched = self.step(matched, code_points[pos + 1])
+        # Nothing is known past the last code point, so its pointers are resolved in full
+        resolve = graph.resolve
+        next_pointers = set()
+        for pointer in matched:
+            next_pointers.update(resolve(pointer + 1))
+        if not next_pointers:
+            raise InputParseError(src, last)
+        return graph.intern(frozenset(next_pointers))
+
+
+# Splits the code points into intervals by which of the given FIRST sets hold
+# them. A FIRST set of None holds every code point. Returns the first code
+# point of each interval and the indexes of the sets holding it, with
+# neighbouring intervals held by the same sets merged.
+def get_intervals(first_sets: "list[CharClass | None]") -> tuple[list[int], list[tuple[int, ...]]]:
+    boundaries = {0}
+    for first in first_sets:
+        if first is not None:
+            boundaries.update(first.starts)
+            boundaries.update(end + 1 for end in first.ends if end < MAX_CODE_POINT)
+    boundaries = sorted(boundaries)
+    holders = [[] for _ in boundaries]
+    for index, first in enumerate(first_sets):
+        if first is None:
+            for interval in holders:
+                interval.append(index)
+            continue
+        for start, end in zip(first.starts, first.ends, strict=True):
+            for interval in range(bisect_right(boundaries, start) - 1, bisect_right(boundaries, end)):
+                holders[interval].append(index)
+    bounds = []
+    paths = []
+    for boundary, interval in zip(boundaries, holders, strict=True):
+        interval = tuple(interval)
+        if not paths or paths[-1] != interval:
+            bounds.append(boundary)
+            paths.append(interval)
+    return bounds, paths
@@ -0,0 +1,122 @@
+import random
+from time import perf_counter
+
+import pytest
+
+from ..bench import DEFAULT_GRAMMARS_DIR, load_grammars
+from ..bench.matching import generate_input
+from ..GBNF import GBNF
+from ..rules_builder.errors import InputParseError
+from .analyzer_test import get_nested_grammar
+from .char_class import MAX_CODE_POINT, CharClass
+from .lookahead import LookaheadIndex, get_intervals
+
+GRAMMAR = 'root ::= color ("," color)*\ncolor ::= "red" | "green" | "blue" | "grey" | shade\nshade ::= [0-9]* "%"'
+
+
+def get_rule_id(state, name: str) -> int:
+    return next(rule_id for rule_id, rule_name in state.graph.rule_names.items() if rule_name == name)
+
+
+def test_lookahead_is_opt_in():
+    assert GBNF(GRAMMAR, memory_cache=None).graph.lookahead is None
+    assert isinstance(GBNF(GRAMMAR, memory_cache=None, lookahead=True).graph.lookahead, LookaheadIndex)
+
+
+def test_indexes_viable_alternates():
+    state = GBNF(GRAMMAR, memory_cache=None)
+    index = LookaheadIndex(state.graph)
+    color = get_rule_id(state, "color")
+    assert index.get_alternates(color, ord("r")) == (0,)
+    assert index.get_alternates(color, ord("g")) == (1, 3)
+    assert index.get_alternates(color, ord("5")) == (4,)
+    assert index.get_alternates(color, ord("x")) == ()
+    shade = get_rule_id(state, "shade")
+    assert index.get_alternates(shade, ord("%")) == (0,)
+
+
+def test_nullable_alternates_are_always_viable():
+    state = GBNF('root ::= a "x"\na ::= "b" | ws\nws ::= " "*', memory_cache=None)
+    index = LookaheadIndex(state.graph)
+    rule_id = get_rule_id(state, "a")
+    assert index.get_alternates(rule_id, ord("b")) == (0, 1)
+    assert index.get_alternates(rule_id, ord("x")) == (1,)
+    assert index.get_intervals(rule_id) == [
+        (0, ord("a"), (1,)),
+        (ord("b"), ord("b"), (0, 1)),
+        (ord("c"), MAX_CODE_POINT, (1,)),
+    ]
+
+
+def test_get_intervals():
+    bounds, paths = get_intervals([None, None])
+    assert (bounds, paths) == ([0], [(0, 1)])
+    bounds, paths = get_intervals([CharClass([(ord("a"), ord("f"))]), CharClass([(ord("d"), ord("z"))])])
+    assert bounds == [0, ord("a"), ord("d"), ord("g"), ord("z") + 1]
+    assert paths == [(), (0,), (0, 1), (1,), ()]
+
+
+def test_prunes_live_pointers():
+    grammar = "root ::= " + " | ".join(f'"{chr(ord("a") + i % 26)}{i}"' for i in range(260))
+    state = GBNF(grammar, memory_cache=None, lookahead=True)
+    index = state.graph.lookahead
+    matched = index.get_entries(state.pointers, ord("c"))
+    assert len(state.pointers) == 260
+    assert len(matched) == 10
+    assert len(index.step(matched, ord("5"))) == 1
+    assert state.add("c5").signature == GBNF(grammar, "c5", memory_cache=None).signature
+
+
+def test_matches_like_simulation():
+    simulated = GBNF(GRAMMAR, memory_cache=None)
+    state = GBNF(GRAMMAR, memory_cache=None, lookahead=True)
+    for src in ["red,grey", "gre", "12%,%,blue", "r", ""]:
+        assert state.add(src).signature == simulated.add(src).signature
+        assert GBNF(GRAMMAR, src, memory_cache=None, lookahead=True).signature == simulated.add(src).signature
+
+
+@pytest.mark.parametrize(("src", "pos"), [("x", 0), ("rex", 2), ("red,gx", 5), ("12,", 2), ("red%", 3)])
+def test_rejects_input_like_simulation(src, pos):
+    with pytest.raises(InputParseError) as error:
+        GBNF(GRAMMAR, src, memory_cache=None, lookahead=True)
+    assert error.value.pos == pos
+    initial = GBNF(GRAMMAR, memory_cache=None, lookahead=True)
+    with pytest.raises(InputParseError) as error:
+        initial.add(src)
+    assert error.value.pos == pos
+
+
+def test_matches_corpus_like_simulation():
+    grammars = load_grammars(DEFAULT_GRAMMARS_DIR)
+    if not grammars:
+        pytest.skip("The grammar corpus is only present in a source checkout")
+    generator = random.Random(0)
+    for name, grammar in grammars.items():
+        simulated = GBNF(grammar, memory_cache=None)
+        state = GBNF(grammar, memory_cache=None, lookahead=True)
+        text = generate_input(grammar, 200, seed=1)
+        for _ in range(5):
+            start = generator.randint(0, len(text))
+            end = generator.randint(start, len(text))
+            prefix = simulated.add(text[:start])
+            assert state.add(text[:start]).signature == prefix.signature, name
+            expected = prefix.add(text[start:end]).signature
+            assert state.add(text[:start]).add(text[start:end]).signature == expected, name
+
+
+def test_rejects_other_modes():
+    with pytest.raises(ValueError, match="only available with the graph engine"):
+        GBNF(GRAMMAR, memory_cache=None, lookahead=True, engine="earley")
+    with pytest.raises(ValueError, match="cannot be combined"):
+        GBNF(GRAMMAR, memory_cache=None, lookahead=True, dfa=True)
+
+
+def test_deep_grammars_are_indexed_in_linear_time():
+    grammar = get_nested_grammar(10_000)
+    start = perf_counter()
+    plain = GBNF(grammar, memory_cache=None)
+    plain_time = perf_counter() - start
+    start = perf_counter()
+    state = GBNF(grammar, memory_cache=None, lookahead=True)
+    assert perf_counter() - start < plain_time * 5 + 1
+    assert state.add("([(").signature == plain.add("([(").signature
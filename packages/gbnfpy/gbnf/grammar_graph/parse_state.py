@@ -0,0 +1,80 @@
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from ..rules_builder.errors import ValidInput
+    from ..vocabulary import TokenMask, Vocabulary
+    from .earley import Column, EarleyParser
+    from .graph import Graph
+
+
+# Where parsing has got to: the set of pointers into the grammar's graph that
+# the input so far leaves alive. States are immutable and persistent: adding
+# input returns a new state and leaves this one usable, so a state can be
+# forked any number of times. Forks share the graph's interned pointer sets
+# and parent stacks, so a fork costs one small object and never a copy. With
+# the Earley engine, `graph` is an EarleyParser and `pointers` a chart column.
+class ParseState:
+    __slots__ = ("graph", "pointers")
+
+    def __init__(self, graph: "Graph | EarleyParser", pointers: "frozenset[int] | Column"):
+        object.__setattr__(self, "graph", graph)
+        object.__setattr__(self, "pointers", graph.intern(pointers))
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f"ParseState is immutable, cannot set {name!r}")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"ParseState is immutable, cannot delete {name!r}")
+
+    def __iter__(self) -> "Iterator":
+        return self.rules()
+
+    # The distinct rules the next code point can match: CharClasses, plus END
+    # if the input so far is complete
+    def rules(self) -> "Iterator":
+        seen = set()
+        get_rule = self.graph.get_rule
+        for pointer in self.pointers:
+            rule = get_rule(pointer)
+            if rule not in seen:
+                seen.add(rule)
+                yield rule
+
+    def add(self, src: "ValidInput") -> "ParseState":
+        pointers = self.graph.add(src, self.pointers)
+        return self if pointers is self.pointers else ParseState(self.graph, pointers)
+
+    # The tokens of `vocab` whose text this state accepts. Tokens without text,
+    # such as an end-of-sequence token, are never included; allow those when
+    # END is among the state's rules.
+    def allowed_tokens(self, vocab: "Vocabulary") -> "TokenMask":
+        from ..vocabulary import get_allowed_tokens
+
+        return get_allowed_tokens(self, vocab)
+
+    # A hashable value shared by every state with the same pointers, in this
+    # graph or any other compiled from the same rules
+    @property
+    def signature(self) -> tuple[bytes, frozenset]:
+        return self.graph.get_signature(self.pointers)
+
+    @property
+    def size(self) -> int:
+        return sum(1 for _ in self.rules())
+
+    @property
+    def grammar(self) -> str:
+        return self.graph.grammar
+
+    # States are equal when they accept the same continuations
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ParseState):
+            return NotImplemented
+        return self.graph is other.graph and self.pointers == other.pointers
+
+    def __hash__(self) -> int:
+        return hash(self.pointers)
+
+    def __repr__(self) -> str:
+        return f"ParseState({list(self.rules())!r})"
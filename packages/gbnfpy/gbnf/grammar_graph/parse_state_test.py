@@ -0,0 +1,57 @@
+import pytest
+
+from ..GBNF import GBNF
+from .char_class import CharClass
+from .types import END
+
+GRAMMAR = 'root ::= "ab" | "ac" | [a-c] "d"'
+
+
+def test_add_returns_a_new_state():
+    initial = GBNF(GRAMMAR, memory_cache=None)
+    state = initial.add("a")
+    assert state is not initial
+    assert set(initial) == {CharClass([ord("a")]), CharClass([(ord("a"), ord("c"))])}
+    assert set(state) == {CharClass([ord("b")]), CharClass([ord("c")]), CharClass([ord("d")])}
+    assert set(state.add("d")) == {END}
+
+
+def test_rules_are_distinct():
+    state = GBNF('root ::= "x" "a" | "x" "a" "b" | "y"', "x", memory_cache=None)
+    assert len(state.pointers) == 2
+    assert list(state.rules()) == [CharClass([ord("a")])]
+    assert state.size == 1
+
+
+def test_grammar():
+    assert GBNF(GRAMMAR, memory_cache=None).grammar == GRAMMAR
+
+
+def test_states_are_immutable():
+    state = GBNF(GRAMMAR, memory_cache=None)
+    with pytest.raises(AttributeError, match="immutable"):
+        state.pointers = frozenset()
+    with pytest.raises(AttributeError, match="immutable"):
+        del state.graph
+
+
+def test_forks_share_pointer_sets():
+    initial = GBNF('root ::= "a"+ "b"', memory_cache=None)
+    first = initial.add("a")
+    second = initial.add("a")
+    assert first is not second
+    assert first.pointers is second.pointers
+    assert first == second
+    assert hash(first) == hash(second)
+    assert first.add("aa").pointers is first.pointers
+    assert initial.add("") is initial
+    assert initial.add("a") != initial.add("ab")
+
+
+def test_forks_do_not_affect_each_other():
+    initial = GBNF('root ::= "x" ("a" | "b") "c"', "x", memory_cache=None)
+    a = initial.add("a")
+    b = initial.add("b")
+    assert set(initial) == {CharClass([ord("a")]), CharClass([ord("b")])}
+    assert set(a) == set(b) == {CharClass([ord("c")])}
+    assert set(a.add("c")) == {END}
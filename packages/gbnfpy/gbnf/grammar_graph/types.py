@@ -0,0 +1,28 @@
+# A reference to another rule, followed by walking into each of its alternates
+class RuleRef:
+    __slots__ = ("value",)
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RuleRef):
+            return NotImplemented
+        return self.value == other.value
+
+    def __hash__(self) -> int:
+        return hash((RuleRef, self.value))
+
+    def __repr__(self) -> str:
+        return f"RuleRef({self.value})"
+
+
+# Marks the end of a path through a rule. There is only one, END.
+class RuleEnd:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "END"
+
+
+END = RuleEnd()
@@ -0,0 +1,3 @@
+from .build_rule_stack import build_rule_stack as build_rule_stack
+
+__all__ = ["build_rule_stack"]
@@ -0,0 +1,33 @@
+from ..grammar_graph.char_class import CharClass
+from ..grammar_graph.types import END, RuleRef
+from ..rules_builder.types import InternalRuleType
+
+
+# Splits a rule into its alternate paths. Each path is a list of compiled
+# CharClasses and RuleRefs ending in END; an empty alternate is just [END].
+def build_rule_stack(rule) -> list[list]:
+    stack = []
+    path = []
+    index = 0
+    while index < len(rule):
+        element = rule[index]
+        type_ = element["type"]
+        if type_ is InternalRuleType.CHAR or type_ is InternalRuleType.CHAR_NOT:
+            char_class, index = CharClass.from_elements(rule, index)
+            path.append(char_class)
+            continue
+        if type_ is InternalRuleType.ALT:
+            path.append(END)
+            stack.append(path)
+            path = []
+        elif type_ is InternalRuleType.END:
+            path.append(END)
+        elif type_ is InternalRuleType.RULE_REF:
+            path.append(RuleRef(element["value"]))
+        else:
+            raise ValueError(f"Unsupported rule type: {type_}")
+        index += 1
+    if not path or path[-1] is not END:
+        path.append(END)
+    stack.append(path)
+    return stack
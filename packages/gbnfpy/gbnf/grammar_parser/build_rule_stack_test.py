@@ -0,0 +1,45 @@
+import pytest
+
+from ..grammar_graph.char_class import CharClass
+from ..grammar_graph.types import END, RuleRef
+from ..rules_builder.rules_builder import RulesBuilder
+from ..rules_builder.types import InternalRuleType
+from .build_rule_stack import build_rule_stack
+
+
+def char(*values: int, type_=InternalRuleType.CHAR) -> list[dict]:
+    alternates = [{"type": InternalRuleType.CHAR_ALT, "value": value} for value in values[1:]]
+    return [{"type": type_, "value": [values[0]]}, *alternates]
+
+
+ALT = {"type": InternalRuleType.ALT}
+RANGE_TO_Z = {"type": InternalRuleType.CHAR_RNG_UPPER, "value": 122}
+REF_2 = {"type": InternalRuleType.RULE_REF, "value": 2}
+
+
+@pytest.mark.parametrize(
+    ("rule", "expected"),
+    [
+        (char(120), [[CharClass([120]), END]]),
+        ([*char(120), ALT, *char(121)], [[CharClass([120]), END], [CharClass([121]), END]]),
+        (
+            [*char(120, type_=InternalRuleType.CHAR_NOT), ALT, *char(121)],
+            [[CharClass([120], negated=True), END], [CharClass([121]), END]],
+        ),
+        (char(120, 122, 121), [[CharClass([(120, 122)]), END]]),
+        ([*char(97), RANGE_TO_Z, REF_2], [[CharClass([(97, 122)]), RuleRef(2), END]]),
+        ([*char(120), {"type": InternalRuleType.END}], [[CharClass([120]), END]]),
+        ([ALT, *char(120)], [[END], [CharClass([120]), END]]),
+    ],
+)
+def test_build_rule_stack(rule, expected):
+    assert build_rule_stack(rule) == expected
+
+
+def test_builds_every_rule_of_a_grammar():
+    builder = RulesBuilder('root ::= [a-z0-9_]+ | "x" ws\nws ::= [ \\t\\n]*\n')
+    stacks = [build_rule_stack(rule) for rule in builder.rules]
+    root = stacks[builder.symbol_ids["root"]]
+    assert len(root) == 2
+    assert root[1] == [CharClass([ord("x")]), RuleRef(builder.symbol_ids["ws"]), END]
+    assert all(path[-1] is END for paths in stacks for path in paths)
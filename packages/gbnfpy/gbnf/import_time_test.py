@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Cumulative `python -X importtime` microseconds allowed for `import gbnf`
+IMPORT_TIME_BUDGET_US = 25_000
+
+# Modules that must only be imported once the feature needing them is used
+HEAVY_MODULES = [
+    "dataclasses",
+    "gbnf.cache",
+    "gbnf.rules_builder",
+    "hashlib",
+    "importlib.metadata",
+    "mmap",
+    "numpy",
+    "re",
+    "tempfile",
+]
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parents[1])}
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def get_new_modules(code: str) -> set[str]:
+    report = "import json, sys; print(json.dumps(sorted(sys.modules)))"
+    baseline = set(json.loads(run_python("-c", report).stdout))
+    return set(json.loads(run_python("-c", f"{code}\n{report}").stdout)) - baseline
+
+
+def test_import_time_budget():
+    # Warm the bytecode cache so the measurement does not include compiling
+    run_python("-c", "import gbnf")
+    best = None
+    for _ in range(3):
+        stderr = run_python("-X", "importtime", "-c", "import gbnf").stderr
+        line = next(line for line in stderr.splitlines() if line.endswith("| gbnf"))
+        cumulative = int(line.split("|")[1])
+        best = cumulative if best is None else min(best, cumulative)
+    assert best < IMPORT_TIME_BUDGET_US
+
+
+def test_import_does_not_load_heavy_modules():
+    modules = get_new_modules("import gbnf")
+    assert "gbnf.GBNF" in modules
+    assert modules.isdisjoint(HEAVY_MODULES)
+
+
+def test_compiling_does_not_load_the_disk_cache():
+    modules = get_new_modules("import gbnf\ngbnf.GBNF('root ::= \"a\"')")
+    assert "gbnf.rules_builder.rules_builder" in modules
+    assert modules.isdisjoint(["gbnf.cache.disk_cache", "importlib.metadata", "tempfile", "mmap", "numpy"])
+
+
+def test_lazy_attributes():
+    modules = get_new_modules("import gbnf\ngbnf.CompileBudget")
+    assert "gbnf.rules_builder.compile_budget" in modules
+    assert "gbnf.rules_builder.rules_builder" not in modules
+    import gbnf
+
+    for name in gbnf.__all__:
+        assert getattr(gbnf, name) is not None
+    assert set(gbnf.__all__) <= set(dir(gbnf))
+    with pytest.raises(AttributeError, match="missing"):
+        gbnf.missing  # noqa: B018
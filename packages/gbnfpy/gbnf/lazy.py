@@ -0,0 +1,20 @@
+from importlib import import_module
+
+
+# Returns a module __getattr__ and __dir__ for a package whose public names,
+# mapped to the submodules defining them, are imported on first access. Each
+# value is stored in `namespace`, the package's globals, once it is imported.
+def lazy_attributes(namespace: dict, attributes: dict[str, str]):
+    package = namespace["__name__"]
+
+    def __getattr__(name):
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = namespace[name] = getattr(import_module(module, package), name)
+        return value
+
+    def __dir__():
+        return sorted({*namespace, *attributes})
+
+    return __getattr__, __dir__
@@ -0,0 +1,15 @@
+import pytest
+
+from .lazy import lazy_attributes
+from .rules_builder.compile_budget import CompileBudget
+
+
+def test_imports_attributes_on_first_access():
+    namespace = {"__name__": "gbnf.rules_builder"}
+    get_attribute, list_attributes = lazy_attributes(namespace, {"CompileBudget": ".compile_budget"})
+    assert list_attributes() == ["CompileBudget", "__name__"]
+    assert get_attribute("CompileBudget") is CompileBudget
+    # Later lookups find the value without going through the loader
+    assert namespace["CompileBudget"] is CompileBudget
+    with pytest.raises(AttributeError, match="'gbnf.rules_builder' has no attribute 'missing'"):
+        get_attribute("missing")
@@ -1,3 +1,37 @@
-from .rules_builder import RulesBuilder
+from ..lazy import lazy_attributes
 
-__all__ = ["RulesBuilder"]
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .compact_rules import CompactRules as CompactRules
+    from .compile_budget import CancellationToken as CancellationToken
+    from .compile_budget import CompileBudget as CompileBudget
+    from .errors import GrammarParseError as GrammarParseError
+    from .errors import InputParseError as InputParseError
+    from .llama_grammar import export_llama_grammar as export_llama_grammar
+    from .llama_grammar import load_llama_grammar as load_llama_grammar
+    from .optimizer import Optimizations as Optimizations
+    from .optimizer import optimize_rules as optimize_rules
+    from .profiling import CompileStats as CompileStats
+    from .profiling import ProfilingRulesBuilder as ProfilingRulesBuilder
+    from .rules_builder import RulesBuilder as RulesBuilder
+
+# Compiling a grammar imports only the builder's own submodules, so the
+# optimizer, profiler and llama.cpp format wait until they are asked for
+_LAZY_ATTRIBUTES = {
+    "CancellationToken": ".compile_budget",
+    "CompactRules": ".compact_rules",
+    "CompileBudget": ".compile_budget",
+    "CompileStats": ".profiling",
+    "GrammarParseError": ".errors",
+    "InputParseError": ".errors",
+    "Optimizations": ".optimizer",
+    "ProfilingRulesBuilder": ".profiling",
+    "RulesBuilder": ".rules_builder",
+    "export_llama_grammar": ".llama_grammar",
+    "load_llama_grammar": ".llama_grammar",
+    "optimize_rules": ".optimizer",
+}
+
+__all__ = [*_LAZY_ATTRIBUTES]
+
+__getattr__, __dir__ = lazy_attributes(globals(), _LAZY_ATTRIBUTES)
@@ -0,0 +1,165 @@
+import sys
+from array import array
+from collections.abc import Iterator, Sequence
+from itertools import pairwise
+
+from .types import InternalRuleType
+
+# Element type codes, numbered to match llama.cpp's llama_gretype enum
+ELEMENT_TYPE_CODES = {
+    InternalRuleType.END: 0,
+    InternalRuleType.ALT: 1,
+    InternalRuleType.RULE_REF: 2,
+    InternalRuleType.CHAR: 3,
+    InternalRuleType.CHAR_NOT: 4,
+    InternalRuleType.CHAR_RNG_UPPER: 5,
+    InternalRuleType.CHAR_ALT: 6,
+}
+ELEMENT_TYPES = {code: type_ for type_, code in ELEMENT_TYPE_CODES.items()}
+
+_CHAR_CODES = (ELEMENT_TYPE_CODES[InternalRuleType.CHAR], ELEMENT_TYPE_CODES[InternalRuleType.CHAR_NOT])
+_VALUELESS_CODES = (ELEMENT_TYPE_CODES[InternalRuleType.END], ELEMENT_TYPE_CODES[InternalRuleType.ALT])
+
+
+def to_little_endian(values: array | memoryview) -> bytes:
+    if sys.byteorder == "big":
+        values = array("I", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(buffer) -> array:
+    values = array("I")
+    values.frombytes(buffer)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_element(elem) -> tuple[int, int]:
+    type_ = elem["type"]
+    value = elem.get("value", 0)
+    if isinstance(value, list):
+        value = value[0]
+    return ELEMENT_TYPE_CODES[type_], value
+
+
+def decode_element(type_code: int, value: int):
+    if type_code in _VALUELESS_CODES:
+        return {"type": ELEMENT_TYPES[type_code]}
+    if type_code in _CHAR_CODES:
+        return {"type": ELEMENT_TYPES[type_code], "value": [value]}
+    return {"type": ELEMENT_TYPES[type_code], "value": value}
+
+
+class CompactRule(Sequence):
+    __slots__ = ("_data", "_start", "_stop")
+
+    def __init__(self, data: array, start: int, stop: int):
+        self._data = data
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("rule element index out of range")
+        offset = (self._start + index) * 2
+        return decode_element(self._data[offset], self._data[offset + 1])
+
+    def __iter__(self):
+        data = self._data
+        for offset in range(self._start * 2, self._stop * 2, 2):
+            yield decode_element(data[offset], data[offset + 1])
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    # Yields raw (type code, value) pairs without materializing element dicts
+    def elements(self) -> Iterator[tuple[int, int]]:
+        data = self._data
+        for offset in range(self._start * 2, self._stop * 2, 2):
+            yield data[offset], data[offset + 1]
+
+
+# Rules flattened into a single array of (type code, value) uint32 pairs, with an
+# offset table marking where each rule starts. Indexing returns read-only views
+# that decode elements into the same dicts RulesBuilder produces.
+# build_rules(grammar, compact=True) returns the rules in this form.
+class CompactRules(Sequence):
+    __slots__ = ("_data", "_offsets")
+
+    def __init__(self, data: array, offsets: array):
+        self._data = data
+        self._offsets = offsets
+
+    # The underlying arrays are only handed out as read-only views, so a
+    # CompactRules can be shared between callers without defensive copies
+    @property
+    def data(self) -> memoryview:
+        return memoryview(self._data).toreadonly()
+
+    @property
+    def offsets(self) -> memoryview:
+        return memoryview(self._offsets).toreadonly()
+
+    @classmethod
+    def from_rules(cls, rules) -> "CompactRules":
+        data = array("I")
+        offsets = array("I", [0])
+        for rule in rules:
+            for elem in rule:
+                data.extend(encode_element(elem))
+            offsets.append(len(data) // 2)
+        return cls(data, offsets)
+
+    def to_rules(self) -> list[list[dict]]:
+        data = self._data
+        offsets = self._offsets
+        return [
+            [decode_element(data[i], data[i + 1]) for i in range(start * 2, end * 2, 2)]
+            for start, end in pairwise(offsets)
+        ]
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("rule index out of range")
+        return CompactRule(self._data, self._offsets[index], self._offsets[index + 1])
+
+    def __eq__(self, other):
+        if isinstance(other, CompactRules):
+            return self._data == other._data and self._offsets == other._offsets
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other, strict=True))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CompactRules(rules={len(self)}, elements={len(self._data) // 2})"
+
+    def __getstate__(self):
+        return self._data, self._offsets
+
+    def __setstate__(self, state):
+        self._data, self._offsets = state
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self._data) + len(self._offsets)) * self._data.itemsize
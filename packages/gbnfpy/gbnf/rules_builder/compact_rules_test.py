@@ -0,0 +1,82 @@
+import pickle
+import sys
+
+import pytest
+
+from .compact_rules import CompactRules, decode_element, encode_element
+from .rules_builder import RulesBuilder
+from .rules_builder_test import test_cases
+from .types import InternalRuleType
+
+
+@pytest.mark.parametrize(("key", "grammar", "expected"), test_cases)
+def test_compact_rules_match_rules_builder_output(key, grammar, expected):
+    rules = RulesBuilder(grammar.replace("\\n", "\n")).rules
+    compact = CompactRules.from_rules(rules)
+    assert len(compact) == len(rules)
+    assert compact == rules
+    assert compact.to_rules() == rules
+    for rule, compact_rule in zip(rules, compact, strict=True):
+        assert len(compact_rule) == len(rule)
+        for i, elem in enumerate(rule):
+            assert compact_rule[i] == elem
+
+
+@pytest.mark.parametrize(
+    "elem",
+    [
+        {"type": InternalRuleType.CHAR, "value": [ord("a")]},
+        {"type": InternalRuleType.CHAR_NOT, "value": [0x1F4A9]},
+        {"type": InternalRuleType.CHAR_ALT, "value": ord("b")},
+        {"type": InternalRuleType.CHAR_RNG_UPPER, "value": ord("z")},
+        {"type": InternalRuleType.RULE_REF, "value": 12},
+        {"type": InternalRuleType.ALT},
+        {"type": InternalRuleType.END},
+    ],
+)
+def test_element_round_trip(elem):
+    assert decode_element(*encode_element(elem)) == elem
+
+
+def test_compact_rules_keep_empty_rules():
+    rules = [[{"type": InternalRuleType.END}], [], [{"type": InternalRuleType.END}]]
+    compact = CompactRules.from_rules(rules)
+    assert len(compact) == 3
+    assert list(compact[1]) == []
+    assert compact == rules
+
+
+def test_compact_rule_indexing():
+    compact = CompactRules.from_rules(RulesBuilder('root ::= "ab"').rules)
+    rule = compact[-1]
+    assert rule[-1] == {"type": InternalRuleType.END}
+    assert rule[0:2] == [
+        {"type": InternalRuleType.CHAR, "value": [ord("a")]},
+        {"type": InternalRuleType.CHAR, "value": [ord("b")]},
+    ]
+    assert list(rule.elements()) == [(3, ord("a")), (3, ord("b")), (0, 0)]
+    with pytest.raises(IndexError):
+        rule[3]
+    with pytest.raises(IndexError):
+        compact[1]
+
+
+def test_compact_rules_pickle():
+    compact = CompactRules.from_rules(RulesBuilder('root ::= [a-z]+ ("x" | "y")*').rules)
+    assert pickle.loads(pickle.dumps(compact)) == compact
+
+
+def test_compact_rules_are_smaller_than_rules():
+    names = [f"rule-{chr(97 + i // 26)}{chr(97 + i % 26)}" for i in range(500)]
+    grammar = "\n".join(["root ::= " + " | ".join(names), *(f'{name} ::= "some literal" [a-z]+' for name in names)])
+    rules = RulesBuilder(grammar).rules
+
+    def deep_size(rules):
+        size = sys.getsizeof(rules)
+        for rule in rules:
+            size += sys.getsizeof(rule)
+            for elem in rule:
+                size += sys.getsizeof(elem) + sum(sys.getsizeof(v) for v in elem.values() if isinstance(v, list))
+        return size
+
+    assert CompactRules.from_rules(rules).nbytes * 10 < deep_size(rules)
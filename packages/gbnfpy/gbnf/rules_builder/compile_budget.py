@@ -0,0 +1,53 @@
+import threading
+from dataclasses import dataclass
+from time import perf_counter
+
+DEFAULT_TIMEOUT = 1000
+DEFAULT_CHECK_INTERVAL = 1024
+
+
+# A flag that can be set from any thread, or from an asyncio task while the
+# compile runs in an executor, to stop a compile at its next budget check
+class CancellationToken:
+    __slots__ = ("_event",)
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+# Limits on the work a single compile may do. A step is one grammar token, plus
+# one per character of a literal or char class. The clock and the cancellation
+# token are only consulted every `check_interval` steps, keeping the per-token
+# cost to an integer comparison. Budgets hold no counters and can be shared
+# between compiles.
+@dataclass(frozen=True)
+class CompileBudget:
+    max_steps: int | None = None
+    # Seconds of wall-clock time
+    timeout: float | None = DEFAULT_TIMEOUT
+    check_interval: int = DEFAULT_CHECK_INTERVAL
+    # Rules include the ones generated for groups and repetitions
+    max_rules: int | None = None
+    max_elements: int | None = None
+    cancellation_token: CancellationToken | None = None
+
+    def __post_init__(self):
+        if self.check_interval < 1:
+            raise ValueError("check_interval must be at least 1")
+
+    def get_deadline(self) -> float | None:
+        return None if self.timeout is None else perf_counter() + self.timeout
+
+    # The step count at which the next check is due
+    def get_next_check(self, steps: int) -> int:
+        next_check = steps + self.check_interval
+        if self.max_steps is not None:
+            next_check = min(next_check, self.max_steps + 1)
+        return next_check
@@ -0,0 +1,141 @@
+import io
+import threading
+from time import perf_counter
+
+import pytest
+
+from ..GBNF import build_rules
+from .compile_budget import CancellationToken, CompileBudget
+from .errors import CompileBudgetExceededError, CompileCancelledError, GrammarParseError
+from .rules_builder import RulesBuilder
+
+GRAMMAR = 'root ::= (item ",")*\nitem ::= "abc" | [a-z] | "(" item ")"\n'
+
+
+def test_default_budget_compiles_normally():
+    assert RulesBuilder(GRAMMAR, budget=CompileBudget()).rules == RulesBuilder(GRAMMAR).rules
+
+
+def test_limit_is_the_default_timeout():
+    assert RulesBuilder(GRAMMAR, 5).budget == CompileBudget(timeout=5)
+
+
+@pytest.mark.parametrize("check_interval", [1, 7, 1024])
+def test_step_budget(check_interval):
+    # A step per token, including those ending a sequence, plus one per literal
+    # character and char class item
+    RulesBuilder(GRAMMAR, budget=CompileBudget(max_steps=21, check_interval=check_interval))
+    with pytest.raises(CompileBudgetExceededError, match="Step budget of 20 exceeded"):
+        RulesBuilder(GRAMMAR, budget=CompileBudget(max_steps=20, check_interval=check_interval))
+
+
+def test_huge_literals_are_charged_before_they_are_built():
+    with pytest.raises(CompileBudgetExceededError) as error:
+        RulesBuilder(f'root ::= "{"x" * 10000}"', budget=CompileBudget(max_steps=100))
+    assert error.value.pos == len("root ::= ")
+
+
+def test_deadline_is_checked_every_interval(monkeypatch):
+    from . import compile_budget, rules_builder
+
+    monkeypatch.setattr(compile_budget, "perf_counter", lambda: 0)
+    calls = []
+
+    def perf_counter():
+        calls.append(None)
+        return 10
+
+    monkeypatch.setattr(rules_builder, "perf_counter", perf_counter)
+    with pytest.raises(CompileBudgetExceededError, match="Duration of 5 exceeded"):
+        RulesBuilder('root ::= "a" "b" "c" "d"', budget=CompileBudget(timeout=5, check_interval=4))
+    assert len(calls) == 1
+    RulesBuilder('root ::= "a"', budget=CompileBudget(timeout=5, check_interval=4))
+    assert len(calls) == 1
+
+
+def test_rule_and_element_limits():
+    # root, item and the repetition and group generated for root
+    RulesBuilder(GRAMMAR, budget=CompileBudget(max_rules=4))
+    with pytest.raises(CompileBudgetExceededError, match="Rule limit of 3 exceeded"):
+        RulesBuilder(GRAMMAR, budget=CompileBudget(max_rules=3))
+    num_elements = sum(len(rule) for rule in RulesBuilder(GRAMMAR).rules)
+    RulesBuilder(GRAMMAR, budget=CompileBudget(max_elements=num_elements))
+    with pytest.raises(CompileBudgetExceededError, match=f"Element limit of {num_elements - 1} exceeded"):
+        RulesBuilder(GRAMMAR, budget=CompileBudget(max_elements=num_elements - 1))
+
+
+def test_element_count_follows_incremental_recompiles():
+    budget = CompileBudget(max_elements=100)
+    builder = RulesBuilder(GRAMMAR, budget=budget)
+    for _ in range(20):
+        builder = builder.recompile(builder.src.replace('"abc"', '"abd"')).recompile(GRAMMAR)
+    assert builder.num_elements == sum(len(rule) for rule in builder.rules)
+    with pytest.raises(CompileBudgetExceededError):
+        builder.recompile(GRAMMAR.replace('"abc"', f'"{"x" * 100}"'))
+
+
+def test_cancellation_from_another_thread():
+    token = CancellationToken()
+    grammar = 'a ::= "x"\n' * 2000
+    chunks = iter([grammar[:5000], grammar[5000:]])
+
+    def read(_size):
+        chunk = next(chunks, "")
+        if chunk == grammar[5000:]:
+            # Cancel while the first half has been compiled and the rest has not
+            thread = threading.Thread(target=token.cancel)
+            thread.start()
+            thread.join()
+        return chunk
+
+    stream = io.StringIO()
+    stream.read = read
+    builder = RulesBuilder(budget=CompileBudget(cancellation_token=token, check_interval=16))
+    parsed = builder.parse_stream(stream)
+    next(parsed)
+    assert not token.cancelled
+    with pytest.raises(CompileCancelledError):
+        list(parsed)
+
+
+def test_cancelled_before_starting():
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(CompileCancelledError, match="Compilation was cancelled"):
+        RulesBuilder(GRAMMAR, budget=CompileBudget(cancellation_token=token, check_interval=1))
+
+
+def test_budget_errors_are_grammar_parse_errors():
+    with pytest.raises(GrammarParseError):
+        build_rules(GRAMMAR, budget=CompileBudget(max_steps=1), memory_cache=None)
+    rules, _ = build_rules(GRAMMAR, budget=CompileBudget(max_steps=1000), memory_cache=None)
+    assert rules == RulesBuilder(GRAMMAR).rules
+
+
+def test_check_interval_must_be_positive():
+    with pytest.raises(ValueError, match="check_interval must be at least 1"):
+        CompileBudget(check_interval=0)
+
+
+def get_cancelled_token():
+    token = CancellationToken()
+    token.cancel()
+    return token
+
+
+@pytest.mark.parametrize(
+    ("get_budget", "error_type", "message"),
+    [
+        (lambda: CompileBudget(max_steps=100), CompileBudgetExceededError, "Step budget of 100 exceeded"),
+        (lambda: CompileBudget(timeout=0), CompileBudgetExceededError, "Duration of 0 exceeded"),
+        (lambda: CompileBudget(cancellation_token=get_cancelled_token()), CompileCancelledError, "was cancelled"),
+    ],
+)
+def test_huge_grammars_are_rejected_while_tokenizing(get_budget, error_type, message):
+    grammar = 'a ::= "x"\n' * 400_000
+    start = perf_counter()
+    with pytest.raises(error_type, match=message) as error:
+        RulesBuilder(grammar, budget=get_budget())
+    # Stopped at the first check, a check interval of tokens in
+    assert error.value.pos < 5_000
+    assert perf_counter() - start < 0.5
@@ -0,0 +1,46 @@
+# Returns the strongly connected components of a graph given as a list of
+# successor lists, each component after every component it can reach. Uses an
+# iterative Tarjan's algorithm so deep graphs do not hit the recursion limit.
+def get_components(edges: list) -> list[list[int]]:
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for start in range(len(edges)):
+        if start in index:
+            continue
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(edges[start]))]
+        while work:
+            vertex, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges[child])))
+                    break
+                if child in on_stack:
+                    lowlink[vertex] = min(lowlink[vertex], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[vertex])
+                if lowlink[vertex] == index[vertex]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == vertex:
+                            break
+                    components.append(sorted(component))
+    return components
+
+
+def is_cycle(component: list[int], edges: list) -> bool:
+    return len(component) > 1 or component[0] in edges[component[0]]
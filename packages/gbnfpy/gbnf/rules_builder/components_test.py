@@ -0,0 +1,18 @@
+from .components import get_components, is_cycle
+
+
+def test_components_come_after_the_components_they_reach():
+    edges = [[1], [2, 3], [1], [], [0]]
+    assert get_components(edges) == [[3], [1, 2], [0], [4]]
+
+
+def test_finds_cycles():
+    edges = [[1], [0], [2], []]
+    components = get_components(edges)
+    assert [component for component in components if is_cycle(component, edges)] == [[0, 1], [2]]
+
+
+def test_deep_chains_do_not_hit_the_recursion_limit():
+    depth = 100_000
+    edges = [[vertex + 1] for vertex in range(depth)] + [[0]]
+    assert get_components(edges) == [list(range(depth + 1))]
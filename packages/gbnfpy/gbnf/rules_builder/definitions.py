@@ -0,0 +1,132 @@
+from bisect import bisect_left
+
+from .errors import GrammarParseError
+from .tokenizer import Token, TokenType, tokenize
+
+# (rule name, index of its NAME token, index of the NEWLINE / EOF token ending it)
+Definition = tuple[str, int, int]
+
+
+# Splits a token stream into its top-level rule definitions without building
+# any rules. Returns None when the stream does not have the shape of a list of
+# definitions, in which case a full parse is needed to report the error.
+def split_definitions(tokens: list[Token]) -> list[Definition] | None:
+    definitions = []
+    index = 0
+    while tokens[index].type is TokenType.NEWLINE:
+        index += 1
+    while tokens[index].type is not TokenType.EOF:
+        start = index
+        if tokens[index].type is not TokenType.NAME:
+            return None
+        index += 1
+        while tokens[index].type is TokenType.NEWLINE:
+            index += 1
+        if tokens[index].type is not TokenType.DEFINE:
+            return None
+        previous = TokenType.DEFINE
+        index += 1
+        depth = 0
+        while True:
+            token_type = tokens[index].type
+            if token_type is TokenType.EOF:
+                break
+            if token_type is TokenType.NEWLINE:
+                # Newlines after ::= or | and inside groups do not end the rule
+                if depth == 0 and previous is not TokenType.DEFINE and previous is not TokenType.ALT:
+                    break
+            elif token_type is TokenType.LPAREN:
+                depth += 1
+            elif token_type is TokenType.RPAREN:
+                depth -= 1
+                if depth < 0:
+                    return None
+            previous = token_type
+            index += 1
+        definitions.append((tokens[start].value, start, index))
+        while tokens[index].type is TokenType.NEWLINE:
+            index += 1
+    return definitions
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    # Binary search over slice comparisons, which run at memcmp speed
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix_length(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid :] == b[len(b) - mid :]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+# Compares an edited source against the definition spans of a previous build
+# and returns the definition spans of the edited source together with the tokens
+# of every definition that is new or whose text changed. Only the region around
+# the edit is tokenized. Returns None when the edit cannot be isolated to whole
+# definitions, in which case the source needs a full parse.
+def diff_definitions(
+    old_src: str,
+    old_definitions: dict[str, tuple[int, int]],
+    src: str,
+) -> tuple[dict[str, tuple[int, int]], dict[str, list[Token]]] | None:
+    prefix = common_prefix_length(old_src, src)
+    suffix = common_suffix_length(old_src, src, min(len(old_src), len(src)) - prefix)
+    delta = len(src) - len(old_src)
+    names = list(old_definitions)
+    starts = [start for start, _ in old_definitions.values()]
+
+    # Retokenize from the last definition starting before the edit up to the first
+    # definition starting after it, both of which begin in unchanged text
+    first = bisect_left(starts, prefix) - 1
+    region_start = starts[first] if first >= 0 else 0
+    last = bisect_left(starts, len(old_src) - suffix)
+    region_end = starts[last] + delta if last < len(starts) else len(src)
+    if region_end != len(src):
+        # The following definition must still begin its own line, rather than
+        # having been swallowed by an edited comment or literal
+        line_start = max(src.rfind("\n", region_start, region_end), src.rfind("\r", region_start, region_end))
+        if line_start < 0 or src[line_start + 1 : region_end].strip(" \t"):
+            return None
+    try:
+        tokens = tokenize(src, region_start, region_end)
+    except GrammarParseError:
+        return None
+    split = split_definitions(tokens)
+    if split is None:
+        return None
+    # A definition ending at the region boundary rather than at a newline would
+    # run on into the following definition
+    if split and region_end != len(src) and tokens[split[-1][2]].type is not TokenType.NEWLINE:
+        return None
+
+    definitions = {}
+    for name in names[: max(first, 0)]:
+        definitions[name] = old_definitions[name]
+    changed = {}
+    for name, start, end in split:
+        if name in definitions:
+            return None
+        span = (tokens[start].pos, tokens[end].pos)
+        definitions[name] = span
+        previous = old_definitions.get(name)
+        if previous is None or old_src[previous[0] : previous[1]] != src[span[0] : span[1]]:
+            changed[name] = [*tokens[start:end], Token(TokenType.EOF, None, span[1])]
+    for name in names[last:]:
+        if name in definitions:
+            return None
+        start, end = old_definitions[name]
+        definitions[name] = (start + delta, end + delta)
+    return definitions, changed
@@ -0,0 +1,72 @@
+import pytest
+
+from .definitions import common_prefix_length, common_suffix_length, diff_definitions, split_definitions
+from .rules_builder import RulesBuilder
+from .tokenizer import tokenize
+
+
+def split_names(src):
+    tokens = tokenize(src)
+    return [(name, src[tokens[start].pos : tokens[end].pos]) for name, start, end in split_definitions(tokens)]
+
+
+def test_split_definitions():
+    assert split_names('a ::= "x"\nb ::= c\n\nc ::= "y"') == [("a", 'a ::= "x"'), ("b", "b ::= c"), ("c", 'c ::= "y"')]
+
+
+def test_split_definitions_spanning_lines():
+    src = 'a ::=\n  "x" |\n  "y"\nb\n::= (\n "z"\n)\nc ::= "c" # trailing\n'
+    assert [name for name, _ in split_names(src)] == ["a", "b", "c"]
+    assert split_names(src)[2] == ("c", 'c ::= "c" # trailing')
+
+
+@pytest.mark.parametrize("src", ['"x" ::= a', "a b", "a ::= )"])
+def test_split_definitions_rejects_malformed_sources(src):
+    assert split_definitions(tokenize(src)) is None
+
+
+@pytest.mark.parametrize(
+    ("a", "b", "prefix", "suffix"),
+    [
+        ("abcdef", "abcdef", 6, 0),
+        ("abcdef", "abXdef", 2, 3),
+        ("abc", "abcabc", 3, 0),
+        ("", "abc", 0, 0),
+    ],
+)
+def test_common_affix_lengths(a, b, prefix, suffix):
+    assert common_prefix_length(a, b) == prefix
+    assert common_suffix_length(a, b, min(len(a), len(b)) - prefix) == suffix
+
+
+GRAMMAR = 'root ::= a b\na ::= "a"\nb ::= "b"\n'
+
+
+def test_diff_definitions_reports_changed_rules():
+    builder = RulesBuilder(GRAMMAR)
+    edited = GRAMMAR.replace('"a"', '"aa"')
+    definitions, changed = diff_definitions(builder.src, builder.definitions, edited)
+    assert list(changed) == ["a"]
+    assert {name: edited[start:end] for name, (start, end) in definitions.items()} == {
+        "root": "root ::= a b",
+        "a": 'a ::= "aa"',
+        "b": 'b ::= "b"',
+    }
+
+
+def test_diff_definitions_reports_new_and_removed_rules():
+    builder = RulesBuilder(GRAMMAR)
+    definitions, changed = diff_definitions(builder.src, builder.definitions, GRAMMAR.replace('a ::= "a"', 'c ::= "c"'))
+    assert list(changed) == ["c"]
+    assert list(definitions) == ["root", "c", "b"]
+
+
+def test_diff_definitions_without_changes():
+    builder = RulesBuilder(GRAMMAR)
+    assert diff_definitions(builder.src, builder.definitions, GRAMMAR)[1] == {}
+
+
+def test_diff_definitions_gives_up_when_an_edit_swallows_the_next_rule():
+    builder = RulesBuilder(GRAMMAR)
+    assert diff_definitions(builder.src, builder.definitions, GRAMMAR.replace('"a"\n', '"a" # ')) is None
+    assert diff_definitions(builder.src, builder.definitions, GRAMMAR.replace('"a"\n', '"a" |\n')) is None
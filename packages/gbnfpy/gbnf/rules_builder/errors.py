@@ -22,6 +22,40 @@ class GrammarParseError(Exception):
         self.reason = reason
         self.name = "GrammarParseError"
 
+    # Rebuilt from the constructor arguments so errors survive pickling, e.g.
+    # when raised in a worker process
+    def __reduce__(self):
+        return type(self), (self.grammar, self.pos, self.reason)
+
+
+# Raised once per build with every rule that is referenced but never defined,
+# mapped to the positions of the references to it
+class UndefinedRuleError(GrammarParseError):
+    def __init__(self, grammar: str, pos: int, undefined: dict[str, list[int]]):
+        references = [f"'{name}' at {', '.join(map(str, positions))}" for name, positions in undefined.items()]
+        if len(references) == 1:
+            reason = f"Undefined rule identifier {references[0]}"
+        else:
+            reason = f"Undefined rule identifiers {'; '.join(references)}"
+        super().__init__(grammar, pos, reason)
+        self.undefined = undefined
+        self.name = "UndefinedRuleError"
+
+    def __reduce__(self):
+        return type(self), (self.grammar, self.pos, self.undefined)
+
+
+class CompileBudgetExceededError(GrammarParseError):
+    def __init__(self, grammar: str, pos: int, reason: str):
+        super().__init__(grammar, pos, reason)
+        self.name = "CompileBudgetExceededError"
+
+
+class CompileCancelledError(GrammarParseError):
+    def __init__(self, grammar: str, pos: int, reason: str):
+        super().__init__(grammar, pos, reason)
+        self.name = "CompileCancelledError"
+
 
 ValidInput = str | int | list[int]
 
@@ -39,6 +73,9 @@ class InputParseError(Exception):
         self.pos = pos
         self.name = "InputParseError"
 
+    def __reduce__(self):
+        return type(self), (self.src, self.pos)
+
 
 def build_error_position(src: str, pos: int) -> list[str]:
     if src == "":
@@ -1,6 +1,14 @@
+import pickle
+
 import pytest
 
-from .errors import GrammarParseError, InputParseError, build_error_position
+from .errors import (
+    CompileBudgetExceededError,
+    GrammarParseError,
+    InputParseError,
+    UndefinedRuleError,
+    build_error_position,
+)
 
 
 @pytest.mark.parametrize(
@@ -56,3 +64,19 @@ def test_input_parse_error_code_points():
     err = InputParseError(input_text, pos)
     expected_message = "Failed to parse input string:\nabcd\n  ^"
     assert str(err) == expected_message
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        GrammarParseError("root ::= x", 9, "reason"),
+        CompileBudgetExceededError("root ::= x", 9, "Step budget of 1 exceeded"),
+        UndefinedRuleError("root ::= x y", 9, {"x": [9], "y": [11]}),
+        InputParseError("abc", 1),
+    ],
+)
+def test_errors_survive_pickling(error):
+    copied = pickle.loads(pickle.dumps(error))
+    assert type(copied) is type(error)
+    assert str(copied) == str(error)
+    assert copied.__dict__ == error.__dict__
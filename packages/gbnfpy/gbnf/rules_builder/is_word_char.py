@@ -1,5 +1,7 @@
 import re
 
+WORD_CHAR_RE = re.compile(r"[a-zA-Z]")
+
 
 def is_word_char(c: str) -> bool:
-    return re.search(r"[a-zA-Z]", c) is not None
+    return WORD_CHAR_RE.search(c) is not None
@@ -0,0 +1,65 @@
+import struct
+from array import array
+from itertools import pairwise
+
+from .compact_rules import ELEMENT_TYPES, CompactRules, from_little_endian, to_little_endian
+from .types import InternalRuleType
+
+MAGIC = b"GBNR"
+FORMAT_VERSION = 1
+# magic, format version, rules, elements, root rule id
+HEADER = struct.Struct("<4sIIII")
+# Marks a grammar exported without a root rule
+NO_ROOT = 0xFFFFFFFF
+
+
+class LlamaGrammarFormatError(Exception):
+    pass
+
+
+# Serializes rules into llama.cpp's grammar element layout: a header, then a
+# table of num_rules + 1 element offsets, then every rule's (type, value) pairs
+# back to back, each rule terminated by its END element. All fields are
+# little-endian uint32, and element types use the LLAMA_GRETYPE_* numbering, so
+# rule i is elements[offsets[i]:offsets[i + 1]] as a llama_grammar_element
+# array. The result is a read-only memoryview that native code can take
+# through the buffer protocol without another copy. Ids left empty by rules an
+# update removed, which nothing references, are written as a lone END, so
+# every rule in the buffer is terminated.
+def export_llama_grammar(rules, root_id: int | None = None) -> memoryview:
+    if not isinstance(rules, CompactRules):
+        rules = CompactRules.from_rules(rules)
+    if any(start == end for start, end in pairwise(rules.offsets)):
+        rules = CompactRules.from_rules([list(rule) or [{"type": InternalRuleType.END}] for rule in rules])
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(rules),
+        len(rules.data) // 2,
+        NO_ROOT if root_id is None else root_id,
+    )
+    buffer = b"".join([header, to_little_endian(rules.offsets), to_little_endian(rules.data)])
+    return memoryview(buffer)
+
+
+# The inverse of export_llama_grammar; returns the rules and the root rule id
+def load_llama_grammar(buffer) -> tuple[CompactRules, int | None]:
+    buffer = memoryview(buffer).cast("B")
+    if len(buffer) < HEADER.size:
+        raise LlamaGrammarFormatError("Truncated header")
+    magic, version, num_rules, num_elements, root_id = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise LlamaGrammarFormatError(f"Unsupported grammar format {bytes(magic)!r} v{version}")
+    itemsize = array("I").itemsize
+    offsets_end = HEADER.size + (num_rules + 1) * itemsize
+    if offsets_end + num_elements * 2 * itemsize != len(buffer):
+        raise LlamaGrammarFormatError("Unexpected buffer size")
+    offsets = from_little_endian(buffer[HEADER.size : offsets_end])
+    data = from_little_endian(buffer[offsets_end:])
+    if offsets[0] != 0 or offsets[-1] != num_elements or any(a > b for a, b in pairwise(offsets)):
+        raise LlamaGrammarFormatError("Rule offsets are not ordered")
+    if data and max(data[::2]) not in ELEMENT_TYPES:
+        raise LlamaGrammarFormatError("Unknown element type")
+    if root_id != NO_ROOT and root_id >= num_rules:
+        raise LlamaGrammarFormatError(f"Root rule {root_id} is out of range")
+    return CompactRules(data, offsets), None if root_id == NO_ROOT else root_id
@@ -0,0 +1,75 @@
+import struct
+from operator import itemgetter
+
+import pytest
+
+from ..GBNF import build_rules
+from .compact_rules import CompactRules
+from .llama_grammar import HEADER, LlamaGrammarFormatError, export_llama_grammar, load_llama_grammar
+from .rules_builder import RulesBuilder
+
+GRAMMAR = 'root ::= item+\nitem ::= [a-z0-9] | "\\U0001F600" | [^"]\n'
+
+
+def test_layout_matches_llama_grammar_elements():
+    builder = RulesBuilder(GRAMMAR)
+    buffer = export_llama_grammar(builder.rules, builder.symbol_ids["root"])
+    assert isinstance(buffer, memoryview)
+    assert buffer.readonly
+    magic, version, num_rules, num_elements, root_id = HEADER.unpack_from(buffer)
+    assert (magic, version, num_rules, root_id) == (b"GBNR", 1, len(builder.rules), 0)
+    offsets = struct.unpack_from(f"<{num_rules + 1}I", buffer, HEADER.size)
+    elements = struct.unpack_from(f"<{num_elements * 2}I", buffer, HEADER.size + len(offsets) * 4)
+    item = builder.symbol_ids["item"]
+    pairs = list(zip(elements[::2], elements[1::2], strict=True))
+    # LLAMA_GRETYPE_CHAR, CHAR_RNG_UPPER, CHAR_ALT, CHAR_RNG_UPPER, ALT, CHAR, ALT, CHAR_NOT, END
+    assert pairs[offsets[item] : offsets[item + 1]] == [
+        (3, ord("a")), (5, ord("z")), (6, ord("0")), (5, ord("9")),
+        (1, 0), (3, 0x1F600),
+        (1, 0), (4, ord('"')),
+        (0, 0),
+    ]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_round_trip(compact):
+    rules, symbol_ids = build_rules(GRAMMAR, compact=compact, memory_cache=None)
+    loaded, root_id = load_llama_grammar(export_llama_grammar(rules, symbol_ids["root"]))
+    assert isinstance(loaded, CompactRules)
+    assert loaded == rules
+    assert root_id == symbol_ids["root"]
+
+
+def test_round_trip_without_a_root():
+    loaded, root_id = load_llama_grammar(bytes(export_llama_grammar(RulesBuilder("a ::= [a]").rules)))
+    assert root_id is None
+    assert loaded.to_rules() == RulesBuilder("a ::= [a]").rules
+
+
+def test_empty_rules_are_written_as_a_lone_end():
+    # Removing y leaves its id without elements
+    builder = RulesBuilder('root ::= x | y\nx ::= "a"\ny ::= "b"').update({"root": "x", "y": None})
+    y = builder.symbol_ids["y"]
+    assert builder.rules[y] == []
+    loaded, _ = load_llama_grammar(export_llama_grammar(builder.rules, builder.symbol_ids["root"]))
+    assert list(loaded[y].elements()) == [(0, 0)]
+    assert [loaded[rule_id] for rule_id in range(len(loaded)) if rule_id != y] == [
+        rule for rule_id, rule in enumerate(builder.rules) if rule_id != y
+    ]
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        itemgetter(slice(10)),
+        lambda buffer: b"XXXX" + buffer[4:],
+        itemgetter(slice(-4)),
+        lambda buffer: buffer[: HEADER.size] + struct.pack("<I", 1) + buffer[HEADER.size + 4 :],
+        lambda buffer: buffer[:-8] + struct.pack("<II", 9, 0),
+        lambda buffer: buffer[:16] + struct.pack("<I", 99) + buffer[20:],
+    ],
+)
+def test_rejects_damaged_buffers(damage):
+    buffer = bytes(export_llama_grammar(RulesBuilder(GRAMMAR).rules, 0))
+    with pytest.raises(LlamaGrammarFormatError):
+        load_llama_grammar(damage(buffer))
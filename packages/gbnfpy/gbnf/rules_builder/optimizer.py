@@ -0,0 +1,330 @@
+from dataclasses import dataclass
+
+from .components import get_components, is_cycle
+from .types import InternalRuleType
+
+# Rules up to this many elements long are inlined into the rules that use them
+DEFAULT_INLINE_MAX_ELEMENTS = 16
+# Inlining, merging and factoring each expose work for the others, so they run
+# in rounds until nothing changes, up to this many
+MAX_ROUNDS = 8
+
+CHAR = InternalRuleType.CHAR
+CHAR_ALT = InternalRuleType.CHAR_ALT
+CHAR_NOT = InternalRuleType.CHAR_NOT
+CHAR_RNG_UPPER = InternalRuleType.CHAR_RNG_UPPER
+RULE_REF = InternalRuleType.RULE_REF
+
+
+# The passes run by optimize_rules, each of which can be switched off. Every
+# pass keeps the language of the grammar the same. Dedupe is applied by the
+# RulesBuilder as it parses.
+@dataclass(frozen=True)
+class Optimizations:
+    # Share identical rules generated for groups and repetitions
+    dedupe: bool = True
+    # Drop rules that cannot be reached from the root rule
+    prune: bool = True
+    # Replace references to small non-recursive rules with their bodies
+    inline: bool = True
+    # Turn alternates that are each a single char class into one char class
+    merge_chars: bool = True
+    # Move a leading symbol shared by several alternates in front of a new
+    # rule holding what follows it in each
+    left_factor: bool = True
+    inline_max_elements: int = DEFAULT_INLINE_MAX_ELEMENTS
+
+    def __post_init__(self):
+        if self.inline_max_elements < 0:
+            raise ValueError("inline_max_elements cannot be negative")
+
+    # Identifies the output of these passes, e.g. in cache keys
+    @property
+    def key(self) -> str:
+        passes = [name for name in ("dedupe", "prune", "inline", "merge_chars", "left_factor") if getattr(self, name)]
+        return ",".join([*passes, str(self.inline_max_elements)])
+
+
+# Rules are optimized as lists of alternates, each a list of symbols. A symbol
+# is a tuple of (type, value) pairs: a rule reference on its own, or a whole
+# char class with its CHAR_ALT and CHAR_RNG_UPPER items, so symbols can be
+# compared and hashed.
+def split_rule(rule) -> list[list[tuple]]:
+    if not rule:
+        return []
+    alternates = [[]]
+    # The (type, value) pairs of the symbol being read, which char class
+    # items extend
+    items = []
+    for element in rule:
+        type_ = element["type"]
+        if type_ is CHAR_ALT or type_ is CHAR_RNG_UPPER:
+            items.append((type_, element["value"]))
+            continue
+        if items:
+            alternates[-1].append(tuple(items))
+            items = []
+        if type_ is InternalRuleType.END:
+            break
+        if type_ is InternalRuleType.ALT:
+            alternates.append([])
+            continue
+        value = element["value"]
+        items.append((type_, value[0] if isinstance(value, list) else value))
+    if items:
+        alternates[-1].append(tuple(items))
+    return alternates
+
+
+def join_rule(alternates) -> list[dict]:
+    rule = []
+    for i, sequence in enumerate(alternates):
+        if i:
+            rule.append({"type": InternalRuleType.ALT})
+        for symbol in sequence:
+            for type_, value in symbol:
+                rule.append({"type": type_, "value": [value] if type_ is CHAR or type_ is CHAR_NOT else value})
+    if alternates:
+        rule.append({"type": InternalRuleType.END})
+    return rule
+
+
+def get_reference(symbol) -> int | None:
+    type_, value = symbol[0]
+    return value if type_ is RULE_REF else None
+
+
+def get_references(alternates):
+    for sequence in alternates:
+        for symbol in sequence:
+            type_, value = symbol[0]
+            if type_ is RULE_REF:
+                yield value
+
+
+def count_elements(alternates) -> int:
+    # Symbols' elements, plus one ALT or END per alternate
+    return sum(len(symbol) for sequence in alternates for symbol in sequence) + len(alternates)
+
+
+# Returns the ids of rules that can reach themselves
+def find_recursive_rules(rules) -> set[int]:
+    references = [
+        [ref for ref in dict.fromkeys(get_references(alternates)) if ref < len(rules)] for alternates in rules
+    ]
+    return {
+        rule_id for component in get_components(references) if is_cycle(component, references) for rule_id in component
+    }
+
+
+# Rule ids ordered so that every rule comes after the rules it references,
+# other than through a cycle
+def get_dependency_order(rules) -> list[int]:
+    order = []
+    visited = set()
+    for start in range(len(rules)):
+        if start in visited:
+            continue
+        visited.add(start)
+        work = [(start, get_references(rules[start]))]
+        while work:
+            rule_id, children = work[-1]
+            for child in children:
+                if child < len(rules) and child not in visited:
+                    visited.add(child)
+                    work.append((child, get_references(rules[child])))
+                    break
+            else:
+                work.pop()
+                order.append(rule_id)
+    return order
+
+
+def inline_rules(rules, max_elements: int) -> bool:
+    recursive = find_recursive_rules(rules)
+    changed = False
+
+    def get_inlinable(rule_id):
+        if rule_id in recursive or rule_id >= len(rules):
+            return None
+        alternates = rules[rule_id]
+        if not alternates or count_elements(alternates) > max_elements:
+            return None
+        return alternates
+
+    # Referenced rules are inlined into before they are inlined themselves
+    for rule_id in get_dependency_order(rules):
+        new_alternates = []
+        for sequence in rules[rule_id]:
+            if len(sequence) == 1:
+                # An alternate that is just a reference takes all of the
+                # referenced rule's alternates
+                target = get_reference(sequence[0])
+                inlined = get_inlinable(target) if target is not None else None
+                if inlined is not None:
+                    new_alternates.extend(inlined)
+                    changed = True
+                    continue
+            new_sequence = []
+            for symbol in sequence:
+                target = get_reference(symbol)
+                inlined = get_inlinable(target) if target is not None else None
+                if inlined is not None and len(inlined) == 1:
+                    new_sequence.extend(inlined[0])
+                    changed = True
+                else:
+                    new_sequence.append(symbol)
+            new_alternates.append(new_sequence)
+        rules[rule_id] = new_alternates
+    return changed
+
+
+def is_char_set(symbol) -> bool:
+    return symbol[0][0] is CHAR
+
+
+def get_ranges(symbol):
+    ranges = []
+    for type_, value in symbol:
+        if type_ is CHAR_RNG_UPPER:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ranges
+
+
+def make_char_set(ranges) -> tuple:
+    symbol = []
+    for lower, upper in ranges:
+        symbol.append((CHAR_ALT if symbol else CHAR, lower))
+        if upper > lower:
+            symbol.append((CHAR_RNG_UPPER, upper))
+    return tuple(symbol)
+
+
+def merge_char_alternates(rules) -> bool:
+    changed = False
+    for rule_id, alternates in enumerate(rules):
+        singles = [i for i, sequence in enumerate(alternates) if len(sequence) == 1 and is_char_set(sequence[0])]
+        if len(singles) < 2:
+            continue
+        ranges = sorted(tuple(item) for i in singles for item in get_ranges(alternates[i][0]))
+        if any(lower > upper for lower, upper in ranges):
+            continue
+        merged = []
+        for lower, upper in ranges:
+            if merged and lower <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], upper)
+            else:
+                merged.append([lower, upper])
+        singles = set(singles)
+        first = min(singles)
+        rules[rule_id] = [
+            [make_char_set(merged)] if i == first else sequence
+            for i, sequence in enumerate(alternates)
+            if i == first or i not in singles
+        ]
+        changed = True
+    return changed
+
+
+def get_base_name(name: str) -> str:
+    # Generated rules are named after their rule plus "_<id>", and rule names
+    # cannot contain digits
+    stripped = name.rstrip("0123456789")
+    return stripped[:-1] if stripped != name else name
+
+
+def left_factor_rules(rules, names) -> bool:
+    changed = False
+    pending = list(range(len(rules)))
+    while pending:
+        rule_id = pending.pop()
+        alternates = list(map(list, dict.fromkeys(map(tuple, rules[rule_id]))))
+        if len(alternates) != len(rules[rule_id]):
+            rules[rule_id] = alternates
+            changed = True
+        groups = {}
+        for i, sequence in enumerate(alternates):
+            if sequence:
+                groups.setdefault(sequence[0], []).append(i)
+        if all(len(group) == 1 for group in groups.values()):
+            continue
+        new_alternates = []
+        for i, sequence in enumerate(alternates):
+            group = groups.get(sequence[0]) if sequence else None
+            if group is None or len(group) == 1:
+                new_alternates.append(sequence)
+                continue
+            if group[0] != i:
+                continue
+            members = [alternates[j] for j in group]
+            prefix_length = 1
+            while all(
+                len(member) > prefix_length and member[prefix_length] == sequence[prefix_length] for member in members
+            ):
+                prefix_length += 1
+            # Members are distinct, so at least two suffixes differ
+            suffix_id = len(rules)
+            rules.append([member[prefix_length:] for member in members])
+            names.append(f"{get_base_name(names[rule_id])}_{suffix_id}")
+            pending.append(suffix_id)
+            new_alternates.append([*sequence[:prefix_length], ((RULE_REF, suffix_id),)])
+        rules[rule_id] = new_alternates
+        changed = True
+    return changed
+
+
+# Returns the ids reachable from `root_id`
+def find_reachable_rules(rules, root_id: int) -> set[int]:
+    reachable = {root_id}
+    pending = [root_id]
+    while pending:
+        for child in get_references(rules[pending.pop()]):
+            if child not in reachable:
+                reachable.add(child)
+                pending.append(child)
+    return reachable
+
+
+def renumber_symbol(symbol, new_ids):
+    target = get_reference(symbol)
+    return symbol if target is None else ((RULE_REF, new_ids[target]),)
+
+
+# Returns optimized copies of `rules` and `symbol_ids`. The result accepts the
+# same language, but rules may be merged, added or (with pruning) removed and
+# renumbered, so ids only stay meaningful through the returned symbol_ids.
+def optimize_rules(rules, symbol_ids: dict[str, int], optimizations: Optimizations | None = None, root: str = "root"):
+    if optimizations is None:
+        optimizations = Optimizations()
+    split_rules = [split_rule(rule) for rule in rules]
+    names = [None] * len(split_rules)
+    for name, rule_id in symbol_ids.items():
+        if rule_id < len(names):
+            names[rule_id] = name
+
+    for _ in range(MAX_ROUNDS):
+        changed = False
+        if optimizations.inline:
+            changed |= inline_rules(split_rules, optimizations.inline_max_elements)
+        if optimizations.left_factor:
+            changed |= left_factor_rules(split_rules, names)
+        if optimizations.merge_chars:
+            changed |= merge_char_alternates(split_rules)
+        if not changed:
+            break
+
+    kept = range(len(split_rules))
+    if optimizations.prune:
+        root_id = symbol_ids.get(root)
+        if root_id is None:
+            raise ValueError(f"Grammar does not contain a '{root}' symbol")
+        kept = sorted(find_reachable_rules(split_rules, root_id))
+    new_ids = {rule_id: new_id for new_id, rule_id in enumerate(kept)}
+    new_rules = []
+    for rule_id in kept:
+        alternates = [[renumber_symbol(symbol, new_ids) for symbol in sequence] for sequence in split_rules[rule_id]]
+        new_rules.append(join_rule(alternates))
+    new_symbol_ids = {names[rule_id]: new_ids[rule_id] for rule_id in kept if names[rule_id] is not None}
+    return new_rules, new_symbol_ids
@@ -0,0 +1,195 @@
+import dataclasses
+
+import pytest
+
+from ..cache.memory_cache import MemoryCache
+from ..GBNF import build_rules
+from .optimizer import Optimizations, find_recursive_rules, join_rule, optimize_rules, split_rule
+from .rules_builder import RulesBuilder
+from .rules_builder_test import test_cases
+from .types import InternalRuleType
+
+PASSES = ["prune", "inline", "merge_chars", "left_factor"]
+
+GRAMMAR = """
+root ::= keyword | number | ws
+keyword ::= "true" | "trap" | "false" | "f"
+number ::= digit+ ("." digit+)?
+digit ::= "0" | "1" | [2-4] | "3"
+ws ::= " "?
+unused ::= "u"
+"""
+
+
+def get_alphabet(rules) -> list[int]:
+    # Every code point a rule mentions, and its successor to probe ranges and
+    # negated classes
+    values = set()
+    for rule in rules:
+        for element in rule:
+            value = element.get("value")
+            if element["type"] is not InternalRuleType.RULE_REF and value is not None:
+                value = value[0] if isinstance(value, list) else value
+                values.update((value, value + 1))
+    return sorted(values)
+
+
+def matches(symbol, char: int) -> bool:
+    negated = symbol[0][0] is InternalRuleType.CHAR_NOT
+    ranges = []
+    for type_, value in symbol:
+        if type_ is InternalRuleType.CHAR_RNG_UPPER:
+            ranges[-1] = (ranges[-1][0], value)
+        else:
+            ranges.append((value, value))
+    return any(lower <= char <= upper for lower, upper in ranges) != negated
+
+
+# Every string of at most `max_length` characters over `alphabet` that the rule
+# matches, found by iterating the rules' languages to a fixed point
+def get_language(rules, rule_id: int, alphabet, max_length: int) -> set[str]:
+    split_rules = [split_rule(rule) for rule in rules]
+    languages = [set() for _ in rules]
+    changed = True
+    while changed:
+        changed = False
+        for i, alternates in enumerate(split_rules):
+            language = set()
+            for sequence in alternates:
+                strings = {""}
+                for symbol in sequence:
+                    type_, value = symbol[0]
+                    if type_ is InternalRuleType.RULE_REF:
+                        options = languages[value]
+                    else:
+                        options = {chr(char) for char in alphabet if matches(symbol, char)}
+                    strings = {string + option for string in strings for option in options}
+                    strings = {string for string in strings if len(string) <= max_length}
+                language |= strings
+            if language != languages[i]:
+                languages[i] = language
+                changed = True
+    return languages[rule_id]
+
+
+def assert_same_language(grammar: str, optimizations: Optimizations, max_length: int):
+    builder = RulesBuilder(grammar, dedupe=optimizations.dedupe)
+    rules, symbol_ids = optimize_rules(builder.rules, builder.symbol_ids, optimizations)
+    alphabet = get_alphabet(builder.rules)
+    expected = get_language(builder.rules, builder.symbol_ids["root"], alphabet, max_length)
+    assert get_language(rules, symbol_ids["root"], alphabet, max_length) == expected
+    return rules, symbol_ids
+
+
+def only(name: str) -> Optimizations:
+    return Optimizations(dedupe=False, **{pass_name: pass_name == name for pass_name in PASSES})
+
+
+@pytest.mark.parametrize("optimizations", [Optimizations(), *map(only, PASSES)], ids=["all", *PASSES])
+@pytest.mark.parametrize(("key", "grammar", "expected"), test_cases)
+def test_passes_keep_the_language(key, grammar, expected, optimizations):
+    assert_same_language(grammar.replace("\\n", "\n"), optimizations, 2)
+
+
+@pytest.mark.parametrize("optimizations", [Optimizations(), *map(only, PASSES)], ids=["all", *PASSES])
+def test_passes_keep_the_language_of_longer_strings(optimizations):
+    assert_same_language(GRAMMAR, optimizations, 4)
+
+
+def test_split_and_join_round_trip():
+    for rule in [*RulesBuilder(GRAMMAR).rules, *RulesBuilder('root ::= | "a" |').rules]:
+        assert join_rule(split_rule(rule)) == rule
+
+
+def test_prune():
+    rules, symbol_ids = optimize_rules(*get_rules(GRAMMAR), only("prune"))
+    assert "unused" not in symbol_ids
+    assert len(rules) == len(RulesBuilder(GRAMMAR).rules) - 1
+    assert sorted(symbol_ids.values()) == list(range(len(rules)))
+
+
+def test_inline():
+    rules, symbol_ids = optimize_rules(*get_rules('root ::= a "x" b\na ::= "a" "b"\nb ::= c\nc ::= "c" | "d"\n'))
+    assert set(symbol_ids) == {"root"}
+    # b's reference to c took c's alternates, which were then merged into a range
+    c_to_d = ((InternalRuleType.CHAR, ord("c")), (InternalRuleType.CHAR_RNG_UPPER, ord("d")))
+    assert rules[0] == join_rule([[char("a"), char("b"), char("x"), c_to_d]])
+
+
+def test_recursive_rules_are_not_inlined():
+    grammar = 'root ::= list\nlist ::= "x" list | "y"\n'
+    rules, symbol_ids = optimize_rules(*get_rules(grammar), only("inline"))
+    assert rules == RulesBuilder(grammar).rules
+    assert find_recursive_rules([split_rule(rule) for rule in rules]) == {symbol_ids["list"]}
+
+
+def test_large_rules_are_not_inlined():
+    grammar = 'root ::= a\na ::= "abcdefgh" | "ijklmnop"\n'
+    # a is 16 chars, an ALT and an END
+    assert optimize_rules(*get_rules(grammar), only("inline"))[0][0] == RulesBuilder(grammar).rules[0]
+    optimizations = dataclasses.replace(only("inline"), inline_max_elements=18)
+    assert len(optimize_rules(*get_rules(grammar), optimizations)[0][0]) == 18
+
+
+def test_merge_chars():
+    rules, _ = optimize_rules(*get_rules('root ::= "c" | [a-b] | "x" "y" | [d-f] | "z"\n'), only("merge_chars"))
+    a_to_f_or_z = (
+        (InternalRuleType.CHAR, ord("a")),
+        (InternalRuleType.CHAR_RNG_UPPER, ord("f")),
+        (InternalRuleType.CHAR_ALT, ord("z")),
+    )
+    assert split_rule(rules[0]) == [[a_to_f_or_z], [char("x"), char("y")]]
+
+
+def test_left_factor():
+    grammar = 'root ::= "trap" | "true" | "tr" | "tr" | "x"\n'
+    rules, symbol_ids = optimize_rules(*get_rules(grammar), only("left_factor"))
+    root, suffixes = (split_rule(rule) for rule in rules)
+    assert root == [[char("t"), char("r"), ((InternalRuleType.RULE_REF, 1),)], [char("x")]]
+    assert suffixes == [[char("a"), char("p")], [char("u"), char("e")], []]
+    assert list(symbol_ids) == ["root", "root_1"]
+
+
+def test_optimizations_shrink_the_grammar():
+    rules, _ = optimize_rules(*get_rules(GRAMMAR))
+    assert len(rules) < len(RulesBuilder(GRAMMAR).rules)
+    for rule in rules:
+        first_symbols = [sequence[0] for sequence in split_rule(rule) if sequence]
+        assert len(first_symbols) == len(set(first_symbols))
+
+
+def test_prune_needs_a_root():
+    with pytest.raises(ValueError, match="'start'"):
+        optimize_rules(*get_rules(GRAMMAR), root="start")
+
+
+def test_gbnf_optimize():
+    rules, symbol_ids = build_rules(GRAMMAR, optimize=True, memory_cache=None)
+    assert (rules, symbol_ids) == optimize_rules(*get_rules(GRAMMAR, dedupe=True))
+    rules, _ = build_rules(GRAMMAR, optimize=only("merge_chars"), memory_cache=None)
+    assert rules == optimize_rules(*get_rules(GRAMMAR), only("merge_chars"))[0]
+    assert build_rules(GRAMMAR, optimize=False, memory_cache=None)[0] == RulesBuilder(GRAMMAR).rules
+
+
+def test_optimized_builds_are_cached_apart():
+    cache = MemoryCache()
+    plain, _ = build_rules(GRAMMAR, memory_cache=cache)
+    optimized, _ = build_rules(GRAMMAR, optimize=True, memory_cache=cache)
+    pruned, _ = build_rules(GRAMMAR, optimize=only("prune"), memory_cache=cache)
+    assert len({len(plain), len(optimized), len(pruned)}) == 3
+    assert build_rules(GRAMMAR, optimize=True, memory_cache=cache)[0] == optimized
+    assert cache.stats.entries == 3
+
+
+def test_inline_max_elements_must_not_be_negative():
+    with pytest.raises(ValueError, match="inline_max_elements cannot be negative"):
+        Optimizations(inline_max_elements=-1)
+
+
+def get_rules(grammar: str, dedupe: bool = False):
+    builder = RulesBuilder(grammar, dedupe=dedupe)
+    return builder.rules, builder.symbol_ids
+
+
+def char(value: str):
+    return ((InternalRuleType.CHAR, ord(value)),)
@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from time import perf_counter
+
+from .rules_builder import RulesBuilder
+from .tokenizer import TokenType
+
+PHASES = ("tokenize", "char_classes", "repetitions", "rules", "validation")
+
+
+@dataclass
+class CompileStats:
+    # Seconds per phase. Tokenizing covers whitespace and comment skipping,
+    # name lexing and literal / char class decoding; "rules" is the remaining
+    # time spent building rules from tokens.
+    phase_times: dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    tokens: int = 0
+    newlines: int = 0
+    names: int = 0
+    literals: int = 0
+    char_classes: int = 0
+    char_class_items: int = 0
+    repetitions: int = 0
+    generated_rules: int = 0
+    # Generated rules that a dedupe build replaced with an identical earlier one
+    deduplicated_rules: int = 0
+    elements: int = 0
+    max_depth: int = 0
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.phase_times.values())
+
+    # The share of generated rules that deduplication removed
+    @property
+    def dedupe_ratio(self) -> float:
+        return self.deduplicated_rules / self.generated_rules if self.generated_rules else 0.0
+
+
+# A RulesBuilder that records CompileStats while it compiles. The counters live
+# in overrides of the builder's hook methods, so plain RulesBuilders pay nothing
+# for them.
+class ProfilingRulesBuilder(RulesBuilder):
+    def __init__(self, src="", *args, **kwargs):
+        self.stats = CompileStats()
+        self.profile_start = perf_counter()
+        super().__init__(src, *args, **kwargs)
+        self.finish_profile()
+
+    def finish_profile(self):
+        phase_times = self.stats.phase_times
+        elapsed = perf_counter() - self.profile_start
+        phase_times["rules"] = elapsed - sum(time for phase, time in phase_times.items() if phase != "rules")
+
+    # Incremental recompiles copy the builder; the copy profiles its own work
+    def __copy__(self):
+        builder = type(self).__new__(type(self))
+        builder.__dict__.update(self.__dict__)
+        builder.stats = CompileStats()
+        builder.profile_start = perf_counter()
+        return builder
+
+    def apply_definitions(self, src, definitions, changed):
+        builder = super().apply_definitions(src, definitions, changed)
+        for tokens in changed.values():
+            builder.count_tokens(tokens)
+        builder.finish_profile()
+        return builder
+
+    def parse_stream(self, *args, **kwargs):
+        yield from super().parse_stream(*args, **kwargs)
+        self.finish_profile()
+
+    def tokenize(self, src, pos=0, end=None):
+        start = perf_counter()
+        tokens = super().tokenize(src, pos, end)
+        self.stats.phase_times["tokenize"] += perf_counter() - start
+        return tokens
+
+    # Counted as tokens are parsed rather than as they are produced, since
+    # streamed builds may tokenize the same text more than once
+    def count_tokens(self, tokens):
+        stats = self.stats
+        for token in tokens:
+            token_type = token.type
+            if token_type is TokenType.EOF:
+                continue
+            stats.tokens += 1
+            if token_type is TokenType.NEWLINE:
+                stats.newlines += 1
+            elif token_type is TokenType.NAME:
+                stats.names += 1
+            elif token_type is TokenType.LITERAL:
+                stats.literals += 1
+
+    def parse_definitions(self, src, tokens):
+        self.count_tokens(tokens)
+        yield from super().parse_definitions(src, tokens)
+
+    def add_char_class(self, out_elements, negated, items):
+        start = perf_counter()
+        super().add_char_class(out_elements, negated, items)
+        self.stats.phase_times["char_classes"] += perf_counter() - start
+        self.stats.char_classes += 1
+        self.stats.char_class_items += len(items)
+
+    def add_repetition(self, rule_name, out_elements, last_sym_start, operator):
+        start = perf_counter()
+        super().add_repetition(rule_name, out_elements, last_sym_start, operator)
+        self.stats.phase_times["repetitions"] += perf_counter() - start
+        self.stats.repetitions += 1
+
+    def generate_symbol_id(self, base_name):
+        self.stats.generated_rules += 1
+        return super().generate_symbol_id(base_name)
+
+    def add_generated_rule(self, rule_id, rule):
+        added_id = super().add_generated_rule(rule_id, rule)
+        if added_id != rule_id:
+            self.stats.deduplicated_rules += 1
+        return added_id
+
+    def add_rule(self, rule_id, rule):
+        self.stats.elements += len(rule)
+        super().add_rule(rule_id, rule)
+
+    # Groups are parsed without recursion, so their depth is measured from the
+    # parentheses of the tokens just parsed
+    def parse_alternates(self, rule_name, rule_id):
+        start = self.index
+        super().parse_alternates(rule_name, rule_id)
+        depth = 0
+        for token in self.tokens[start : self.index]:
+            if token.type is TokenType.LPAREN:
+                depth += 1
+                if depth > self.stats.max_depth:
+                    self.stats.max_depth = depth
+            elif token.type is TokenType.RPAREN:
+                depth -= 1
+
+    def validate(self, src, pos=None):
+        start = perf_counter()
+        try:
+            super().validate(src, pos)
+        finally:
+            self.stats.phase_times["validation"] += perf_counter() - start
@@ -0,0 +1,68 @@
+import io
+
+from .profiling import PHASES, ProfilingRulesBuilder
+from .rules_builder import RulesBuilder
+
+GRAMMAR = """# A comment
+root ::= (item ("," item)*)? [\\n]
+item ::= "abc" | [a-z0-9_] | "(" ((item)) ")"+
+"""
+
+
+def test_profiling_does_not_change_the_output():
+    profiled = ProfilingRulesBuilder(GRAMMAR)
+    plain = RulesBuilder(GRAMMAR)
+    assert profiled.rules == plain.rules
+    assert profiled.symbol_ids == plain.symbol_ids
+
+
+def test_counts():
+    stats = ProfilingRulesBuilder(GRAMMAR).stats
+    assert stats.newlines == 3
+    assert stats.names == 5
+    assert stats.literals == 4
+    assert (stats.char_classes, stats.char_class_items) == (2, 4)
+    assert stats.repetitions == 3
+    # Three repetitions and four groups
+    assert stats.generated_rules == 7
+    assert stats.elements == sum(len(rule) for rule in RulesBuilder(GRAMMAR).rules)
+    assert stats.max_depth == 2
+
+
+def test_phase_times():
+    stats = ProfilingRulesBuilder(GRAMMAR).stats
+    assert set(stats.phase_times) == set(PHASES)
+    assert all(time >= 0 for time in stats.phase_times.values())
+    assert stats.total_time > 0
+
+
+def test_streamed_builds_are_profiled():
+    stats = ProfilingRulesBuilder.from_stream(io.StringIO(GRAMMAR), chunk_size=8).stats
+    assert stats.names == ProfilingRulesBuilder(GRAMMAR).stats.names
+    assert stats.phase_times["tokenize"] > 0
+
+
+def test_recompiles_get_their_own_stats():
+    original = ProfilingRulesBuilder(GRAMMAR)
+    recompiled = original.recompile(GRAMMAR.replace('"abc"', '"abc"*'))
+    assert isinstance(recompiled, ProfilingRulesBuilder)
+    assert recompiled.stats is not original.stats
+    # Only the edited rule was parsed again
+    assert recompiled.stats.repetitions == 2
+    assert recompiled.stats.names == 2
+    assert original.stats.repetitions == 3
+
+
+def test_max_depth_of_deeply_nested_groups():
+    depth = 10000
+    grammar = "root ::= " + '("a" ' * depth + ")" * depth + '\nother ::= ("b")\n'
+    assert ProfilingRulesBuilder(grammar).stats.max_depth == depth
+
+
+def test_dedupe_ratio():
+    grammar = 'root ::= [0-9]+ "." [0-9]+ | [0-9]+\n'
+    assert ProfilingRulesBuilder(grammar).stats.dedupe_ratio == 0
+    stats = ProfilingRulesBuilder(grammar, dedupe=True).stats
+    assert (stats.generated_rules, stats.deduplicated_rules) == (3, 2)
+    assert stats.dedupe_ratio == 2 / 3
+    assert stats.elements == sum(len(rule) for rule in RulesBuilder(grammar, dedupe=True).rules)
@@ -1,207 +1,569 @@
+import codecs
+import copy
+from operator import itemgetter
 from time import perf_counter
 
-from .errors import GrammarParseError
+from .compile_budget import DEFAULT_TIMEOUT, CompileBudget
+from .definitions import diff_definitions, split_definitions
+from .errors import CompileBudgetExceededError, CompileCancelledError, GrammarParseError, UndefinedRuleError
 from .is_word_char import is_word_char
-from .parse_char import parse_char
-from .parse_name import parse_name
-from .parse_space import parse_space
+from .parse_name import PARSE_NAME_ERROR
+from .tokenizer import Token, TokenType, tokenize
 from .types import InternalRuleType
 
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Tokens that parsing always charges a step for, wherever they appear. Names
+# are left out, as the name of a definition is not charged.
+CHARGED_TOKEN_TYPES = (
+    TokenType.LITERAL,
+    TokenType.CHAR_CLASS,
+    TokenType.LPAREN,
+    TokenType.RPAREN,
+    TokenType.REPEAT,
+    TokenType.ALT,
+)
+
+
+# A hashable form of a rule's body, with references to the rule itself (the
+# recursion of a repetition) made independent of its id
+def get_rule_key(rule_id, rule):
+    key = []
+    for element in rule:
+        value = element.get("value")
+        if isinstance(value, list):
+            value = tuple(value)
+        elif value == rule_id and element["type"] is InternalRuleType.RULE_REF:
+            value = -1
+        key.append((element["type"], value))
+    return tuple(key)
+
+
+# A lower bound on the steps parsing tokens[start:end] charges: one per token
+# of the types above, and one more per alternate. Counted with list.count, so
+# costing tokens takes a fraction of the time tokenizing them does.
+def get_token_steps(tokens, start, end):
+    types = list(map(itemgetter(0), tokens[start:end]))
+    return sum(map(types.count, CHARGED_TOKEN_TYPES)) + types.count(TokenType.ALT)
+
 
 class RulesBuilder:
-    def __init__(self, src, limit=1000):
+    def __init__(self, src="", limit=DEFAULT_TIMEOUT, budget=None, *, dedupe=False):
         self.pos = 0
         self.symbol_ids = {}
+        # Reverse of symbol_ids, indexed by id
+        self.symbol_names = []
+        # Ids referenced before (or without) being defined, mapped to the source
+        # positions of those references. Definitions remove their own id, so
+        # whatever is left once parsing ends is undefined.
+        self.undefined_references = {}
+        # Added to reference positions when parsing a slice of a larger source
+        self.offset = 0
         self.rules = []
         self.src = src
-        self.start = perf_counter()
-        self.time_limit = limit
+        # `limit` is the timeout in seconds, kept for callers that predate budgets
+        self.budget = budget if budget is not None else CompileBudget(timeout=limit)
+        self.num_elements = 0
+        self.start_budget()
+        self.tokens = []
+        self.index = 0
+        # Bookkeeping for incremental recompilation: the source span of every
+        # top-level definition, the ids generated for its groups and repetitions,
+        # and the ids it references by name
+        self.definitions = {}
+        self.generated_ids = {}
+        self.references = {}
+        self.has_duplicate_definitions = False
+        self.current_rule_id = None
+        self.recycled_ids = []
+        # Streamed builds never hold the whole source, so they cannot be diffed
+        self.is_streamed = False
+        # With dedupe, generated rules are hash-consed: bodies seen before map
+        # to the id generated for them first
+        self.dedupe = dedupe
+        self.generated_rules = {}
         self.parse(src)
 
+    @classmethod
+    def from_stream(cls, stream, limit=DEFAULT_TIMEOUT, chunk_size=DEFAULT_CHUNK_SIZE, budget=None, *, dedupe=False):
+        builder = cls("", limit, budget, dedupe=dedupe)
+        for _ in builder.parse_stream(stream, chunk_size):
+            pass
+        return builder
+
+    @classmethod
+    def from_file(cls, path, limit=DEFAULT_TIMEOUT, chunk_size=DEFAULT_CHUNK_SIZE, budget=None, *, dedupe=False):
+        from pathlib import Path
+
+        with Path(path).open("rb") as file:
+            return cls.from_stream(file, limit, chunk_size, budget, dedupe=dedupe)
+
     def parse(self, src):
-        self.pos = parse_space(src, 0, True)
-        while self.pos < len(src):
-            self.parse_rule(src)
+        for _ in self.parse_definitions(src, self.tokenize(src)):
+            pass
+        self.pos = len(src)
+        self.validate(src)
 
+    # Parses every definition in `tokens`, yielding (rule id, rule) for each
+    # top-level rule and the rules generated for it as soon as it is complete
+    def parse_definitions(self, src, tokens):
+        self.src = src
+        self.tokens = tokens
+        self.index = 0
+        self.skip_newlines()
+        while self.tokens[self.index].type is not TokenType.EOF:
+            name = self.tokens[self.index].value
+            generated_before = len(self.generated_ids.get(self.symbol_ids.get(name), ()))
+            rule_id = self.parse_rule(src)
+            for generated_id in self.generated_ids.get(rule_id, [])[generated_before:]:
+                yield generated_id, self.rules[generated_id]
+            yield rule_id, self.rules[rule_id]
+
+    # Consumes a grammar from a text or binary file object (or an mmap) chunk by
+    # chunk, holding only the definitions that are not complete yet in memory,
+    # and yields (rule id, rule) pairs as definitions complete. References to
+    # undefined rules are reported once the stream is exhausted.
+    def parse_stream(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.is_streamed = True
+        decoder = None
+        buffer = ""
+        self.offset = 0
+        # After an attempt that found no complete definition, wait for the buffer
+        # to double before trying again so long definitions stay linear
+        next_attempt_size = 0
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                if decoder is not None:
+                    buffer += decoder.decode(b"", final=True)
+                break
+            if not isinstance(data, str):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder("utf-8")()
+                data = decoder.decode(data)
+            buffer += data
+            if len(buffer) < next_attempt_size:
+                continue
+            # A definition can only end at a newline
+            cut = max(buffer.rfind("\n"), buffer.rfind("\r")) + 1
+            try:
+                tokens = self.tokenize(buffer, 0, cut)
+            except GrammarParseError:
+                # A literal or char class continues past the cut
+                next_attempt_size = len(buffer) * 2
+                continue
+            split = split_definitions(tokens)
+            if split == []:
+                buffer = buffer[cut:]
+                self.offset += cut
+                continue
+            # The last definition may continue in the next chunk
+            if split is None or len(split) < 2:
+                next_attempt_size = len(buffer) * 2
+                continue
+            next_attempt_size = 0
+            last_start = split[-1][1]
+            end = tokens[last_start].pos
+            yield from self.parse_definitions(buffer, [*tokens[:last_start], Token(TokenType.EOF, None, end)])
+            buffer = buffer[end:]
+            self.offset += end
+        yield from self.parse_definitions(buffer, self.tokenize(buffer))
+        self.tokens = []
+        self.definitions = {}
+        self.pos = len(buffer)
+        # Reference positions count from the start of the stream, and most of
+        # the stream is gone by now, so the error points at the end of it
+        self.validate(buffer, self.pos)
+
+    def tokenize(self, src, pos=0, end=None):
+        self.costed_tokens = 0
+        self.pending_steps = 0
+        return tokenize(src, pos, end, self.check_tokens, self.budget.check_interval)
+
+    # Called while tokenizing, every `check_interval` tokens. Tokens are only
+    # charged as they are parsed, but a lower bound on what they will cost is
+    # known once they are read, so a source too big for the budget is rejected
+    # before all of it is tokenized, and the deadline and cancellation are
+    # checked along the way.
+    def check_tokens(self, src, tokens):
+        if self.budget.max_steps is not None:
+            self.pending_steps += get_token_steps(tokens, self.costed_tokens, len(tokens))
+            self.costed_tokens = len(tokens)
+        self.check_limits(src, tokens[-1].pos, self.steps + self.pending_steps)
+
+    def validate(self, src, pos=None):
         # Validate the state to ensure that all rules are defined
-        for rule in self.rules:
-            for elem in rule:
-                if elem["type"] == InternalRuleType.RULE_REF:
-                    if (
-                        elem["value"] >= len(self.rules)
-                        or not self.rules[elem["value"]]
-                    ):
-                        for key, value in self.symbol_ids.items():
-                            if value == elem["value"]:
-                                raise GrammarParseError(
-                                    src, self.pos, f"Undefined rule identifier '{key}'",
-                                )
+        if self.undefined_references:
+            undefined = {
+                self.symbol_names[rule_id]: positions
+                for rule_id, positions in sorted(self.undefined_references.items(), key=lambda item: item[1][0])
+            }
+            if pos is None:
+                pos = min(positions[0] for positions in undefined.values())
+            raise UndefinedRuleError(src, pos, undefined)
+
+    def skip_newlines(self):
+        while self.tokens[self.index].type is TokenType.NEWLINE:
+            self.index += 1
+        self.pos = self.tokens[self.index].pos
 
     def parse_rule(self, src):
-        name = parse_name(src, self.pos)
-        self.pos = parse_space(src, self.pos + len(name), False)
+        token = self.tokens[self.index]
+        if token.type is not TokenType.NAME:
+            raise GrammarParseError(src, token.pos, PARSE_NAME_ERROR)
+        name = token.value
         rule_id = self.get_symbol_id(name, len(name))
+        start = token.pos
+        if name in self.definitions:
+            self.has_duplicate_definitions = True
+            self.forget_references(rule_id, *self.definitions[name])
+        self.current_rule_id = rule_id
+        self.references.setdefault(rule_id, set())
 
-        self.pos = parse_space(src, self.pos, True)
-        if not (
-            self.pos + 2 < len(src)  # Ensure the position + 2 is within bounds
-            and src[self.pos] == ":"
-            and src[self.pos + 1] == ":"
-            and src[self.pos + 2] == "="
-        ):
+        # Skip over newlines and find the ::= sequence
+        self.index += 1
+        self.skip_newlines()
+        if self.tokens[self.index].type is not TokenType.DEFINE:
             raise GrammarParseError(src, self.pos, f"Expecting ::= at {self.pos}")
-        self.pos += 3
-        self.pos = parse_space(src, self.pos, True)
+        self.index += 1
+        self.skip_newlines()
 
         self.parse_alternates(name, rule_id)
 
-        # Check if self.pos is within the bounds of src before checking for a carriage return
-        if self.pos < len(src) and src[self.pos] == "\r":
-            self.pos += 2 if src[self.pos + 1] == "\n" else 1
-        elif self.pos < len(src) and src[self.pos] == "\n":
-            self.pos += 1
-        elif self.pos < len(src) and src[self.pos]:
+        token = self.tokens[self.index]
+        if token.type is not TokenType.NEWLINE and token.type is not TokenType.EOF:
             raise GrammarParseError(
-                src, self.pos, f"Expecting newline or end at {self.pos}",
+                src, token.pos, f"Expecting newline or end at {token.pos}",
             )
-        self.pos = parse_space(src, self.pos, True)
+        self.definitions[name] = (start + self.offset, token.pos + self.offset)
+        self.undefined_references.pop(rule_id, None)
+        self.skip_newlines()
+        return rule_id
+
+    # A redefinition replaces the previous definition's rule, so references
+    # made only there (within its span) no longer need a target. The rules
+    # generated for its groups and repetitions stay, and so do theirs.
+    def forget_references(self, rule_id, start, end):
+        kept = {
+            elem["value"]
+            for generated_id in self.generated_ids.get(rule_id, ())
+            for elem in self.rules[generated_id]
+            if elem["type"] is InternalRuleType.RULE_REF
+        }
+        for ref_rule_id in self.references[rule_id] - kept:
+            positions = self.undefined_references.get(ref_rule_id)
+            if positions is not None:
+                positions = [pos for pos in positions if not start <= pos < end]
+                if positions:
+                    self.undefined_references[ref_rule_id] = positions
+                else:
+                    del self.undefined_references[ref_rule_id]
 
     def get_symbol_id(self, src, length):
         key = src[:length]
         if key not in self.symbol_ids:
             self.symbol_ids[key] = len(self.symbol_ids)
+            self.symbol_names.append(key)
         return self.symbol_ids[key]
 
     def generate_symbol_id(self, base_name):
-        next_id = len(self.symbol_ids)
-        new_name = f"{base_name}_{next_id}"
-        self.symbol_ids[new_name] = next_id
+        if self.recycled_ids:
+            # Reuse an id the rule generated before it was edited
+            next_id = self.recycled_ids.pop(0)
+        else:
+            next_id = len(self.symbol_ids)
+            new_name = f"{base_name}_{next_id}"
+            self.symbol_ids[new_name] = next_id
+            self.symbol_names.append(new_name)
+        self.generated_ids.setdefault(self.current_rule_id, []).append(next_id)
         return next_id
 
     def add_rule(self, rule_id, rule):
         while len(self.rules) <= rule_id:
             self.rules.append([])
+        self.num_elements += len(rule) - len(self.rules[rule_id])
         self.rules[rule_id] = rule
+        budget = self.budget
+        if budget.max_rules is not None and len(self.rules) > budget.max_rules:
+            raise CompileBudgetExceededError(
+                self.src, self.pos, f"Rule limit of {budget.max_rules} exceeded",
+            )
+        if budget.max_elements is not None and self.num_elements > budget.max_elements:
+            raise CompileBudgetExceededError(
+                self.src, self.pos, f"Element limit of {budget.max_elements} exceeded",
+            )
 
-    def check_duration(self):
-        if perf_counter() - self.start > self.time_limit:
-            raise GrammarParseError(
-                self.src, self.pos, f"Duration of {self.time_limit} exceeded",
+    # Adds the rule of a group or repetition and returns the id to reference it
+    # by. When deduplicating, a body generated before is referenced by its
+    # existing id instead, and the id just generated for it is given back.
+    # Groups and repetitions are added inside out, so by the time a body
+    # repeats, the rules it references exist and its id is the last generated.
+    def add_generated_rule(self, rule_id, rule):
+        if not self.dedupe:
+            self.add_rule(rule_id, rule)
+            return rule_id
+        key = get_rule_key(rule_id, rule)
+        existing_id = self.generated_rules.get(key)
+        if existing_id is None or rule_id != len(self.symbol_names) - 1:
+            self.generated_rules.setdefault(key, rule_id)
+            self.add_rule(rule_id, rule)
+            return rule_id
+        del self.symbol_ids[self.symbol_names.pop()]
+        self.generated_ids[self.current_rule_id].pop()
+        return existing_id
+
+    def start_budget(self):
+        self.steps = 0
+        self.next_check = self.budget.get_next_check(0)
+        self.deadline = self.budget.get_deadline()
+
+    def charge(self, steps):
+        self.steps += steps
+        if self.steps >= self.next_check:
+            self.check_budget()
+
+    def check_budget(self):
+        self.check_limits(self.src, self.pos, self.steps)
+        self.next_check = self.budget.get_next_check(self.steps)
+
+    def check_limits(self, src, pos, steps):
+        budget = self.budget
+        if budget.cancellation_token is not None and budget.cancellation_token.cancelled:
+            raise CompileCancelledError(src, pos, "Compilation was cancelled")
+        if budget.max_steps is not None and steps > budget.max_steps:
+            raise CompileBudgetExceededError(
+                src, pos, f"Step budget of {budget.max_steps} exceeded",
+            )
+        if self.deadline is not None and perf_counter() > self.deadline:
+            raise CompileBudgetExceededError(
+                src, pos, f"Duration of {budget.timeout} exceeded",
             )
 
-    def parse_sequence(self, rule_name, out_elements, depth=0):
-        is_nested = depth != 0
+    # Parses the alternates of `rule_id` up to the token that ends them. Groups
+    # are parsed in the same loop, with the enclosing rules kept on an explicit
+    # stack, so nesting depth is bounded by memory rather than the recursion limit.
+    def parse_alternates(self, rule_name, rule_id):
         src = self.src
-        last_sym_start = len(out_elements)
-
-        while self.pos < len(src):
-            if src[self.pos] == '"':
-                self.pos += 1
-                last_sym_start = len(out_elements)
-                while src[self.pos] != '"':
-                    self.check_duration()
-                    value, inc_pos = parse_char(src, self.pos)
-                    out_elements.append(
-                        {"type": InternalRuleType.CHAR, "value": [value]},
-                    )
-                    self.pos += inc_pos
-                self.pos = parse_space(src, self.pos + 1, is_nested)
-            elif src[self.pos] == "[":
-                self.pos += 1
-                start_type = InternalRuleType.CHAR
-                if src[self.pos] == "^":
-                    self.pos += 1
-                    start_type = InternalRuleType.CHAR_NOT
-                last_sym_start = len(out_elements)
-                while src[self.pos] != "]":
-                    self.check_duration()
-                    type_ = (
-                        InternalRuleType.CHAR_ALT
-                        if last_sym_start < len(out_elements)
-                        else start_type
-                    )
-                    startchar_value, inc_pos = parse_char(src, self.pos)
-                    self.pos += inc_pos
-                    out_elements.append(
-                        {
-                            "type": type_,
-                            "value": (
-                                [startchar_value]
-                                if type_
-                                in (InternalRuleType.CHAR, InternalRuleType.CHAR_NOT)
-                                else startchar_value
-                            ),
-                        },
-                    )
-
-                    if src[self.pos] == "-" and src[self.pos + 1] != "]":
-                        self.pos += 1
-                        endchar_value, inc_pos = parse_char(src, self.pos)
-                        out_elements.append(
-                            {
-                                "type": InternalRuleType.CHAR_RNG_UPPER,
-                                "value": endchar_value,
-                            },
-                        )
-                        self.pos += inc_pos
-                self.pos = parse_space(src, self.pos + 1, is_nested)
-            elif is_word_char(src[self.pos]):
-                name = parse_name(src, self.pos)
+        tokens = self.tokens
+        stack = []
+        rule = []
+        last_sym_start = 0
+        while True:
+            token = tokens[self.index]
+            token_type = token.type
+            if token_type is TokenType.NEWLINE:
+                # Newlines terminate a top-level sequence but are insignificant inside groups
+                if stack:
+                    self.index += 1
+                    continue
+                token_type = None
+            else:
+                self.pos = token.pos
+                self.steps += 1
+                if self.steps >= self.next_check:
+                    self.check_budget()
+            if token_type is TokenType.LITERAL:
+                # Charged before building, so one huge literal cannot blow the budget
+                self.charge(len(token.value))
+                last_sym_start = len(rule)
+                rule.extend(
+                    {"type": InternalRuleType.CHAR, "value": [value]}
+                    for value in token.value
+                )
+                self.index += 1
+            elif token_type is TokenType.CHAR_CLASS:
+                last_sym_start = len(rule)
+                self.add_char_class(rule, *token.value)
+                self.index += 1
+            elif token_type is TokenType.NAME and is_word_char(token.value[0]):
+                name = token.value
                 ref_rule_id = self.get_symbol_id(name, len(name))
-                self.pos += len(name)
-                self.pos = parse_space(src, self.pos, is_nested)
-
-                last_sym_start = len(out_elements)
-                out_elements.append(
+                self.references[self.current_rule_id].add(ref_rule_id)
+                if ref_rule_id >= len(self.rules) or not self.rules[ref_rule_id]:
+                    self.undefined_references.setdefault(ref_rule_id, []).append(token.pos + self.offset)
+                last_sym_start = len(rule)
+                rule.append(
                     {"type": InternalRuleType.RULE_REF, "value": ref_rule_id},
                 )
-            elif src[self.pos] == "(":
-                self.pos = parse_space(src, self.pos + 1, True)
-                sub_rule_id = self.generate_symbol_id(rule_name)
-                self.parse_alternates(rule_name, sub_rule_id, depth + 1)
-                last_sym_start = len(out_elements)
-                out_elements.append(
-                    {"type": InternalRuleType.RULE_REF, "value": sub_rule_id},
-                )
-                if src[self.pos] != ")":
-                    raise GrammarParseError(
-                        src, self.pos, f"Expecting ')' at {self.pos}",
-                    )
-                self.pos = parse_space(src, self.pos + 1, is_nested)
-            elif src[self.pos] in "*+?":
-                if last_sym_start == len(out_elements):
+                self.index += 1
+            elif token_type is TokenType.LPAREN:
+                self.index += 1
+                stack.append((rule, rule_id))
+                rule_id = self.generate_symbol_id(rule_name)
+                rule = []
+                last_sym_start = 0
+            elif token_type is TokenType.REPEAT:
+                if last_sym_start == len(rule):
                     raise GrammarParseError(
                         src,
                         self.pos,
                         f"Expecting preceding item to */+/? at {self.pos}",
                     )
-                sub_rule_id = self.generate_symbol_id(rule_name)
-                sub_rule = out_elements[last_sym_start:]
-                if src[self.pos] in "*+":
-                    sub_rule.append(
-                        {"type": InternalRuleType.RULE_REF, "value": sub_rule_id},
-                    )
-                sub_rule.append({"type": InternalRuleType.ALT})
-                if src[self.pos] == "+":
-                    sub_rule.extend(out_elements[last_sym_start:])
-                sub_rule.append({"type": InternalRuleType.END})
-                self.add_rule(sub_rule_id, sub_rule)
-                out_elements[last_sym_start:] = [
+                self.add_repetition(rule_name, rule, last_sym_start, token.value)
+                self.index += 1
+            elif token_type is TokenType.ALT:
+                self.charge(1)
+                rule.append({"type": InternalRuleType.ALT})
+                self.index += 1
+                self.skip_newlines()
+                last_sym_start = len(rule)
+            else:
+                rule.append({"type": InternalRuleType.END})
+                if not stack:
+                    self.add_rule(rule_id, rule)
+                    return
+                # Close the group and reference it from the enclosing rule
+                sub_rule_id = self.add_generated_rule(rule_id, rule)
+                rule, rule_id = stack.pop()
+                last_sym_start = len(rule)
+                rule.append(
                     {"type": InternalRuleType.RULE_REF, "value": sub_rule_id},
-                ]
-                self.pos = parse_space(src, self.pos + 1, is_nested)
+                )
+                self.pos = token.pos
+                if token_type is not TokenType.RPAREN:
+                    raise GrammarParseError(
+                        src, self.pos, f"Expecting ')' at {self.pos}",
+                    )
+                self.index += 1
+
+    def add_char_class(self, out_elements, negated, items):
+        self.charge(len(items))
+        type_ = InternalRuleType.CHAR_NOT if negated else InternalRuleType.CHAR
+        start = len(out_elements)
+        for startchar_value, endchar_value in items:
+            if start < len(out_elements):
+                out_elements.append(
+                    {"type": InternalRuleType.CHAR_ALT, "value": startchar_value},
+                )
             else:
-                break
+                out_elements.append({"type": type_, "value": [startchar_value]})
+            if endchar_value is not None:
+                out_elements.append(
+                    {
+                        "type": InternalRuleType.CHAR_RNG_UPPER,
+                        "value": endchar_value,
+                    },
+                )
 
-    def parse_alternates(self, rule_name, rule_id, depth=0):
-        src = self.src
-        rule = []
-        self.parse_sequence(rule_name, rule, depth)
-        # Ensure that self.pos is within bounds before checking src[self.pos]
-        while self.pos < len(src) and src[self.pos] == "|":
-            self.check_duration()
-            rule.append({"type": InternalRuleType.ALT})
-            self.pos = parse_space(src, self.pos + 1, True)
-            self.parse_sequence(rule_name, rule, depth)
-        rule.append({"type": InternalRuleType.END})
-        self.add_rule(rule_id, rule)
+    # Moves the last symbol of `out_elements` into a generated rule that
+    # implements the */+/? operator, and references that rule in its place
+    def add_repetition(self, rule_name, out_elements, last_sym_start, operator):
+        sub_rule_id = self.generate_symbol_id(rule_name)
+        sub_rule = out_elements[last_sym_start:]
+        if operator in "*+":
+            sub_rule.append(
+                {"type": InternalRuleType.RULE_REF, "value": sub_rule_id},
+            )
+        sub_rule.append({"type": InternalRuleType.ALT})
+        if operator == "+":
+            sub_rule.extend(out_elements[last_sym_start:])
+        sub_rule.append({"type": InternalRuleType.END})
+        sub_rule_id = self.add_generated_rule(sub_rule_id, sub_rule)
+        out_elements[last_sym_start:] = [
+            {"type": InternalRuleType.RULE_REF, "value": sub_rule_id},
+        ]
+
+    # Returns a new RulesBuilder for an edited version of this grammar, reparsing
+    # only the definitions whose source text changed. Untouched rules and symbol
+    # ids are shared with this builder, which stays valid.
+    def recompile(self, src):
+        diff = None
+        # Deduplicated rules are shared between definitions, so editing one
+        # definition cannot clear the rules generated for it
+        if not self.has_duplicate_definitions and not self.is_streamed and not self.dedupe:
+            diff = diff_definitions(self.src, self.definitions, src)
+        if diff is None:
+            return type(self)(src, budget=self.budget, dedupe=self.dedupe)
+        return self.apply_definitions(src, *diff)
+
+    # Returns a new RulesBuilder with the rules named in `patch` replaced by new
+    # bodies (the text after ::=), added if they are new, or removed when mapped
+    # to None.
+    def update(self, patch):
+        if self.is_streamed:
+            raise ValueError("A RulesBuilder built from a stream has no source to update")
+        texts = {name: self.src[start:end] for name, (start, end) in self.definitions.items()}
+        for name, body in patch.items():
+            if body is None:
+                texts.pop(name, None)
+            else:
+                texts[name] = f"{name} ::= {body}"
+        if self.has_duplicate_definitions or self.dedupe:
+            return type(self)("\n".join(texts.values()), budget=self.budget, dedupe=self.dedupe)
+
+        definitions = {}
+        pos = 0
+        for name, text in texts.items():
+            definitions[name] = (pos, pos + len(text))
+            pos += len(text) + 1
+        src = "\n".join(texts.values())
+        changed = {
+            name: tokenize(src, *definitions[name])
+            for name, body in patch.items()
+            if body is not None
+        }
+        return self.apply_definitions(src, definitions, changed)
+
+    def apply_definitions(self, src, definitions, changed):
+        builder = copy.copy(self)
+        builder.src = src
+        builder.rules = list(self.rules)
+        builder.start_budget()
+        builder.symbol_ids = dict(self.symbol_ids)
+        builder.symbol_names = list(self.symbol_names)
+        builder.undefined_references = {}
+        builder.offset = 0
+        # The spans of the edited source are already known; the spans parse_rule
+        # records go to a scratch dict so changed rules do not look redefined
+        builder.definitions = {}
+        builder.generated_ids = dict(self.generated_ids)
+        builder.references = dict(self.references)
+
+        removed_ids = [self.symbol_ids[name] for name in self.definitions if name not in definitions]
+        for rule_id in removed_ids:
+            builder.clear_rule(rule_id)
+            del builder.references[rule_id]
+
+        for name, tokens in changed.items():
+            rule_id = builder.symbol_ids.get(name)
+            if rule_id is not None:
+                builder.recycled_ids = builder.clear_rule(rule_id)
+                builder.references[rule_id] = set()
+            builder.tokens = tokens
+            builder.index = 0
+            builder.parse_rule(src)
+            if builder.tokens[builder.index].type is not TokenType.EOF:
+                raise GrammarParseError(
+                    src, builder.pos, f"Expecting a single definition of '{name}' at {builder.pos}",
+                )
+            # Ids the new definition did not need stay reserved for the rule's next edit
+            builder.generated_ids.setdefault(builder.symbol_ids[name], []).extend(builder.recycled_ids)
+            builder.recycled_ids = []
+        builder.definitions = definitions
+        builder.tokens = []
+        builder.index = 0
+        builder.pos = len(src)
+
+        # The changed definitions recorded their own undefined references while
+        # parsing; unchanged rules can only have lost a target through removal,
+        # and are reported at the start of their definition
+        if removed_ids:
+            removed = set(removed_ids)
+            changed_ids = {builder.symbol_ids[name] for name in changed}
+            for referrer_id, references in builder.references.items():
+                if referrer_id in changed_ids:
+                    continue
+                for rule_id in references & removed:
+                    start, _ = builder.definitions[builder.symbol_names[referrer_id]]
+                    builder.undefined_references.setdefault(rule_id, []).append(start)
+        builder.validate(src)
+        return builder
+
+    # Empties a rule and the rules generated for it, returning the generated ids
+    def clear_rule(self, rule_id):
+        generated_ids = self.generated_ids.pop(rule_id, [])
+        for generated_id in (rule_id, *generated_ids):
+            if generated_id < len(self.rules):
+                self.num_elements -= len(self.rules[generated_id])
+                self.rules[generated_id] = []
+        return list(generated_ids)
@@ -1,5 +1,9 @@
+import io
+import mmap
+
 import pytest
 
+from .errors import GrammarParseError, UndefinedRuleError
 from .rules_builder import RulesBuilder
 from .types import InternalRuleType
 
@@ -1455,3 +1459,319 @@ def test_grammar_parser(key, grammar, expected):
     #         assert rule == rules_expected[i][j]
     assert parsed_grammar.rules == rules_expected
     assert list(parsed_grammar.symbol_ids.items()) == symbol_ids_expected
+
+
+def canonicalize(rules_builder):
+    # Renumbers generated rules by the order they are reached from the named
+    # rules, so builds that assign ids differently can be compared
+    names = {value: key for key, value in rules_builder.symbol_ids.items()}
+    defined = set(rules_builder.definitions)
+    labels = {}
+    queue = []
+
+    def label(rule_id):
+        name = names[rule_id]
+        if name in defined:
+            return name
+        if rule_id not in labels:
+            labels[rule_id] = f"#{len(labels)}"
+            queue.append(rule_id)
+        return labels[rule_id]
+
+    def render(rule_id):
+        return [
+            (elem["type"], label(elem["value"]) if elem["type"] == InternalRuleType.RULE_REF else elem.get("value"))
+            for elem in rules_builder.rules[rule_id]
+        ]
+
+    canonical = {}
+    for name in sorted(defined):
+        canonical[name] = render(rules_builder.symbol_ids[name])
+        while queue:
+            rule_id = queue.pop(0)
+            canonical[labels[rule_id]] = render(rule_id)
+    return canonical
+
+
+BASE_GRAMMAR = """
+root ::= (expr "=" term "\\n")+
+expr ::= term ([-+*/] term)*
+term ::= num | "(" expr ")"
+num ::= [0-9]+
+"""
+
+
+@pytest.mark.parametrize(
+    "edited",
+    [
+        BASE_GRAMMAR,
+        BASE_GRAMMAR.replace("[0-9]+", "[0-7]+"),
+        BASE_GRAMMAR.replace('([-+*/] term)*', '(("+" | "-") term)* ("!" term)?'),
+        BASE_GRAMMAR.replace("root ::=", "# a comment\nroot ::="),
+        BASE_GRAMMAR + 'extra ::= "x" (num)*\n',
+        BASE_GRAMMAR.replace('term ::= num | "(" expr ")"', 'term ::= num | "(" expr ")" | word\nword ::= [a-z]+'),
+        BASE_GRAMMAR.replace("expr ::=", "expr ::=\n  ").replace("term ::= num |", "term ::= num |\n"),
+        "\n".join(reversed(BASE_GRAMMAR.strip().split("\n"))),
+    ],
+)
+def test_recompile_matches_a_full_build(edited):
+    recompiled = RulesBuilder(BASE_GRAMMAR).recompile(edited)
+    assert canonicalize(recompiled) == canonicalize(RulesBuilder(edited))
+
+
+def test_recompile_reuses_untouched_rules_and_ids():
+    original = RulesBuilder(BASE_GRAMMAR)
+    recompiled = original.recompile(BASE_GRAMMAR.replace("[0-9]+", "[0-7]+"))
+    num_id = original.symbol_ids["num"]
+    for rule_id, rule in enumerate(original.rules):
+        if rule_id not in (num_id, *original.generated_ids[num_id]):
+            assert recompiled.rules[rule_id] is rule
+    # The edit keeps the shape of the rule, so the generated ids are recycled
+    assert recompiled.symbol_ids == original.symbol_ids
+    assert recompiled.rules == RulesBuilder(recompiled.src).rules
+
+
+def test_recompile_leaves_the_original_builder_intact():
+    original = RulesBuilder(BASE_GRAMMAR)
+    rules = [list(rule) for rule in original.rules]
+    symbol_ids = dict(original.symbol_ids)
+    original.recompile(BASE_GRAMMAR.replace("[0-9]+", '"0" | [1-9] [0-9]*'))
+    assert original.rules == rules
+    assert original.symbol_ids == symbol_ids
+
+
+def test_recompile_removes_deleted_rules():
+    recompiled = RulesBuilder(BASE_GRAMMAR + 'unused ::= "u"\n').recompile(BASE_GRAMMAR)
+    assert "unused" not in recompiled.definitions
+    assert recompiled.rules[recompiled.symbol_ids["unused"]] == []
+
+
+def test_recompile_reports_undefined_rules():
+    with pytest.raises(GrammarParseError, match="Undefined rule identifier 'missing'"):
+        RulesBuilder(BASE_GRAMMAR).recompile(BASE_GRAMMAR.replace("term ::= num |", "term ::= missing |"))
+    with pytest.raises(GrammarParseError, match="Undefined rule identifier 'num'"):
+        RulesBuilder(BASE_GRAMMAR).recompile(BASE_GRAMMAR.replace("num ::= [0-9]+", ""))
+
+
+def test_recompile_falls_back_to_a_full_parse():
+    # The trailing | makes the edited rule swallow the following line
+    with pytest.raises(GrammarParseError):
+        RulesBuilder(BASE_GRAMMAR).recompile(BASE_GRAMMAR.replace('"(" expr ")"', '"(" expr ")" |'))
+
+
+def test_update_replaces_adds_and_removes_rules():
+    original = RulesBuilder(BASE_GRAMMAR + 'unused ::= "u"\n')
+    updated = original.update({"num": '"0" | [1-9] [0-9]*', "unused": None, "extra": '"e"'})
+    expected = RulesBuilder(BASE_GRAMMAR.replace("num ::= [0-9]+", 'num ::= "0" | [1-9] [0-9]*') + 'extra ::= "e"')
+    assert canonicalize(updated) == canonicalize(expected)
+    assert "unused" not in updated.definitions
+
+
+def test_update_rejects_multiple_definitions():
+    with pytest.raises(GrammarParseError):
+        RulesBuilder(BASE_GRAMMAR).update({"num": '[0-9]\nother ::= "x"'})
+
+
+def test_update_reports_undefined_rules():
+    with pytest.raises(GrammarParseError, match="Undefined rule identifier 'nope'"):
+        RulesBuilder(BASE_GRAMMAR).update({"num": "nope"})
+
+
+STREAM_GRAMMAR = """# leading comment
+root ::= (expr "=" term "\\n")+ # trailing comment
+expr ::=
+  term ([-+*/] term)*
+term ::= num |
+  "(" expr ")" |
+  ( "é" |
+    "ü" )
+num ::= [0-9]+
+
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 16, 1 << 16])
+# Repeating the grammar redefines every rule, which must resolve the same way
+@pytest.mark.parametrize("grammar", [BASE_GRAMMAR, STREAM_GRAMMAR, STREAM_GRAMMAR * 3])
+def test_from_stream_matches_a_full_build(grammar, chunk_size):
+    expected = RulesBuilder(grammar)
+    for stream in (io.StringIO(grammar), io.BytesIO(grammar.encode())):
+        streamed = RulesBuilder.from_stream(stream, chunk_size=chunk_size)
+        assert streamed.rules == expected.rules
+        assert streamed.symbol_ids == expected.symbol_ids
+
+
+def test_from_file_reads_files_and_mmaps(tmp_path):
+    path = tmp_path / "grammar.gbnf"
+    path.write_text(STREAM_GRAMMAR, encoding="utf-8")
+    expected = RulesBuilder(STREAM_GRAMMAR)
+    assert RulesBuilder.from_file(path, chunk_size=7).rules == expected.rules
+    with path.open("rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        assert RulesBuilder.from_stream(mapped, chunk_size=7).rules == expected.rules
+
+
+def test_parse_stream_yields_rules_before_the_stream_is_exhausted():
+    chunks = iter(['root ::= a b\n', 'a ::= "a"\n', 'b ::= "b"'])
+    stream = io.StringIO()
+    stream.read = lambda _size: next(chunks, "")
+    builder = RulesBuilder()
+    parsed = builder.parse_stream(stream)
+    assert next(parsed)[0] == builder.symbol_ids["root"]
+    assert [rule_id for rule_id, _ in parsed] == [builder.symbol_ids["a"], builder.symbol_ids["b"]]
+
+
+def test_from_stream_reports_errors():
+    with pytest.raises(GrammarParseError, match="Undefined rule identifier 'missing'"):
+        RulesBuilder.from_stream(io.StringIO("root ::= missing\nother ::= root\n"), chunk_size=4)
+    with pytest.raises(GrammarParseError):
+        RulesBuilder.from_stream(io.StringIO('root ::= "a\nother ::= "b"\n'), chunk_size=4)
+
+
+def test_streamed_builders_are_not_updated_in_place():
+    streamed = RulesBuilder.from_stream(io.StringIO(BASE_GRAMMAR))
+    edited = BASE_GRAMMAR.replace("[0-9]+", "[0-7]+")
+    assert streamed.recompile(edited).rules == RulesBuilder(edited).rules
+    with pytest.raises(ValueError, match="built from a stream has no source to update"):
+        streamed.update({"num": "[0-7]+"})
+
+
+def test_symbol_names_reverse_symbol_ids():
+    builder = RulesBuilder(BASE_GRAMMAR).recompile(BASE_GRAMMAR + 'extra ::= ("x" num)*\n')
+    assert builder.symbol_names == list(builder.symbol_ids)
+
+
+def test_reports_every_undefined_rule_in_one_error():
+    grammar = 'root ::= foo bar\nother ::= (foo | baz)*'
+    with pytest.raises(UndefinedRuleError) as error:
+        RulesBuilder(grammar)
+    assert error.value.undefined == {"foo": [9, 28], "bar": [13], "baz": [34]}
+    assert error.value.pos == 9
+    assert "Undefined rule identifiers 'foo' at 9, 28; 'bar' at 13; 'baz' at 34" in str(error.value)
+
+
+def test_redefinitions_drop_the_references_of_the_replaced_definition():
+    assert RulesBuilder('root ::= missing\nroot ::= "x"').rules[0][0]["value"] == [ord("x")]
+    with pytest.raises(UndefinedRuleError) as error:
+        RulesBuilder('root ::= missing\nroot ::= missing "x"')
+    assert error.value.undefined == {"missing": [26]}
+
+
+def test_redefinitions_keep_the_references_of_generated_rules():
+    # The repetition of the replaced definition stays in the rules
+    with pytest.raises(UndefinedRuleError) as error:
+        RulesBuilder('root ::= x+ | "a"\nroot ::= "b"')
+    assert error.value.undefined == {"x": [9]}
+    builder = RulesBuilder('root ::= (x | "a")*\nroot ::= "b"\nx ::= "c"')
+    assert builder.rules[0] == RulesBuilder('root ::= "b"').rules[0]
+
+
+def test_streamed_undefined_references_count_from_the_start_of_the_stream():
+    grammar = 'root ::= a\na ::= "a"\nb ::= c\nd ::= "d"\n'
+    with pytest.raises(UndefinedRuleError) as error:
+        RulesBuilder.from_stream(io.StringIO(grammar), chunk_size=4)
+    assert error.value.undefined == {"c": [grammar.index("c")]}
+
+
+def test_recompile_reports_undefined_references_of_unchanged_rules():
+    edited = BASE_GRAMMAR.replace("num ::= [0-9]+", 'num ::= missing "0"').replace('"(" expr ")"', '"(" exp ")"')
+    with pytest.raises(UndefinedRuleError) as error:
+        RulesBuilder(BASE_GRAMMAR).recompile(edited)
+    assert error.value.undefined == {"exp": [edited.index("exp ")], "missing": [edited.index("missing")]}
+    # Rules that referenced a removed rule are reported at their definition
+    edited = BASE_GRAMMAR.replace("num ::= [0-9]+\n", "")
+    with pytest.raises(UndefinedRuleError) as error:
+        RulesBuilder(BASE_GRAMMAR).recompile(edited)
+    assert error.value.undefined == {"num": [edited.index("term ::=")]}
+
+
+def test_recompiled_builders_can_be_recompiled_incrementally():
+    recompiled = RulesBuilder(BASE_GRAMMAR).recompile(BASE_GRAMMAR.replace("[0-9]+", "[0-7]+"))
+    assert not recompiled.has_duplicate_definitions
+
+
+NESTING_DEPTH = 10000
+
+
+def test_deeply_nested_groups():
+    grammar = "root ::= " + '("a" | ' * NESTING_DEPTH + '"b"' + ")*" * NESTING_DEPTH + "\n"
+    builder = RulesBuilder(grammar)
+    # A group and a repetition rule per level
+    assert len(builder.rules) == 1 + 2 * NESTING_DEPTH
+    # Groups are numbered outside in, and their repetitions inside out
+    assert builder.rules[0] == [
+        {"type": InternalRuleType.RULE_REF, "value": 2 * NESTING_DEPTH},
+        {"type": InternalRuleType.END},
+    ]
+    innermost = builder.symbol_ids[f"root_{NESTING_DEPTH}"]
+    assert builder.rules[innermost] == [
+        {"type": InternalRuleType.CHAR, "value": [ord("a")]},
+        {"type": InternalRuleType.ALT},
+        {"type": InternalRuleType.CHAR, "value": [ord("b")]},
+        {"type": InternalRuleType.END},
+    ]
+    streamed = RulesBuilder.from_stream(io.StringIO(grammar), chunk_size=1024)
+    assert streamed.rules == builder.rules
+
+
+def test_deeply_nested_groups_must_be_closed():
+    grammar = "root ::= " + "(" * NESTING_DEPTH + '"a"' + ")" * (NESTING_DEPTH - 1) + "\n"
+    with pytest.raises(GrammarParseError, match=f"Expecting '\\)' at {len(grammar)}"):
+        RulesBuilder(grammar)
+
+
+def assert_equivalent(expected, deduped):
+    # Walks both builds in lockstep from the named rules, requiring every
+    # generated rule to map onto a single deduplicated rule with the same body
+    mapping = {expected.symbol_ids[name]: deduped.symbol_ids[name] for name in deduped.definitions}
+    queue = list(mapping)
+    while queue:
+        rule_id = queue.pop()
+        rule = expected.rules[rule_id]
+        deduped_rule = deduped.rules[mapping[rule_id]]
+        assert len(rule) == len(deduped_rule)
+        for element, deduped_element in zip(rule, deduped_rule, strict=True):
+            assert element["type"] == deduped_element["type"]
+            if element["type"] is not InternalRuleType.RULE_REF:
+                assert element.get("value") == deduped_element.get("value")
+            elif element["value"] in mapping:
+                assert mapping[element["value"]] == deduped_element["value"]
+            else:
+                mapping[element["value"]] = deduped_element["value"]
+                queue.append(element["value"])
+    assert len(set(mapping.values())) == len(deduped.symbol_ids)
+
+
+@pytest.mark.parametrize(("key", "grammar", "expected"), test_cases)
+def test_dedupe_is_equivalent(key, grammar, expected):
+    grammar = grammar.replace("\\n", "\n")
+    assert_equivalent(RulesBuilder(grammar), RulesBuilder(grammar, dedupe=True))
+
+
+DEDUPE_GRAMMAR = """
+root ::= num ("," num)* ws ("," num)*
+num ::= [0-9]+ ("." [0-9]+)?
+ws ::= [ \\t]* | ([ \\t]*)
+"""
+
+
+def test_dedupe_shares_identical_generated_rules():
+    plain = RulesBuilder(DEDUPE_GRAMMAR)
+    deduped = RulesBuilder(DEDUPE_GRAMMAR, dedupe=True)
+    assert_equivalent(plain, deduped)
+    # Root's second repetition and its group, num's second [0-9]+ and ws's group
+    assert len(deduped.rules) == len(plain.rules) - 4
+    assert deduped.symbol_names == list(deduped.symbol_ids)
+    assert deduped.num_elements == sum(len(rule) for rule in deduped.rules)
+
+
+def test_dedupe_builds_recompile_and_stream_consistently():
+    deduped = RulesBuilder(DEDUPE_GRAMMAR, dedupe=True)
+    edited = DEDUPE_GRAMMAR.replace('("." [0-9]+)?', '("." [0-9]+)? ("e" [0-9]+)?')
+    recompiled = deduped.recompile(edited)
+    assert recompiled.dedupe
+    assert recompiled.rules == RulesBuilder(edited, dedupe=True).rules
+    updated = deduped.update({"ws": '" "*'})
+    assert updated.rules == RulesBuilder(updated.src, dedupe=True).rules
+    streamed = RulesBuilder.from_stream(io.StringIO(DEDUPE_GRAMMAR), chunk_size=8, dedupe=True)
+    assert streamed.rules == deduped.rules
+    assert streamed.symbol_ids == deduped.symbol_ids
@@ -0,0 +1,167 @@
+import re
+from enum import Enum
+from typing import Any, NamedTuple
+
+from .errors import GrammarParseError
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+UNEXPECTED_END_ERROR = "Unexpected end of grammar input, failed to complete parse"
+
+
+class TokenType(Enum):
+    NAME = "name"
+    DEFINE = "define"
+    LITERAL = "literal"
+    CHAR_CLASS = "char_class"
+    LPAREN = "lparen"
+    RPAREN = "rparen"
+    ALT = "alt"
+    REPEAT = "repeat"
+    NEWLINE = "newline"
+    OTHER = "other"
+    EOF = "eof"
+
+
+class Token(NamedTuple):
+    type: TokenType
+    # NAME: str, LITERAL: list[int], CHAR_CLASS: (negated, [(start, end | None), ...]),
+    # REPEAT / OTHER: the matched character, everything else: None
+    value: Any
+    pos: int
+
+
+# Whitespace and comments are consumed as a prefix of each match and never
+# emitted. Newlines are significant at the top level of a rule (they terminate
+# it), so a run of newlines, together with any whitespace and comments in
+# between, collapses into a single NEWLINE token.
+_TOKEN_RE = re.compile(
+    r"""
+    (?:[ \t]|\#[^\r\n]*)*
+    (?:
+    (?P<newline>[\r\n](?:[ \t\r\n]|\#[^\r\n]*)*)
+    | (?P<name>[a-zA-Z_-]+)
+    | (?P<literal>"(?:[^"\\]|\\.)*")
+    | (?P<char_class>\[(?:[^\]\\]|\\.)*\])
+    | (?P<define>::=)
+    | (?P<lparen>\()
+    | (?P<rparen>\))
+    | (?P<alt>\|)
+    | (?P<repeat>[*+?])
+    | (?P<other>.)
+    )?
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_CHAR_RE = re.compile(
+    r"""
+    \\(?:
+        x(?P<x>[0-9a-fA-F]{2})
+        | u(?P<u>[0-9a-fA-F]{4})
+        | U(?P<U>[0-9a-fA-F]{8})
+        | (?P<escaped>[trn"\[\]\\])
+    )
+    | (?P<char>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_ESCAPES = {"t": ord("\t"), "r": ord("\r"), "n": ord("\n")}
+
+_TOKEN_TYPES = {token_type.value: token_type for token_type in TokenType}
+
+# Builds tokens without going through the Python-level NamedTuple constructor
+_new_token = tuple.__new__
+
+
+# Decodes src[start:end] into (code point, raw text) pairs, resolving escapes
+def decode_chars(src: str, start: int, end: int) -> list[tuple[int, str]]:
+    if "\\" not in src[start:end]:
+        return [(ord(c), c) for c in src[start:end]]
+    chars = []
+    for match in _CHAR_RE.finditer(src, start, end):
+        char = match.group("char")
+        if char is not None:
+            if char == "\\":
+                raise GrammarParseError(src, match.start(), f"Unknown escape at {char}")
+            chars.append((ord(char), char))
+            continue
+        hex_value = match.group("x") or match.group("u") or match.group("U")
+        if hex_value is not None:
+            chars.append((int(hex_value, 16), match.group()))
+        else:
+            escaped = match.group("escaped")
+            chars.append((_ESCAPES.get(escaped, ord(escaped)), match.group()))
+    return chars
+
+
+def decode_literal(src: str, start: int, end: int) -> list[int]:
+    if "\\" not in src[start:end]:
+        return [ord(c) for c in src[start:end]]
+    return [value for value, _ in decode_chars(src, start, end)]
+
+
+def decode_char_class(src: str, start: int, end: int) -> tuple[bool, list[tuple[int, int | None]]]:
+    negated = start < end and src[start] == "^"
+    if negated:
+        start += 1
+    chars = decode_chars(src, start, end)
+    items = []
+    i = 0
+    while i < len(chars):
+        # A dash forms a range unless it is the final character of the class
+        if i + 2 < len(chars) and chars[i + 1][1] == "-":
+            items.append((chars[i][0], chars[i + 2][0]))
+            i += 3
+        else:
+            items.append((chars[i][0], None))
+            i += 1
+    return negated, items
+
+
+# `check`, if given, is called with the source and the tokens so far every
+# `check_interval` tokens, and may raise to stop tokenizing
+def tokenize(
+    src: str,
+    pos: int = 0,
+    end: int | None = None,
+    check: "Callable[[str, list[Token]], None] | None" = None,
+    check_interval: int = 1024,
+) -> list[Token]:
+    if end is None:
+        end = len(src)
+    tokens = []
+    append = tokens.append
+    next_check = check_interval if check is not None else -1
+    for match in _TOKEN_RE.finditer(src, pos, end):
+        kind = match.lastgroup
+        if kind is None:
+            # Trailing whitespace or comments
+            continue
+        start = match.start(kind)
+        if kind == "name":
+            append(_new_token(Token, (TokenType.NAME, match.group(kind), start)))
+        elif kind == "literal":
+            value = decode_literal(src, start + 1, match.end(kind) - 1)
+            append(_new_token(Token, (TokenType.LITERAL, value, start)))
+        elif kind == "char_class":
+            value = decode_char_class(src, start + 1, match.end(kind) - 1)
+            append(_new_token(Token, (TokenType.CHAR_CLASS, value, start)))
+        elif kind == "repeat":
+            append(_new_token(Token, (TokenType.REPEAT, match.group(kind), start)))
+        elif kind == "other":
+            value = match.group(kind)
+            if value in ('"', "["):
+                # An opening delimiter that the literal / char class patterns could not close
+                raise GrammarParseError(src, end, UNEXPECTED_END_ERROR)
+            append(_new_token(Token, (TokenType.OTHER, value, start)))
+        else:
+            append(_new_token(Token, (_TOKEN_TYPES[kind], None, start)))
+        if len(tokens) == next_check:
+            check(src, tokens)
+            next_check += check_interval
+    append(Token(TokenType.EOF, None, end))
+    return tokens
@@ -0,0 +1,100 @@
+import pytest
+
+from .errors import GrammarParseError
+from .tokenizer import Token, TokenType, decode_char_class, decode_literal, tokenize
+
+
+def test_tokenize_a_simple_rule():
+    assert tokenize('root ::= "ab"') == [
+        Token(TokenType.NAME, "root", 0),
+        Token(TokenType.DEFINE, None, 5),
+        Token(TokenType.LITERAL, [ord("a"), ord("b")], 9),
+        Token(TokenType.EOF, None, 13),
+    ]
+
+
+def test_tokenize_skips_whitespace_and_comments():
+    assert [token.type for token in tokenize("  root\t# comment\n  ::= foo # trailing")] == [
+        TokenType.NAME,
+        TokenType.NEWLINE,
+        TokenType.DEFINE,
+        TokenType.NAME,
+        TokenType.EOF,
+    ]
+
+
+def test_tokenize_collapses_runs_of_newlines():
+    tokens = tokenize('a ::= "a"\n\r\n  # comment\n\nb ::= "b"')
+    assert [token.type for token in tokens].count(TokenType.NEWLINE) == 1
+
+
+def test_tokenize_operators():
+    assert [(token.type, token.value) for token in tokenize("(a)* | b+ c?")] == [
+        (TokenType.LPAREN, None),
+        (TokenType.NAME, "a"),
+        (TokenType.RPAREN, None),
+        (TokenType.REPEAT, "*"),
+        (TokenType.ALT, None),
+        (TokenType.NAME, "b"),
+        (TokenType.REPEAT, "+"),
+        (TokenType.NAME, "c"),
+        (TokenType.REPEAT, "?"),
+        (TokenType.EOF, None),
+    ]
+
+
+def test_tokenize_names_with_separators():
+    assert tokenize("foo-bar_baz")[0] == Token(TokenType.NAME, "foo-bar_baz", 0)
+
+
+def test_tokenize_unrecognized_characters():
+    assert tokenize("1 :")[:2] == [Token(TokenType.OTHER, "1", 0), Token(TokenType.OTHER, ":", 2)]
+
+
+@pytest.mark.parametrize(
+    ("literal", "expected"),
+    [
+        ("foo", [ord("f"), ord("o"), ord("o")]),
+        ("\\x2A", [ord("\x2A")]),
+        ("\\u006F", [ord("o")]),
+        ("\\U0001F4A9", [128169]),
+        ("a\\tb", [ord("a"), ord("\t"), ord("b")]),
+        ("\\n\\r", [ord("\n"), ord("\r")]),
+        ('\\"\\[\\]\\\\', [ord('"'), ord("["), ord("]"), ord("\\")]),
+        ("", []),
+    ],
+)
+def test_decode_literal(literal, expected):
+    assert decode_literal(literal, 0, len(literal)) == expected
+
+
+def test_decode_literal_throws_on_unknown_escape():
+    with pytest.raises(GrammarParseError):
+        decode_literal("\\q", 0, 2)
+
+
+@pytest.mark.parametrize(
+    ("char_class", "expected"),
+    [
+        ("a", (False, [(ord("a"), None)])),
+        ("^a", (True, [(ord("a"), None)])),
+        ("a-z0-9_", (False, [(ord("a"), ord("z")), (ord("0"), ord("9")), (ord("_"), None)])),
+        ("-+", (False, [(ord("-"), None), (ord("+"), None)])),
+        ("a-", (False, [(ord("a"), None), (ord("-"), None)])),
+        ("\\x00-\\x1F", (False, [(0, 0x1F)])),
+        ("a-\\]", (False, [(ord("a"), ord("]"))])),
+        ("", (False, [])),
+    ],
+)
+def test_decode_char_class(char_class, expected):
+    assert decode_char_class(char_class, 0, len(char_class)) == expected
+
+
+def test_tokenize_char_class_with_escaped_bracket():
+    assert tokenize("[\\]a]")[0] == Token(TokenType.CHAR_CLASS, (False, [(ord("]"), None), (ord("a"), None)]), 0)
+
+
+@pytest.mark.parametrize("grammar", ['root ::= "foo', "root ::= [a-z"])
+def test_tokenize_throws_on_unterminated_input(grammar):
+    with pytest.raises(GrammarParseError):
+        tokenize(grammar)
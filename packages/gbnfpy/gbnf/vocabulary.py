@@ -0,0 +1,298 @@
+import json
+import re
+from array import array
+from pathlib import Path
+
+from .grammar_graph.char_class import ASCII_SIZE, MAX_CODE_POINT
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from .grammar_graph.parse_state import ParseState
+
+# Subtrees of at least this many nodes record the code points below them, so
+# the walk can allow them whole
+MIN_SHORTCUT_SUBTREE = 32
+BYTE_FALLBACK_PATTERN = re.compile(r"<0x([0-9A-Fa-f]{2})>")
+# SentencePiece's stand-in for a space
+METASPACE = "▁"
+
+
+# The set of token ids a state allows, packed one bit per token: token `i` is
+# bit `i % 8` of byte `i // 8`, the layout of numpy.packbits(bitorder="little")
+class TokenMask:
+    __slots__ = ("data", "size")
+
+    def __init__(self, data: bytes, size: int):
+        self.data = data
+        self.size = size
+
+    # The mask as an int with bit `i` set for every allowed token `i`
+    @property
+    def bits(self) -> int:
+        return int.from_bytes(self.data, "little")
+
+    def to_numpy(self):
+        try:
+            import numpy as np
+        except ImportError as error:
+            raise ImportError("TokenMask.to_numpy() requires NumPy, install it with `pip install numpy`") from error
+        return np.unpackbits(np.frombuffer(self.data, dtype=np.uint8), count=self.size, bitorder="little").astype(bool)
+
+    def __contains__(self, token_id: int) -> bool:
+        return 0 <= token_id < self.size and (self.data[token_id >> 3] >> (token_id & 7)) & 1 == 1
+
+    def __iter__(self) -> "Iterator[int]":
+        for byte_index, byte in enumerate(self.data):
+            while byte:
+                lowest = byte & -byte
+                yield byte_index * 8 + lowest.bit_length() - 1
+                byte ^= lowest
+
+    # The number of allowed tokens
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TokenMask):
+            return NotImplemented
+        return self.size == other.size and self.data == other.data
+
+    def __hash__(self) -> int:
+        return hash((self.size, self.data))
+
+    def __repr__(self) -> str:
+        return f"TokenMask({len(self)} of {self.size} tokens)"
+
+
+# A trie over the text of every token in a tokenizer's vocabulary, built once
+# and walked alongside a ParseState to find the tokens it allows. The trie is
+# held in flat arrays: node 0 is the root, `code_points[node]` is the code
+# point leading to a node, the children of a node are
+# `children[child_starts[node]:child_starts[node + 1]]` and the tokens whose
+# text ends at a node are `token_ids[token_starts[node]:token_starts[node + 1]]`.
+# Tokens without text, such as special tokens, are never in the trie. Nodes
+# are numbered depth first, so a node's subtree is the nodes from it up to
+# `subtree_ends[node]`, and the tokens in it are one slice of `token_ids`.
+class Vocabulary:
+    __slots__ = (
+        "child_starts",
+        "children",
+        "code_points",
+        "shortcuts",
+        "size",
+        "subtree_ends",
+        "token_ids",
+        "token_starts",
+        "tokens",
+    )
+
+    # `tokens[i]` is the text of token id `i`, or None
+    def __init__(self, tokens: "Iterable[str | None]"):
+        self.tokens = list(tokens)
+        self.size = len(self.tokens)
+        texts = sorted((text, token_id) for token_id, text in enumerate(self.tokens) if text)
+
+        # Sorted texts add their nodes depth first, each node's children in
+        # code point order
+        parents = array("i", [-1])
+        self.code_points = array("i", [-1])
+        node_tokens = []
+        path = [0]
+        previous = ""
+        for text, token_id in texts:
+            common = 0
+            limit = min(len(text), len(previous))
+            while common < limit and text[common] == previous[common]:
+                common += 1
+            del path[common + 1 :]
+            for char in text[common:]:
+                parents.append(path[-1])
+                self.code_points.append(ord(char))
+                path.append(len(parents) - 1)
+            node_tokens.append((path[-1], token_id))
+            previous = text
+
+        node_count = len(parents)
+        self.child_starts = count_offsets(parents[1:], node_count)
+        # Nodes were numbered in creation order, and a stable sort keeps it
+        self.children = array("i", sorted(range(1, node_count), key=parents.__getitem__))
+        self.token_starts = count_offsets((node for node, _ in node_tokens), node_count)
+        self.token_ids = array("i", (token_id for _, token_id in sorted(node_tokens)))
+
+        self.subtree_ends = array("i", range(1, node_count + 1))
+        for node in range(node_count - 1, 0, -1):
+            parent = parents[node]
+            self.subtree_ends[parent] = max(self.subtree_ends[parent], self.subtree_ends[node])
+        # For large subtrees, the code points below the subtree's root as a bit
+        # set, with bit 128 standing for any code point outside ASCII
+        self.shortcuts = {}
+        for node in range(node_count):
+            end = self.subtree_ends[node]
+            if end - node >= MIN_SHORTCUT_SUBTREE:
+                below = {min(code_point, ASCII_SIZE) for code_point in self.code_points[node + 1 : end]}
+                self.shortcuts[node] = sum(1 << code_point for code_point in below)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.code_points)
+
+    def __len__(self) -> int:
+        return self.size
+
+    # Loads a JSON list of token strings, or a Hugging Face tokenizer.json
+    @classmethod
+    def from_file(cls, path: str | Path) -> "Vocabulary":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if isinstance(data, list):
+            return cls(data)
+        return cls.from_tokenizer_json(data)
+
+    @classmethod
+    def from_tokenizer_json(cls, data: dict) -> "Vocabulary":
+        vocab = data["model"]["vocab"]
+        # Unigram models list [piece, score] pairs in id order
+        pieces = vocab if isinstance(vocab, dict) else {piece: i for i, (piece, _) in enumerate(vocab)}
+        special = {token["id"] for token in data.get("added_tokens") or () if token.get("special")}
+        added = {token["id"]: token["content"] for token in data.get("added_tokens") or ()}
+        size = max([*pieces.values(), *added, -1]) + 1
+        decode = get_piece_decoder(data.get("decoder"))
+        tokens = [None] * size
+        for piece, token_id in pieces.items():
+            tokens[token_id] = decode(piece)
+        for token_id, content in added.items():
+            tokens[token_id] = None if token_id in special else content
+        return cls(tokens)
+
+
+# Offsets for grouping items by key: the items with key `k` are at
+# `offsets[k]:offsets[k + 1]` once sorted by key
+def count_offsets(keys, key_count: int) -> array:
+    offsets = array("i", bytes(4 * (key_count + 1)))
+    for key in keys:
+        offsets[key + 1] += 1
+    for i in range(key_count):
+        offsets[i + 1] += offsets[i]
+    return offsets
+
+
+# GPT-2's byte-level BPE spells every byte as a printable character
+def get_byte_decoder() -> dict[str, int]:
+    printable = [*range(ord("!"), ord("~") + 1), *range(ord("¡"), ord("¬") + 1), *range(ord("®"), ord("ÿ") + 1)]
+    byte_to_char = {byte: chr(byte) for byte in printable}
+    shift = 0
+    for byte in range(256):
+        if byte not in byte_to_char:
+            byte_to_char[byte] = chr(256 + shift)
+            shift += 1
+    return {char: byte for byte, char in byte_to_char.items()}
+
+
+def get_decoder_types(decoder: dict | None) -> set[str]:
+    if not decoder:
+        return set()
+    types = {decoder.get("type")}
+    for child in decoder.get("decoders") or ():
+        types |= get_decoder_types(child)
+    if decoder.get("type") == "Replace" and decoder.get("pattern", {}).get("String") == METASPACE:
+        types.add("Metaspace")
+    return types
+
+
+# Returns a function from a vocabulary piece to the text it decodes to. Pieces
+# that are only part of a UTF-8 sequence have no text of their own, and decode
+# to None.
+def get_piece_decoder(decoder: dict | None):
+    types = get_decoder_types(decoder)
+    byte_decoder = get_byte_decoder() if "ByteLevel" in types else None
+
+    def decode(piece: str) -> str | None:
+        if byte_decoder is not None:
+            if any(char not in byte_decoder for char in piece):
+                return piece
+            try:
+                return bytes(byte_decoder[char] for char in piece).decode("utf-8")
+            except UnicodeDecodeError:
+                return None
+        if "ByteFallback" in types:
+            match = BYTE_FALLBACK_PATTERN.fullmatch(piece)
+            if match:
+                byte = int(match.group(1), 16)
+                return chr(byte) if byte < 0x80 else None
+        if "Metaspace" in types:
+            piece = piece.replace(METASPACE, " ")
+        if "WordPiece" in types:
+            piece = piece.removeprefix("##")
+        return piece
+
+    return decode
+
+
+# Walks the vocabulary's trie alongside the state. A node's pointers are the
+# state after the node's prefix, so each prefix is parsed once however many
+# tokens share it, and a prefix the grammar rejects prunes its whole subtree.
+# Where every code point below a large subtree leaves the pointers as they
+# are, as inside a JSON string, the subtree is allowed without walking it.
+def get_allowed_tokens(state: "ParseState", vocab: Vocabulary) -> TokenMask:
+    graph = state.graph
+    parse = graph.parse
+    get_atom = graph.get_atom
+    atom_starts = graph.atom_starts
+    code_points = vocab.code_points
+    child_starts = vocab.child_starts
+    children = vocab.children
+    token_starts = vocab.token_starts
+    token_ids = vocab.token_ids
+    subtree_ends = vocab.subtree_ends
+    shortcuts = vocab.shortcuts
+    mask = bytearray((vocab.size + 7) // 8)
+    # Different prefixes often lead to the same pointers, which then parse
+    # the next code point the same way, as do code points in the same atom
+    transitions = {}
+    atom_transitions = {}
+    # The code points that leave a set of pointers unchanged, as a bit set of
+    # ASCII code points plus bit 128 if that holds for all others too
+    loops = {}
+
+    def get_loops(pointers) -> int:
+        bits = loops.get(pointers)
+        if bits is None:
+            bits = 1 << ASCII_SIZE
+            for atom, start in enumerate(atom_starts):
+                end = atom_starts[atom + 1] if atom + 1 < len(atom_starts) else MAX_CODE_POINT + 1
+                if parse(pointers, start) == pointers:
+                    bits |= ((1 << min(end, ASCII_SIZE)) - 1) ^ ((1 << min(start, ASCII_SIZE)) - 1)
+                elif end > ASCII_SIZE:
+                    bits &= ~(1 << ASCII_SIZE)
+            loops[pointers] = bits
+        return bits
+
+    work = [(0, state.pointers)]
+    while work:
+        node, pointers = work.pop()
+        for index in range(child_starts[node], child_starts[node + 1]):
+            child = children[index]
+            code_point = code_points[child]
+            key = (pointers, code_point)
+            next_pointers = transitions.get(key)
+            if next_pointers is None:
+                atom_key = (pointers, get_atom(code_point))
+                next_pointers = atom_transitions.get(atom_key)
+                if next_pointers is None:
+                    next_pointers = atom_transitions[atom_key] = parse(pointers, code_point)
+                transitions[key] = next_pointers
+            if not next_pointers:
+                continue
+            below = shortcuts.get(child)
+            if below is not None and below & ~get_loops(next_pointers) == 0:
+                token_range = range(token_starts[child], token_starts[subtree_ends[child]])
+            elif child_starts[child] != child_starts[child + 1]:
+                token_range = range(token_starts[child], token_starts[child + 1])
+                work.append((child, next_pointers))
+            else:
+                token_range = range(token_starts[child], token_starts[child + 1])
+            for token_index in token_range:
+                token_id = token_ids[token_index]
+                mask[token_id >> 3] |= 1 << (token_id & 7)
+    return TokenMask(bytes(mask), vocab.size)
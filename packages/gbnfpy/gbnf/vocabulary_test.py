@@ -0,0 +1,131 @@
+import json
+import random
+
+import pytest
+
+from .bench import make_vocabulary
+from .GBNF import GBNF
+from .rules_builder.errors import InputParseError
+from .vocabulary import TokenMask, Vocabulary
+
+JSON_GRAMMAR = r"""
+root ::= object
+value ::= object | array | string | number | ("true" | "false" | "null") ws
+object ::= "{" ws ( string ":" ws value ("," ws string ":" ws value)* )? "}" ws
+array ::= "[" ws ( value ("," ws value)* )? "]" ws
+string ::= "\"" ( [^"\\] | "\\" (["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F]) )* "\"" ws
+number ::= ("-"? ([0-9] | [1-9] [0-9]*)) ("." [0-9]+)? ([eE] [-+]? [0-9]+)? ws
+ws ::= ([ \t\n] ws)?
+"""
+TOKENS = [
+    "{", "}", '{"', '":', '",', '"}', " ", "  ", "\n", "[", "]", ",", ", ", "true", "tr", "false", "null", "0", "1",
+    "12", "-", ".", "e", "a", "ab", "key", "value", '"', "\\", "\\n", "\\u", "00", "é", "日本", "x}", "", None, "ab",
+]
+
+
+def get_allowed_naively(state, tokens) -> set[int]:
+    allowed = set()
+    for token_id, text in enumerate(tokens):
+        if not text:
+            continue
+        try:
+            state.add(text)
+        except InputParseError:
+            continue
+        allowed.add(token_id)
+    return allowed
+
+
+def test_allowed_tokens_match_checking_every_token():
+    vocab = Vocabulary(TOKENS)
+    generator = random.Random(0)
+    state = GBNF(JSON_GRAMMAR, memory_cache=None)
+    for _ in range(60):
+        mask = state.allowed_tokens(vocab)
+        assert set(mask) == get_allowed_naively(state, TOKENS)
+        allowed = [TOKENS[token_id] for token_id in mask]
+        if not allowed:
+            break
+        state = state.add(generator.choice(allowed))
+
+
+def test_large_vocabularies_match_checking_every_token():
+    tokens = make_vocabulary(3000, seed=1)
+    vocab = Vocabulary(tokens)
+    assert vocab.shortcuts
+    for src in ["", '{"', '{"key": "val', '{"key": [1, ', '{"a": "\\u00']:
+        state = GBNF(JSON_GRAMMAR, src, memory_cache=None)
+        assert set(state.allowed_tokens(vocab)) == get_allowed_naively(state, tokens)
+    for src in ["", "- ", "- ab c"]:
+        state = GBNF('root ::= ("- " [^\\r\\n]+ "\\n")+', src, memory_cache=None)
+        assert set(state.allowed_tokens(vocab)) == get_allowed_naively(state, tokens)
+
+
+def test_duplicate_and_textless_tokens():
+    vocab = Vocabulary(["a", "", None, "a", "ab"])
+    assert vocab.node_count == 3
+    mask = GBNF('root ::= "a" "b"?', memory_cache=None).allowed_tokens(vocab)
+    assert list(mask) == [0, 3, 4]
+    assert 1 not in mask
+    assert 2 not in mask
+
+
+def test_token_mask():
+    mask = TokenMask(bytes([0b00000101, 0b10000000]), 16)
+    assert list(mask) == [0, 2, 15]
+    assert len(mask) == 3
+    assert mask.bits == 1 | 4 | 1 << 15
+    assert 15 in mask
+    assert 16 not in mask
+    assert -1 not in mask
+    assert mask == TokenMask(bytes([5, 128]), 16)
+
+
+def test_token_mask_to_numpy():
+    np = pytest.importorskip("numpy")
+    mask = GBNF('root ::= "a" "b"?', memory_cache=None).allowed_tokens(Vocabulary(["a", "b", "ab", "c"] * 3))
+    expected = np.array([True, False, True, False] * 3)
+    assert (mask.to_numpy() == expected).all()
+
+
+def test_from_file_loads_a_list(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text(json.dumps(["a", "b", None]))
+    vocab = Vocabulary.from_file(path)
+    assert vocab.tokens == ["a", "b", None]
+    assert len(vocab) == 3
+
+
+def test_from_file_decodes_byte_level_tokenizers(tmp_path):
+    path = tmp_path / "tokenizer.json"
+    data = {
+        "model": {"type": "BPE", "vocab": {"Ġhello": 0, "Ã©": 1, "Ã": 2, "{\"": 3, "<s>": 4}},
+        "decoder": {"type": "ByteLevel"},
+        "added_tokens": [
+            {"id": 4, "content": "<s>", "special": True},
+            {"id": 5, "content": "<tool>", "special": False},
+        ],
+    }
+    path.write_text(json.dumps(data))
+    # "Ã" alone is the first byte of a two byte sequence
+    assert Vocabulary.from_file(path).tokens == [" hello", "é", None, '{"', None, "<tool>"]
+
+
+def test_decodes_sentencepiece_tokenizers():
+    data = {
+        "model": {"type": "BPE", "vocab": {"▁hello": 0, "<0x0A>": 1, "<0xE6>": 2, "world": 3}},
+        "decoder": {
+            "type": "Sequence",
+            "decoders": [
+                {"type": "Replace", "pattern": {"String": "▁"}, "content": " "},
+                {"type": "ByteFallback"},
+                {"type": "Fuse"},
+            ],
+        },
+    }
+    assert Vocabulary.from_tokenizer_json(data).tokens == [" hello", "\n", None, "world"]
+
+
+def test_decodes_unigram_vocabularies():
+    data = {"model": {"type": "Unigram", "vocab": [["<unk>", 0.0], ["▁a", -1.0]]}, "decoder": {"type": "Metaspace"}}
+    assert Vocabulary.from_tokenizer_json(data).tokens == ["<unk>", " a"]